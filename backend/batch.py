@@ -0,0 +1,204 @@
+"""Parallel batch parsing and prompt building for the `/*/batch` endpoints.
+
+Items are handed to a process pool as they arrive and results are yielded
+strictly in input order, so a client can stream thousands of stories through
+one request. Configuration via environment variables:
+
+- `NLP_BATCH_WORKERS` (default: min(4, cores)) worker processes; 0 runs
+  items on a single background thread instead
+- `NLP_BATCH_CHUNK` (default: 8) items sent to a worker at a time
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+from generation.prompt_builder import build_prompts_for_panels
+from nlp.parser import parse_story
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_document(text: str) -> Dict[str, Any]:
+    """The `/parse` response for one story."""
+    # Scenes, dialogue and character mentions come from a single pass
+    scenes, characters = parse_story(text)
+    panels = [{"id": scene.index, "scene": scene.text, "dialogues": scene.dialogues, "characters": scene.characters} for scene in scenes]
+    return {"language": "en", "characters": characters, "panels": panels}
+
+
+def parse_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse one `{"title", "text"}` batch item."""
+    text = item.get("text") if isinstance(item, dict) else None
+    if not isinstance(text, str):
+        raise ValueError("Each story needs a 'text' string")
+    result = parse_document(text)
+    if "title" in item:
+        result = {"title": item["title"], **result}
+    return result
+
+
+def prompts_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Build prompts for one `{"panels", "style", "seed", "random_seed"}` batch item."""
+    panels = item.get("panels") if isinstance(item, dict) else None
+    if not isinstance(panels, list):
+        raise ValueError("Each item needs a 'panels' list")
+    prompts = build_prompts_for_panels(panels, item.get("style", "manga"), seed=item.get("seed"), random_seed=item.get("random_seed", False))
+    return {"prompts": prompts}
+
+
+def _run_chunk(fn: Callable[[Any], Dict[str, Any]], items: List[Any]) -> List[Tuple[bool, Any]]:
+    """Run `fn` over a chunk of items in a worker; failures are returned, not raised."""
+    results = []
+    for item in items:
+        try:
+            results.append((True, fn(item)))
+        except Exception as exc:  # noqa: BLE001 - reported per item
+            results.append((False, str(exc)))
+    return results
+
+
+class OrderedBatch:
+    """Submit items one at a time; iterate results in submission order.
+
+    Items are shipped to the pool in chunks of `chunk_size` (default
+    `NLP_BATCH_CHUNK`, 8) to amortize inter-process overhead on small
+    stories. Each result is `{"index": i, **fn(item)}`, or
+    `{"index": i, "error": ...}` when that item failed; one bad item never
+    fails the batch. If a worker process dies, every item of the chunks it
+    took down gets an error line and the pool is replaced for later requests.
+    """
+
+    def __init__(self, fn: Callable[[Any], Dict[str, Any]], executor: Executor = None, chunk_size: int = None):
+        self.fn = fn
+        self.executor = executor or get_batch_pool()
+        self.chunk_size = max(1, chunk_size or int(os.environ.get("NLP_BATCH_CHUNK", 8)))
+        # Submitted chunks as (future, size, None), or (None, size, error) for
+        # an undecodable item or a chunk the pool refused
+        self._chunks: List[Tuple[Optional[Future], int, Any]] = []
+        self._pending: List[Any] = []
+
+    def submit(self, item: Any) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= self.chunk_size:
+            self._flush()
+
+    def reject(self, error: str) -> None:
+        """Record an item that could not even be decoded."""
+        self._flush()
+        self._chunks.append((None, 1, error))
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        items, self._pending = self._pending, []
+        try:
+            self._chunks.append((self.executor.submit(_run_chunk, self.fn, items), len(items), None))
+        except BrokenProcessPool:
+            self._chunks.append((None, len(items), self._pool_died()))
+
+    def _pool_died(self) -> str:
+        _reset_batch_pool(self.executor)
+        return "Worker process died"
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        self._flush()
+        index = 0
+        for future, size, error in self._chunks:
+            if future is not None:
+                try:
+                    outcomes = future.result()
+                except BrokenProcessPool:
+                    error = self._pool_died()
+                except Exception as exc:  # noqa: BLE001 - reported per item
+                    error = str(exc)
+            if error is not None:
+                outcomes = [(False, error)] * size
+            for ok, value in outcomes:
+                yield {"index": index, **value} if ok else {"index": index, "error": value}
+                index += 1
+
+
+def _submit_line(batch: OrderedBatch, line: bytes) -> None:
+    line = line.strip()
+    if not line:
+        return
+    try:
+        item = json.loads(line)
+    except ValueError as exc:
+        batch.reject(f"Invalid JSON: {exc}")
+        return
+    batch.submit(item)
+
+
+async def submit_from_request(request, batch: OrderedBatch, key: str) -> None:
+    """Feed the items of a batch request into `batch`.
+
+    Accepts an NDJSON upload (`application/x-ndjson`, one item per line;
+    items are submitted while the body is still arriving), a JSON list, or a
+    JSON object holding the list under `key`. Raises ValueError if the body
+    is not one of those.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        # Pieces of the line still being received; only each new chunk is
+        # split, so long bodies and long lines stay linear
+        partial: List[bytes] = []
+        async for chunk in request.stream():
+            *lines, tail = chunk.split(b"\n")
+            if lines:
+                lines[0] = b"".join(partial) + lines[0]
+                partial = []
+                for line in lines:
+                    _submit_line(batch, line)
+            partial.append(tail)
+        _submit_line(batch, b"".join(partial))
+        return
+    parts = [chunk async for chunk in request.stream()]
+    try:
+        body = json.loads(b"".join(parts))
+    except ValueError as exc:
+        raise ValueError(f"Invalid JSON: {exc}") from exc
+    items = body.get(key) if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError(f"Expected a JSON list, an object with a '{key}' list, or an NDJSON body")
+    for item in items:
+        batch.submit(item)
+
+
+def ndjson_lines(results: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for result in results:
+        yield json.dumps(result) + "\n"
+
+
+_POOL: Optional[Executor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_batch_pool() -> Executor:
+    """Return the process-wide batch pool configured from the environment."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            workers = int(os.environ.get("NLP_BATCH_WORKERS", min(4, os.cpu_count() or 1)))
+            if workers > 0:
+                # spawn: forking a threaded server is unsafe
+                _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlp_batch")
+        return _POOL
+
+
+def _reset_batch_pool(broken: Executor) -> None:
+    """Drop `broken` so the next `get_batch_pool` call starts a fresh pool."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not broken:
+            return
+        _LOGGER.warning("Batch worker process died, restarting the batch pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
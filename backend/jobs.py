@@ -0,0 +1,167 @@
+"""In-process job queue for long-running generation work.
+
+Jobs are executed by a small, bounded pool of worker threads. Submissions go
+through a bounded queue so bursts of traffic get rejected early (the router
+maps `JobQueueFull` to HTTP 429) instead of piling up work the server cannot
+finish. Configuration via environment variables:
+
+- `JOB_WORKERS` (default: 1) number of worker threads
+- `JOB_MAX_QUEUE` (default: 16) max jobs waiting to start
+- `JOB_MAX_HISTORY` (default: 100) finished jobs kept for polling
+- `STREAM_WORKERS` / `STREAM_MAX_QUEUE` (default: 4 / 32) the separate
+  manager behind `/generate/comic/stream`, so interactive streams never
+  wait behind (or are rejected because of) queued bulk jobs
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """State of a single queued job, updated by the worker running it.
+
+    Panels are kept as image ids/URLs only; any inline base64 payload is
+    dropped so finished jobs stay small while kept for polling. Clients
+    fetch the bytes from `/images/{id}`.
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"  # queued, running, done, failed
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.panels: List[Optional[Dict]] = []
+        self.result: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def set_total(self, count: int) -> None:
+        with self._lock:
+            self.panels = [None] * count
+
+    def panel_done(self, index: int, panel: Dict) -> None:
+        panel = {k: v for k, v in panel.items() if k != "b64"}
+        with self._lock:
+            if index >= len(self.panels):
+                self.panels.extend([None] * (index + 1 - len(self.panels)))
+            self.panels[index] = panel
+
+    def get_panel(self, index: int) -> Tuple[Optional[Dict], int]:
+        """Return (panel or None if not ready, known panel count) in one consistent read."""
+        with self._lock:
+            panel = self.panels[index] if 0 <= index < len(self.panels) else None
+            return panel, len(self.panels)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            done = sum(1 for p in self.panels if p is not None)
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": {"done": done, "total": len(self.panels)},
+                "panels": ["done" if p is not None else "pending" for p in self.panels],
+            }
+
+
+class JobManager:
+    """Bounded worker pool executing `func(job, *args)` callables.
+
+    Arguments left as None come from the environment; `max_queue=0` means
+    an unbounded queue, as for `queue.Queue`.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = None, max_history: int = None, name: str = "job_worker"):
+        self.name = name
+        self.workers = workers if workers is not None else int(os.environ.get("JOB_WORKERS", 1))
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("JOB_MAX_QUEUE", 16))
+        self.max_history = max_history if max_history is not None else int(os.environ.get("JOB_MAX_HISTORY", 100))
+        if self.workers < 1:
+            raise ValueError(f"JobManager needs at least one worker, got {self.workers}")
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_queue)
+        self._jobs: Dict[str, Job] = {}
+        self._finished: List[str] = []
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}_{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, kind: str, func: Callable, *args) -> Job:
+        """Queue a job; raises `JobQueueFull` when the queue is at capacity."""
+        self._ensure_workers()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, func, args))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} waiting)")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _worker(self) -> None:
+        while True:
+            job, func, args = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = func(job, *args)
+                job.status = "done"
+            except Exception as exc:  # noqa: BLE001 - report any failure on the job
+                _LOGGER.exception("Job %s failed", job.id)
+                job.error = str(exc)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._retire(job)
+                self._queue.task_done()
+
+    def _retire(self, job: Job) -> None:
+        """Remember a finished job, dropping the oldest beyond `max_history`."""
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_history:
+                self._jobs.pop(self._finished.pop(0), None)
+
+
+# Shared manager used by the API routers for bulk `/jobs/comic` work
+JOBS = JobManager()
+# Interactive streams; their pipeline calls still share the device worker,
+# where they run ahead of bulk batches (`generation.scheduler`)
+STREAMS = JobManager(workers=int(os.environ.get("STREAM_WORKERS", 4)), max_queue=int(os.environ.get("STREAM_MAX_QUEUE", 32)), name="stream_worker")
+
+
+def find_job(job_id: str) -> Optional[Job]:
+    """Look a job id up in either manager."""
+    return JOBS.get(job_id) or STREAMS.get(job_id)
@@ -1,13 +1,18 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import time
 
 from backend.routers import parse as parse_router
 from backend.routers import prompts as prompts_router
 from backend.routers import generate as generate_router
 from backend.routers import assemble as assemble_router
+from backend.routers import jobs as jobs_router
+from backend.routers import images as images_router
+from backend.routers import comics as comics_router
+from generation.metrics import REGISTRY, REQUEST_SECONDS, REQUESTS_IN_FLIGHT
 
 
 app = FastAPI(title="AI Story-to-Comic Generator API")
@@ -37,30 +42,73 @@ def serve_frontend():
     return HTMLResponse(content=html)
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-endpoint latency (to response headers) and in-flight requests."""
+    start = time.perf_counter()
+    status = 500
+    with REQUESTS_IN_FLIGHT.track():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Label by route template so ids don't create a series per request
+            route = request.scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=path, status=str(status))
+
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def readiness_check():
+    """503 until the startup pipeline initialization (`warm_pipeline`) has finished.
+
+    In process-pool mode (`SD_PROCESS_WORKERS`) this tracks the workers.
+
+    `pipeline` is "loaded", or "unavailable" when placeholders are served.
+    """
+    from generation.sd_generator import pipeline_state
+
+    state = pipeline_state()
+    if state == "pending":
+        return JSONResponse({"status": "starting", "pipeline": state}, status_code=503)
+    return {"status": "ready", "pipeline": state}
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint; see `generation.metrics` for the series."""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 app.include_router(parse_router.router)
 app.include_router(prompts_router.router)
 app.include_router(generate_router.router)
 app.include_router(assemble_router.router)
+app.include_router(jobs_router.router)
+app.include_router(images_router.router)
+app.include_router(comics_router.router)
 
 
 @app.on_event("startup")
 def prewarm_sd_pipeline():
     """Attempt to initialize the Stable Diffusion pipeline in a background
     thread on server startup so the first request is fast and any errors are
-    logged at startup.
+    logged at startup. In process-pool mode the worker processes are warmed
+    instead of loading a pipeline here.
     """
     try:
         import threading
-        from generation.sd_generator import _init_pipeline
+        from generation.sd_generator import warm_pipeline
 
         def _worker():
             # Call with environment defaults; this will log success/failure.
-            _init_pipeline()
+            warm_pipeline()
 
         t = threading.Thread(target=_worker, name="sd_prewarm", daemon=True)
         t.start()
@@ -69,6 +117,22 @@ def prewarm_sd_pipeline():
         pass
 
 
+@app.on_event("startup")
+def start_workspace_janitor():
+    """Expire old per-request workspaces in the background."""
+    from storage.workspace import start_janitor
+
+    start_janitor()
+
+
+@app.on_event("startup")
+def start_image_store_janitor():
+    """Expire unreferenced images from the image store in the background."""
+    from storage.image_store import start_janitor
+
+    start_janitor()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("backend.main:app", host="localhost", port=8000, reload=True)
@@ -1,21 +1,105 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
-from generation.assembler import assemble_grid, export_pdf
+import os
+
+from generation.assembler import assemble_grid, assemble_pages, export_pdf
+from generation.encoding import page_encoding
+from generation.exporter import write_cbz
+from storage.image_store import get_store
+from storage.workspace import workspace, workspace_root
 
 router = APIRouter()
 
+_FORMATS = ("png", "pdf", "cbz")
+_MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".cbz": "application/vnd.comicbook+zip",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".jpg": "image/jpeg",
+}
+_IMAGE_EXTENSIONS = (".png", ".webp", ".jpg")
+
 
 class AssembleRequest(BaseModel):
+    # Image store ids (as returned by /generate), or "<workspace>/<file>"
+    # references to images in an assemble workspace (see `downloads`)
     images: List[str]
     columns: int = 2
+    # Split into pages of N panels; None keeps a single page with every panel
+    panels_per_page: Optional[int] = None
+    # Artifacts to produce: any of "png" (pages), "pdf", "cbz"
+    formats: List[str] = ["png", "pdf"]
+    title: Optional[str] = None
+
+
+def _workspace_file(workspace_name: str, filename: str) -> Optional[str]:
+    """Path of a file directly inside a workspace, or None for anything that would escape it."""
+    if not workspace_name or not filename or workspace_name.startswith("."):
+        return None
+    if os.path.basename(workspace_name) != workspace_name or os.path.basename(filename) != filename:
+        return None
+    return os.path.join(workspace_root(), workspace_name, filename)
+
+
+def _resolve_image(ref: str) -> str:
+    """Map an image store id or a workspace reference to its file; 400 for anything else.
+
+    Arbitrary server paths are rejected so the assembled (downloadable)
+    pages can only contain images the API itself produced.
+    """
+    path = get_store().get_path(ref)
+    if path is None:
+        workspace_name, _, filename = ref.removeprefix("/assemble/files/").partition("/")
+        path = _workspace_file(workspace_name, filename)
+        if path is not None and (os.path.splitext(filename)[1].lower() not in _IMAGE_EXTENSIONS or not os.path.isfile(path)):
+            path = None
+    if path is None:
+        raise HTTPException(status_code=400, detail=f"Unknown image: {ref}")
+    return path
+
+
+def _download_url(path: str) -> str:
+    ws, filename = os.path.split(path)
+    return f"/assemble/files/{os.path.basename(ws)}/{filename}"
 
 
 @router.post("/assemble")
 def assemble(request: AssembleRequest):
-    png = assemble_grid(request.images, columns=request.columns)
-    pdf = export_pdf(png)
-    return {"png": png, "pdf": pdf}
+    unknown = [f for f in request.formats if f not in _FORMATS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported format(s): {', '.join(unknown)}")
+    images = [_resolve_image(ref) for ref in request.images]
+    # Write into a fresh workspace so concurrent requests don't clobber
+    # each other's page/PDF; it is marked active so the janitor leaves it
+    # alone until the request is done, and expires it later
+    with workspace("assemble") as ws:
+        if request.panels_per_page:
+            pages = assemble_pages(images, columns=request.columns, panels_per_page=request.panels_per_page, output_dir=ws)
+        else:
+            pages = [assemble_grid(images, columns=request.columns, output_path=os.path.join(ws, f"comic_page{page_encoding().extension}"))]
+        result = {"png": pages[0], "pages": pages, "downloads": {}}
+        if "png" in request.formats:
+            result["downloads"]["pages"] = [_download_url(p) for p in pages]
+        if "pdf" in request.formats:
+            result["pdf"] = export_pdf(pages, pdf_path=os.path.join(ws, "comic.pdf"))
+            result["downloads"]["pdf"] = _download_url(result["pdf"])
+        if "cbz" in request.formats:
+            result["cbz"] = write_cbz(pages, os.path.join(ws, "comic.cbz"), title=request.title)
+            result["downloads"]["cbz"] = _download_url(result["cbz"])
+    return result
 
 
+@router.get("/assemble/files/{workspace_name}/{filename}")
+def download_artifact(workspace_name: str, filename: str):
+    """Serve an assembled page, PDF or CBZ as a file download."""
+    path = _workspace_file(workspace_name, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in _MEDIA_TYPES or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(path, media_type=_MEDIA_TYPES[ext], filename=filename)
@@ -0,0 +1,161 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+import random
+
+from backend.routers.generate import apply_prompt_options, publish_panel, select_quality
+from generation.compositor import BubbleOverlay
+from generation.pipeline_registry import default_model_id
+from generation.prompt_builder import build_prompts_for_panels
+from generation.sd_generator import render_panels
+from nlp.dialogue_detector import detect_dialogue_lines
+from nlp.ner import get_character_backend
+from storage.comics import get_comic_repository
+from storage.image_store import image_url
+
+router = APIRouter()
+
+
+class RegenerateRequest(BaseModel):
+    # Panel indices to re-render as they are
+    panels: List[int] = []
+    # Edited scene text by panel index; these panels are re-parsed and re-rendered
+    scenes: Dict[int, str] = {}
+    # Draw new seeds for the selected panels instead of keeping the stored ones
+    reseed: bool = False
+    # Re-render the selected panels at this quality tier (default: as stored)
+    quality: Optional[str] = None
+    inline_images: bool = True
+
+
+class PromoteRequest(BaseModel):
+    # Panel indices to re-render at final quality; empty selects every panel not yet final
+    panels: List[int] = []
+    inline_images: bool = True
+
+
+def _describe(record: Dict) -> Dict:
+    """Stored comic plus a URL for every panel that has an image."""
+    panels = []
+    for index, panel in enumerate(record["panels"]):
+        image_id = panel.get("image_id")
+        panels.append({"index": index, **panel, "url": image_url(image_id) if image_id else None})
+    return {**record, "panels": panels}
+
+
+@router.get("/comics")
+def list_comics(limit: int = 50, after: Optional[str] = None):
+    """Page through stored comics; pass the last `id` as `after` for the next page."""
+    limit = max(1, min(limit, 500))
+    records = get_comic_repository().list(limit=limit, after=after)
+    comics = [
+        {
+            "id": r["id"],
+            "style": r.get("style"),
+            "title": r.get("story", "")[:80],
+            "panel_count": len(r.get("panels", [])),
+            "created_at": r.get("created_at"),
+            "updated_at": r.get("updated_at"),
+        }
+        for r in records
+    ]
+    return {"comics": comics, "next": comics[-1]["id"] if len(comics) == limit else None}
+
+
+@router.get("/comics/{comic_id}")
+def get_comic(comic_id: str):
+    record = get_comic_repository().get(comic_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Comic not found")
+    return _describe(record)
+
+
+@router.delete("/comics/{comic_id}")
+def delete_comic(comic_id: str):
+    if not get_comic_repository().delete(comic_id):
+        raise HTTPException(status_code=404, detail="Comic not found")
+    return {"status": "deleted", "id": comic_id}
+
+
+@router.post("/comics/{comic_id}/regenerate")
+def regenerate_panels(comic_id: str, request: RegenerateRequest):
+    """Re-render only the selected panels of a stored comic.
+
+    Untouched panels keep their stored parse output, prompt, seed and image.
+    Edited scenes are re-parsed for dialogue and get a fresh prompt; their
+    seed follows the story seed like the original run (`panel_seed` depends
+    on the scene text). Without `reseed`, unedited panels keep their seed,
+    so they re-render identically (typically straight from the panel cache).
+    `quality` switches the selected panels to another tier, seed unchanged.
+    """
+    comics = get_comic_repository()
+    record = comics.get(comic_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Comic not found")
+    stored = record["panels"]
+    selected = sorted(set(request.panels) | set(request.scenes))
+    if not selected:
+        raise HTTPException(status_code=400, detail="No panels selected")
+    if selected[0] < 0 or selected[-1] >= len(stored):
+        raise HTTPException(status_code=400, detail="Panel index out of range")
+    quality = select_quality(request.quality) if request.quality else None
+
+    panels = [dict(panel) for panel in stored]
+    roster = record.get("characters", [])
+    # Character mentions from the configured backend (regex or spaCy NER), in one batch
+    edited = list(request.scenes.items())
+    mentions = get_character_backend().mentions([scene for _, scene in edited]) if edited else []
+    for (index, scene), found in zip(edited, mentions):
+        panels[index]["scene"] = scene
+        panels[index]["dialogues"] = detect_dialogue_lines(scene)
+        # Keep the story's cast; an edit without names keeps the panel's characters
+        named = {name.casefold() for name in found}
+        panels[index]["characters"] = [c for c in roster if c.casefold() in named] or panels[index].get("characters", [])
+    if request.scenes:
+        # Prompt building is cheap string work; rebuild for the whole story so
+        # edited panels get the seed they would have had in a fresh run
+        fresh = build_prompts_for_panels(panels, style=record.get("style", "manga"), seed=record.get("seed"), random_seed=record.get("random_seed", False))
+        apply_prompt_options(fresh, record.get("negative_prompt"), record.get("generation"), record.get("quality"))
+        for index in request.scenes:
+            panels[index]["prompt"] = fresh[index]
+    if request.reseed:
+        for index in selected:
+            panels[index]["prompt"] = {**panels[index]["prompt"], "seed": random.randint(0, 2**32 - 1)}
+    if quality:
+        for index in selected:
+            panels[index]["prompt"] = {**panels[index]["prompt"], "quality": quality}
+
+    overlay = None
+    if record.get("overlay_bubbles", True):
+        overlay = BubbleOverlay([panels[index]["dialogues"] for index in selected])
+    # Keep rendering with the comic's model even if the default has changed
+    model_id = record.get("model_id") or default_model_id()
+    rendered = render_panels([panels[index]["prompt"] for index in selected], transform=overlay, model_id=model_id)
+
+    images = {}
+    for position, panel in enumerate(rendered):
+        index = selected[position]
+        image = publish_panel(panel, inline=request.inline_images)
+        panels[index]["image_id"] = image["id"]
+        images[index] = {"index": index, **image, "filename": f"panel_{index}{panel.extension}", "dialogues": panels[index]["dialogues"]}
+
+    def _apply(current):
+        for index in selected:
+            current["panels"][index] = panels[index]
+
+    comics.update(comic_id, _apply)
+    return {"comic_id": comic_id, "panels": [images[index] for index in selected]}
+
+
+@router.post("/comics/{comic_id}/promote")
+def promote_panels(comic_id: str, request: PromoteRequest):
+    """Re-render accepted panels (e.g. of a draft) at final quality with their stored seeds."""
+    record = get_comic_repository().get(comic_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Comic not found")
+    selected = request.panels or [
+        index for index, panel in enumerate(record["panels"]) if panel["prompt"].get("quality", record.get("quality")) != "final"
+    ]
+    if not selected:
+        return {"comic_id": comic_id, "panels": []}
+    return regenerate_panels(comic_id, RegenerateRequest(panels=selected, quality="final", inline_images=request.inline_images))
@@ -1,20 +1,33 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 
-from generation.sd_generator import generate_images
+from generation.metrics import stage_timer
+from generation.panel import Panel
+from generation.pipeline_registry import allowed_models, get_registry, resolve_model_id
+from generation.quality import get_tier
+from generation.sd_generator import render_panels
+from generation.scheduler import PRIORITY_INTERACTIVE, get_scheduler
 import base64
+import json
+import os
+import queue
+import threading
 from fastapi import BackgroundTasks
 
-from nlp.scene_splitter import split_into_scenes
-from nlp.dialogue_detector import detect_dialogue_lines
-from nlp.character_extractor import extract_characters
+from backend.jobs import STREAMS, JobQueueFull
+from storage.comics import get_comic_repository
+from storage.image_store import get_store, image_url
+
+from nlp.parser import parse_story
 from generation.prompt_builder import build_prompts_for_panels
+from generation.compositor import BubbleOverlay
 
 # We keep the expensive pipeline load inside generation.sd_generator which
 # will attempt to create a diffusers pipeline on first use. To avoid blocking
 # the request loop for long loads, in production you might pre-warm the
-# pipeline on startup. For this prototype we call generate_images directly.
+# pipeline on startup. For this prototype we call render_panels directly.
 
 router = APIRouter()
 
@@ -22,46 +35,94 @@ router = APIRouter()
 class GenerateRequest(BaseModel):
     prompts: List[Dict]
     negative_prompt: str = None
+    # Checkpoint to render with (see GET /generate/models); default: SD_MODEL_ID
+    model_id: Optional[str] = None
+    # "draft", "standard" or "final" for prompts that don't set their own
+    quality: Optional[str] = None
+    # Set to False to get only image ids/URLs (served by GET /images/{id})
+    inline_images: bool = True
+
+
+def select_model(model_id: Optional[str] = None, style: Optional[str] = None) -> str:
+    """Resolve a request's model (explicit id, per-style model or default); 400 if not allowed."""
+    try:
+        return resolve_model_id(model_id, style)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def select_quality(quality: Optional[str] = None) -> str:
+    """Validate a quality tier name (default "standard"); 400 if unknown."""
+    try:
+        return get_tier(quality).name
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def publish_panel(panel: Panel, inline: bool = True) -> Dict:
+    """Add a rendered panel to the image store and describe it for a response.
+
+    The panel is encoded once and those bytes feed both the store and the
+    optional base64 payload. Every entry carries the image `id` and `url`;
+    the base64 payload is only included when `inline` is requested.
+    """
+    data = panel.encode()
+    with stage_timer("store"):
+        image_id = panel.persist(get_store())
+    image = {"id": image_id, "url": image_url(image_id), "filename": panel.filename, "media_type": panel.media_type}
+    if inline:
+        with stage_timer("base64"):
+            image["b64"] = base64.b64encode(data).decode("utf-8")
+    return image
 
 
 @router.post("/generate")
 def generate(request: GenerateRequest, background_tasks: BackgroundTasks):
-    # Generate image files (or fallback placeholders)
+    # Generate panels in memory (or fallback placeholders)
     prompts = request.prompts
     # If a global negative_prompt is provided, apply it to all prompts
     if request.negative_prompt:
         for p in prompts:
             p["negative_prompt"] = request.negative_prompt
+    # Validate each prompt's quality tier, defaulting to the request's
+    for p in prompts:
+        quality = p.get("quality") or request.quality
+        if quality:
+            p["quality"] = select_quality(quality)
     # Allow frontend to suggest width/height/steps/guidance; otherwise use defaults
     # (These will be honored by generation.sd_generator)
-    paths = generate_images(prompts)
-
-    # Read files and return base64-encoded PNGs so clients don't need file access
-    encoded_images = []
-    for p in paths:
-        try:
-            with open(p, "rb") as f:
-                b = f.read()
-            encoded = base64.b64encode(b).decode("utf-8")
-            encoded_images.append({"b64": encoded, "filename": p})
-        except Exception:
-            # If a file can't be read, skip it
-            continue
+    panels = render_panels(prompts, model_id=select_model(request.model_id))
 
-    return {"images": encoded_images}
+    # Publish panels to the image store so clients don't need file access;
+    # base64 payloads are only inlined when requested
+    return {"images": [publish_panel(panel, inline=request.inline_images) for panel in panels]}
 
 
 @router.post("/generate/prewarm")
-def prewarm():
+def prewarm(model_id: Optional[str] = None, style: Optional[str] = None):
     """Trigger pipeline initialization and return status so clients can
-    explicitly pre-warm the Stable Diffusion pipeline.
+    explicitly pre-warm the Stable Diffusion pipeline (the default one, or
+    the one selected by `model_id`/`style`). With `SD_PROCESS_WORKERS`
+    set, the worker processes load it rather than the API process.
     """
-    from generation.sd_generator import _init_pipeline
+    from generation.sd_generator import warm_pipeline
+
+    model_id = select_model(model_id, style)
+    if not warm_pipeline(model_id=model_id):
+        return {"status": "failed", "model_id": model_id, "message": "Pipeline not available (check server logs)."}
+    return {"status": "ok", "model_id": model_id, "message": "Pipeline initialized"}
+
+
+@router.get("/generate/models")
+def models():
+    """Selectable models plus the resident pipelines, their sizes and load times."""
+    return {"allowed": allowed_models(), **get_registry().stats()}
 
-    pipe = _init_pipeline()
-    if pipe is None:
-        return {"status": "failed", "message": "Pipeline not available (check server logs)."}
-    return {"status": "ok", "message": "Pipeline initialized"}
+
+@router.get("/generate/scheduler")
+def scheduler_stats():
+    """Queue wait vs. compute time of the shared pipeline device worker."""
+    return get_scheduler().stats()
 
 
 class ComicRequest(BaseModel):
@@ -70,92 +131,223 @@ class ComicRequest(BaseModel):
     negative_prompt: str = None
     generation: dict = None
     overlay_bubbles: bool = True
+    seed: Optional[int] = None  # story-level seed for deterministic panel seeds
+    random_seed: bool = False
+    # "draft" renders fast previews; promote kept panels via /comics/{id}/promote
+    quality: str = "standard"
+    # Checkpoint override; by default the style's model (SD_STYLE_MODELS) or SD_MODEL_ID
+    model_id: Optional[str] = None
+    inline_images: bool = True
 
 
-@router.post("/generate/comic")
-def generate_comic(request: ComicRequest):
-    # 1. Split story into scenes/panels
-    scenes = split_into_scenes(request.story)
-    # 2. Extract characters for consistency
-    characters = extract_characters(request.story)
-    # 3. For each scene, extract dialogue
+def build_comic_panels(request: ComicRequest):
+    """Parse the story and build one prompt per panel.
+
+    Returns (panels, prompts).
+    """
+    # 1-3. Split story into scenes/panels, rank characters and detect
+    # dialogue, all in one pass over the text; each panel gets the
+    # characters that appear in its scene
+    with stage_timer("parse"):
+        scenes, _ = parse_story(request.story)
     panels = []
     for scene in scenes:
-        dialogues = detect_dialogue_lines(scene)
         panels.append({
-            "scene": scene,
-            "dialogues": dialogues,
-            "characters": characters
+            "scene": scene.text,
+            "dialogues": scene.dialogues,
+            "characters": scene.characters
         })
     # 4. Build prompts for each panel
-    prompts = build_prompts_for_panels(panels, style=request.style)
+    with stage_timer("prompts"):
+        prompts = build_prompts_for_panels(panels, style=request.style, seed=request.seed, random_seed=request.random_seed)
+        apply_prompt_options(prompts, request.negative_prompt, request.generation, request.quality)
+    return panels, prompts
+
+
+def apply_prompt_options(prompts: List[Dict], negative_prompt: Optional[str] = None, generation: Optional[Dict] = None, quality: Optional[str] = None) -> None:
+    """Apply a request's global negative prompt, generation parameters and quality tier in place."""
     # If a global negative_prompt is provided, apply it to all prompts
-    if request.negative_prompt:
+    if negative_prompt:
         for p in prompts:
-            p["negative_prompt"] = request.negative_prompt
+            p["negative_prompt"] = negative_prompt
 
     # If generation parameters are provided (width/height/steps/guidance), attach to each prompt
-    gen = request.generation or {}
+    gen = generation or {}
     if gen:
         for p in prompts:
             # Only copy allowed keys
             for k in ("width", "height", "steps", "guidance_scale", "seed"):
                 if k in gen:
                     p[k] = gen[k]
-    # 5. Generate images
-    image_paths = generate_images(prompts)
-    # 6. Optionally overlay speech bubbles with all dialogue lines
 
-    def draw_speech_bubbles(image_path, dialogues):
-        from PIL import Image, ImageDraw, ImageFont
+    if quality:
+        for p in prompts:
+            p["quality"] = quality
+
 
-        img = Image.open(image_path).convert("RGBA")
-        draw = ImageDraw.Draw(img)
-        try:
-            font = ImageFont.truetype("arial.ttf", 18)
-        except Exception:
-            font = ImageFont.load_default()
-        # Bubble layout: stack from bottom, one per dialogue
-        margin = 10
-        bubble_height = 50
-        width, height = img.size
-        y = height - margin - bubble_height * len(dialogues)
-        for speaker, line in dialogues:
-            bubble_w = width - 2 * margin
-            bubble_h = bubble_height - 10
-            x = margin
-            # Draw rounded rectangle (bubble)
-            draw.rounded_rectangle([x, y, x + bubble_w, y + bubble_h], radius=20, fill=(255, 255, 255, 220), outline=(0, 0, 0, 255), width=2)  # noqa: E501
-            # Draw tail (simple triangle)
-            tail_x = x + bubble_w // 2
-            tail_y = y + bubble_h
-            draw.polygon([(tail_x - 10, tail_y), (tail_x + 10, tail_y), (tail_x, tail_y + 15)], fill=(255, 255, 255, 220), outline=(0, 0, 0, 255))
-            # Draw speaker name
-            if speaker:
-                draw.text((x + 15, y + 5), f"{speaker}: ", font=font, fill=(0, 0, 0, 255))
-                text_x = x + 15 + draw.textlength(f"{speaker}: ", font=font)
-            else:
-                text_x = x + 15
-            # Draw dialogue line
-            draw.text((text_x, y + 5), line, font=font, fill=(0, 0, 0, 255))
-            y += bubble_height
-        # Save as PNG (overwrite original)
-        img = img.convert("RGB")
-        img.save(image_path)
-    # Overlay bubbles for each panel only if requested (overlay_bubbles True)
+def _comic_record(request: ComicRequest, panels: List[Dict], prompts: List[Dict], model_id: str) -> Dict:
+    """Everything needed to fetch or partially regenerate the comic later."""
+    characters: Dict[str, None] = {}
+    for panel in panels:
+        characters.update(dict.fromkeys(panel.get("characters", [])))
+    return {
+        "story": request.story,
+        "style": request.style,
+        "negative_prompt": request.negative_prompt,
+        "generation": request.generation,
+        "overlay_bubbles": request.overlay_bubbles,
+        "seed": request.seed,
+        "random_seed": request.random_seed,
+        "quality": request.quality,
+        "model_id": model_id,
+        "characters": list(characters),
+        "panels": [
+            {
+                "scene": panel["scene"],
+                "dialogues": panel.get("dialogues", []),
+                "characters": panel.get("characters", []),
+                "prompt": prompt,
+                "image_id": None,
+            }
+            for panel, prompt in zip(panels, prompts)
+        ],
+    }
+
+
+def run_comic_pipeline(
+    request: ComicRequest,
+    on_start: Optional[Callable[[int], None]] = None,
+    on_panel: Optional[Callable[[int, Dict], None]] = None,
+    on_step: Optional[Callable[[List[int], int, int], None]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Dict:
+    """Run parse -> generate -> bubbles -> encode for a comic request.
+
+    `on_start(panel_count)` is called once prompts are built,
+    `on_step(indices, step, total_steps)` after each denoising step and
+    `on_panel(index, panel)` as soon as each panel is encoded, so callers
+    such as the job queue can report per-panel progress. `priority` orders
+    the pipeline calls on the shared device worker.
+
+    The parse output, prompts, seeds and panel image ids are stored in the
+    comic repository (`storage.comics`); the returned `comic_id` can be
+    fetched or partially regenerated via `/comics/{id}`.
+    """
+    model_id = select_model(request.model_id, request.style)
+    select_quality(request.quality)
+    panels, prompts = build_comic_panels(request)
+    comics = get_comic_repository()
+    comic_id = comics.create(_comic_record(request, panels, prompts, model_id))
+    if on_start is not None:
+        on_start(len(panels))
+
+    output_images: List[Optional[Dict]] = [None] * len(panels)
+
+    def _finish_panel(panel):
+        idx = panel.index
+        dialogues = panels[idx].get("dialogues", [])
+        # 7. Publish image for response straight from the encoded bytes
+        image = publish_panel(panel, inline=request.inline_images)
+        output_images[idx] = image
+        if on_panel is not None:
+            on_panel(idx, {**image, "dialogues": dialogues})
+
+    # 6. Optionally overlay speech bubbles with all dialogue lines; the
+    # compositor draws them in memory before each panel is encoded
+    overlay = None
     if request.overlay_bubbles:
-        for idx, (path, panel) in enumerate(zip(image_paths, panels)):
-            if panel.get("dialogues"):
-                draw_speech_bubbles(path, panel["dialogues"])
-    # 7. Encode images for response
-    output_images = []
-    for idx, path in enumerate(image_paths):
-        with open(path, "rb") as f:
-            b = f.read()
-        b64 = base64.b64encode(b).decode("utf-8")
-        output_images.append({"b64": b64, "filename": f"panel_{idx}.png"})
+        overlay = BubbleOverlay([panel.get("dialogues", []) for panel in panels])
+    # 5. Generate panels in memory, finishing each one as soon as it is ready
+    render_panels(prompts, on_panel=_finish_panel, on_step=on_step, priority=priority, transform=overlay, model_id=model_id)
+    comics.set_images(comic_id, {idx: image["id"] for idx, image in enumerate(output_images) if image})
     # 8. Collect dialogues for each panel
     dialogues = [panel.get("dialogues", []) for panel in panels]
-    return {"images": output_images, "dialogues": dialogues}
+    return {"comic_id": comic_id, "images": output_images, "dialogues": dialogues}
+
+
+def comic_job_result(result: Dict) -> Dict:
+    """The part of a comic result a job keeps: no image payloads, just ids via the comic."""
+    return {"comic_id": result["comic_id"], "dialogues": result["dialogues"]}
+
+
+@router.post("/generate/comic")
+def generate_comic(request: ComicRequest):
+    return run_comic_pipeline(request)
 
 
+@router.post("/generate/comic/stream")
+def generate_comic_stream(request: ComicRequest):
+    """Stream the comic as NDJSON events while it is generated.
+
+    Emits `queued`, `start` (panel count), `progress` (denoising steps),
+    `panel` (image + dialogues, as soon as each panel is ready) and finally
+    `done` or `error`. The work runs on the interactive `STREAMS` manager,
+    not behind queued `/jobs/comic` bulk work, and its pipeline calls are
+    scheduled at `PRIORITY_INTERACTIVE`; the `job_id` can also be polled
+    via `/jobs/{id}` if the stream drops.
+
+    At most `STREAM_MAX_EVENTS` (default 256) events are buffered for a
+    slow client: further `progress` events are dropped and the other
+    events wait for room. Once the client disconnects nothing more is
+    buffered.
+    """
+    # Reject an unknown model or quality before queueing
+    select_model(request.model_id, request.style)
+    select_quality(request.quality)
+    events: "queue.Queue" = queue.Queue(maxsize=max(1, int(os.environ.get("STREAM_MAX_EVENTS", 256))))
+    closed = threading.Event()
+
+    def _put(event, droppable: bool = False) -> None:
+        if droppable:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass
+            return
+        while not closed.is_set():
+            try:
+                events.put(event, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _job(job):
+        def on_start(total):
+            job.set_total(total)
+            _put({"type": "start", "total": total})
+
+        def on_panel(idx, panel):
+            job.panel_done(idx, panel)
+            _put({"type": "panel", "index": idx, **panel})
+
+        def on_step(indices, step, total_steps):
+            _put({"type": "progress", "panels": indices, "step": step, "steps": total_steps}, droppable=True)
+
+        try:
+            result = run_comic_pipeline(request, on_start=on_start, on_panel=on_panel, on_step=on_step, priority=PRIORITY_INTERACTIVE)
+            _put({"type": "done", "comic_id": result["comic_id"]})
+            return comic_job_result(result)
+        except Exception as exc:
+            _put({"type": "error", "detail": str(exc)})
+            raise
+        finally:
+            _put(None)
+
+    try:
+        job = STREAMS.submit("comic", _job)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+
+    def _stream():
+        try:
+            yield json.dumps({"type": "queued", "job_id": job.id}) + "\n"
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            # Client gone (or stream finished): stop buffering events
+            closed.set()
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import os
+import tempfile
+import zipfile
+
+from storage.image_store import get_store
+
+router = APIRouter()
+
+# Images are content-addressed, so a given id never changes
+_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/images/archive")
+def download_archive(ids: str = Query(..., description="Comma-separated image ids, in panel order")):
+    """Bundle the given images into a ZIP download (stored, not recompressed)."""
+    store = get_store()
+    paths = []
+    for image_id in [i for i in ids.split(",") if i]:
+        path = store.get_path(image_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+        paths.append(path)
+    # Spool to disk past a few MB so large comics don't sit in memory
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    with zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_STORED) as zf:
+        for idx, path in enumerate(paths):
+            zf.write(path, arcname=f"panel_{idx}{os.path.splitext(path)[1]}")
+    spool.seek(0)
+
+    def _iter():
+        try:
+            for chunk in iter(lambda: spool.read(64 * 1024), b""):
+                yield chunk
+        finally:
+            spool.close()
+
+    return StreamingResponse(_iter(), media_type="application/zip", headers={"Content-Disposition": 'attachment; filename="comic_panels.zip"'})
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match list ("*" or comma-separated, weak or strong tags) covers `etag`."""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag == etag or tag == f"W/{etag}":
+            return True
+    return False
+
+
+@router.get("/images/{image_id}")
+def get_image(image_id: str, request: Request):
+    path = get_store().get_path(image_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
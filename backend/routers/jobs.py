@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+from backend.jobs import JOBS, JobQueueFull, find_job
+from backend.routers.generate import ComicRequest, comic_job_result, run_comic_pipeline, select_model, select_quality
+from generation.scheduler import PRIORITY_BULK
+
+router = APIRouter()
+
+
+def _comic_job(job, request: ComicRequest):
+    # Queued jobs are bulk work; interactive requests get the device first
+    result = run_comic_pipeline(request, on_start=job.set_total, on_panel=job.panel_done, priority=PRIORITY_BULK)
+    return comic_job_result(result)
+
+
+@router.post("/jobs/comic", status_code=202)
+def submit_comic_job(request: ComicRequest):
+    """Queue a comic generation job and return its id immediately."""
+    select_model(request.model_id, request.style)
+    select_quality(request.quality)
+    try:
+        job = JOBS.submit("comic", _comic_job, request)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = find_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    status = job.to_dict()
+    if job.status == "done" and job.result is not None:
+        status["comic_id"] = job.result.get("comic_id")
+        status["dialogues"] = job.result.get("dialogues", [])
+    return status
+
+
+@router.get("/jobs/{job_id}/panels/{index}")
+def get_job_panel(job_id: str, index: int):
+    job = find_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    finished = job.status in ("done", "failed")
+    panel, total = job.get_panel(index)
+    if index < 0 or ((total or finished) and index >= total):
+        raise HTTPException(status_code=404, detail="Panel not found")
+    if panel is None:
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail=job.error or "Job failed")
+        # Not ready yet; clients should keep polling
+        return JSONResponse(status_code=202, content={"status": job.status, "index": index})
+    # Image bytes are served by GET /images/{id} (see `url`)
+    return {"status": "done", "index": index, **panel}
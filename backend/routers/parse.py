@@ -1,9 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from nlp.scene_splitter import split_into_scenes
-from nlp.character_extractor import extract_characters
-from nlp.dialogue_detector import detect_dialogue_lines
+from backend.batch import OrderedBatch, ndjson_lines, parse_document, parse_item, submit_from_request
 
 router = APIRouter()
 
@@ -15,10 +14,21 @@ class ParseRequest(BaseModel):
 
 @router.post("/parse")
 def parse(request: ParseRequest):
-    scenes = split_into_scenes(request.text)
-    characters = extract_characters(request.text)
-    panels = []
-    for idx, scene in enumerate(scenes):
-        dialogues = detect_dialogue_lines(scene)
-        panels.append({"id": idx, "scene": scene, "dialogues": dialogues})
-    return {"language": "en", "characters": characters, "panels": panels}
+    return parse_document(request.text)
+
+
+@router.post("/parse/batch")
+async def parse_batch(request: Request):
+    """Parse many stories in parallel and stream results as NDJSON.
+
+    Body: `{"stories": [{"title", "text"}, ...]}`, a plain JSON list, or an
+    NDJSON upload with one story per line. Each output line is the `/parse`
+    response plus its `index` (and `title`), in input order; a story that
+    fails yields `{"index", "error"}` instead.
+    """
+    batch = OrderedBatch(parse_item)
+    try:
+        await submit_from_request(request, batch, "stories")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return StreamingResponse(ndjson_lines(batch.results()), media_type="application/x-ndjson")
@@ -1,7 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 
+from backend.batch import OrderedBatch, ndjson_lines, prompts_item, submit_from_request
 from generation.prompt_builder import build_prompts_for_panels
 
 router = APIRouter()
@@ -10,11 +12,27 @@ router = APIRouter()
 class PromptsRequest(BaseModel):
     panels: List[Dict]
     style: str = "manga"
+    seed: Optional[int] = None
+    random_seed: bool = False
 
 
 @router.post("/prompts")
 def prompts(request: PromptsRequest):
-    prompts = build_prompts_for_panels(request.panels, request.style)
+    prompts = build_prompts_for_panels(request.panels, request.style, seed=request.seed, random_seed=request.random_seed)
     return prompts
 
 
+@router.post("/prompts/batch")
+async def prompts_batch(request: Request):
+    """Build prompts for many panel lists in parallel, streamed as NDJSON.
+
+    Body: `{"items": [{"panels", "style", "seed", "random_seed"}, ...]}`, a
+    plain JSON list, or an NDJSON upload with one item per line. Each output
+    line is `{"index", "prompts"}` (or `{"index", "error"}`), in input order.
+    """
+    batch = OrderedBatch(prompts_item)
+    try:
+        await submit_from_request(request, batch, "items")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return StreamingResponse(ndjson_lines(batch.results()), media_type="application/x-ndjson")
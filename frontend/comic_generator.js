@@ -29,6 +29,16 @@ document.addEventListener('DOMContentLoaded', function () {
 
   // Download all images as ZIP
   async function downloadAllAsZip(images) {
+    // Images served from the store can be bundled server-side
+    if (images.length && images.every(img => img.id)) {
+      const a = document.createElement('a');
+      a.href = '/images/archive?ids=' + images.map(img => img.id).join(',');
+      a.download = 'comic_panels.zip';
+      document.body.appendChild(a);
+      a.click();
+      document.body.removeChild(a);
+      return;
+    }
     if (!window.JSZip) {
       alert('JSZip library not loaded.');
       return;
@@ -58,191 +68,191 @@ document.addEventListener('DOMContentLoaded', function () {
     return bytes;
   }
 
-  // Render comic panels
-  function renderPanels(images, dialoguesList, dir, readOnly = false) {
-    panelsSection.innerHTML = '';
-    setDirection(dir);
-    generateBtn.disabled = false;
-    images.forEach((img, idx) => {
-      // Panel container
-      const card = document.createElement('div');
-      card.className = 'comic-panel-card';
-      // Image container (for overlay)
-      const imgContainer = document.createElement('div');
-      imgContainer.className = 'image-container';
-      imgContainer.style.width = '100%';
-      imgContainer.style.position = 'relative';
-      // Panel image
-      const image = document.createElement('img');
-      image.className = 'comic-panel-img';
-      image.src = 'data:image/png;base64,' + img.b64;
-      image.alt = `Panel ${idx+1}`;
-      imgContainer.appendChild(image);
-      // Speech bubble overlay
-      const bubble = document.createElement('div');
-      bubble.className = 'speech-bubble';
-      bubble.setAttribute('tabindex', '0');
-      // Compose bubble text from dialogues
-      let bubbleText = '';
-      if (Array.isArray(dialoguesList[idx])) {
-        bubbleText = dialoguesList[idx].map(([speaker, line]) => speaker ? `${speaker}: ${line}` : line).join('\n');
-      }
-      bubble.innerText = bubbleText;
-      // Set initial position (bottom center)
-      bubble.style.left = '50%';
-      bubble.style.top = '80%';
-      bubble.style.transform = 'translate(-50%, 0)';
-      // Bubble style state
-      let bubbleStyle = 'default';
-      // Drag state
-      let isDragging = false, dragOffsetX = 0, dragOffsetY = 0;
-      // Mouse events
-      bubble.addEventListener('mousedown', function(e) {
-        if (bubble.classList.contains('editing')) return;
-        isDragging = true;
-        bubble.classList.add('dragging');
-        const rect = bubble.getBoundingClientRect();
-        dragOffsetX = e.clientX - rect.left;
-        dragOffsetY = e.clientY - rect.top;
-        document.body.style.userSelect = 'none';
-      });
-      document.addEventListener('mousemove', onMouseMove);
-      document.addEventListener('mouseup', onMouseUp);
-      function onMouseMove(e) {
-        if (!isDragging) return;
-        moveBubble(e.clientX, e.clientY);
-      }
-      function onMouseUp() {
-        if (isDragging) {
-          isDragging = false;
-          bubble.classList.remove('dragging');
-          document.body.style.userSelect = '';
-        }
-      }
-      // Touch events
-      bubble.addEventListener('touchstart', function(e) {
-        if (bubble.classList.contains('editing')) return;
-        isDragging = true;
-        bubble.classList.add('dragging');
-        const touch = e.touches[0];
-        const rect = bubble.getBoundingClientRect();
-        dragOffsetX = touch.clientX - rect.left;
-        dragOffsetY = touch.clientY - rect.top;
-        e.preventDefault();
-      }, { passive: false });
-      document.addEventListener('touchmove', onTouchMove, { passive: false });
-      document.addEventListener('touchend', onTouchEnd);
-      function onTouchMove(e) {
-        if (!isDragging) return;
-        const touch = e.touches[0];
-        moveBubble(touch.clientX, touch.clientY);
-        e.preventDefault();
-      }
-      function onTouchEnd() {
-        if (isDragging) {
-          isDragging = false;
-          bubble.classList.remove('dragging');
-        }
+  // Build a single comic panel card (image, draggable bubble, controls)
+  function buildPanelCard(img, idx, dialogues, readOnly = false) {
+    // Panel container
+    const card = document.createElement('div');
+    card.className = 'comic-panel-card';
+    // Image container (for overlay)
+    const imgContainer = document.createElement('div');
+    imgContainer.className = 'image-container';
+    imgContainer.style.width = '100%';
+    imgContainer.style.position = 'relative';
+    // Panel image
+    const image = document.createElement('img');
+    image.className = 'comic-panel-img';
+    // Prefer the cacheable image URL; fall back to inline base64
+    image.src = img.url || ('data:' + (img.media_type || 'image/png') + ';base64,' + img.b64);
+    image.alt = `Panel ${idx+1}`;
+    imgContainer.appendChild(image);
+    // Speech bubble overlay
+    const bubble = document.createElement('div');
+    bubble.className = 'speech-bubble';
+    bubble.setAttribute('tabindex', '0');
+    // Compose bubble text from dialogues
+    let bubbleText = '';
+    if (Array.isArray(dialogues)) {
+      bubbleText = dialogues.map(([speaker, line]) => speaker ? `${speaker}: ${line}` : line).join('\n');
+    }
+    bubble.innerText = bubbleText;
+    // Set initial position (bottom center)
+    bubble.style.left = '50%';
+    bubble.style.top = '80%';
+    bubble.style.transform = 'translate(-50%, 0)';
+    // Bubble style state
+    let bubbleStyle = 'default';
+    // Drag state
+    let isDragging = false, dragOffsetX = 0, dragOffsetY = 0;
+    // Mouse events
+    bubble.addEventListener('mousedown', function(e) {
+      if (bubble.classList.contains('editing')) return;
+      isDragging = true;
+      bubble.classList.add('dragging');
+      const rect = bubble.getBoundingClientRect();
+      dragOffsetX = e.clientX - rect.left;
+      dragOffsetY = e.clientY - rect.top;
+      document.body.style.userSelect = 'none';
+    });
+    document.addEventListener('mousemove', onMouseMove);
+    document.addEventListener('mouseup', onMouseUp);
+    function onMouseMove(e) {
+      if (!isDragging) return;
+      moveBubble(e.clientX, e.clientY);
+    }
+    function onMouseUp() {
+      if (isDragging) {
+        isDragging = false;
+        bubble.classList.remove('dragging');
+        document.body.style.userSelect = '';
       }
-      // Move bubble helper
-      function moveBubble(clientX, clientY) {
-        const containerRect = imgContainer.getBoundingClientRect();
-        const bubbleRect = bubble.getBoundingClientRect();
-        let x = clientX - containerRect.left - dragOffsetX;
-        let y = clientY - containerRect.top - dragOffsetY;
-        // Clamp within container
-        x = Math.max(0, Math.min(x, containerRect.width - bubbleRect.width));
-        y = Math.max(0, Math.min(y, containerRect.height - bubbleRect.height));
-        bubble.style.left = x + 'px';
-        bubble.style.top = y + 'px';
-        bubble.style.transform = 'none';
+    }
+    // Touch events
+    bubble.addEventListener('touchstart', function(e) {
+      if (bubble.classList.contains('editing')) return;
+      isDragging = true;
+      bubble.classList.add('dragging');
+      const touch = e.touches[0];
+      const rect = bubble.getBoundingClientRect();
+      dragOffsetX = touch.clientX - rect.left;
+      dragOffsetY = touch.clientY - rect.top;
+      e.preventDefault();
+    }, { passive: false });
+    document.addEventListener('touchmove', onTouchMove, { passive: false });
+    document.addEventListener('touchend', onTouchEnd);
+    function onTouchMove(e) {
+      if (!isDragging) return;
+      const touch = e.touches[0];
+      moveBubble(touch.clientX, touch.clientY);
+      e.preventDefault();
+    }
+    function onTouchEnd() {
+      if (isDragging) {
+        isDragging = false;
+        bubble.classList.remove('dragging');
       }
-      // Input field for live editing
-      const input = document.createElement('input');
-      input.type = 'text';
-      input.className = 'speech-input';
-      input.value = bubbleText;
-      input.placeholder = 'Type dialogue...';
-      input.addEventListener('input', function() {
-        bubble.innerText = input.value;
-      });
-      // Sync bubble edits back to input (if user edits bubble directly)
-      bubble.addEventListener('input', function() {
-        input.value = bubble.innerText;
-      });
-      // Make bubble editable on double click
-      bubble.setAttribute('contenteditable', 'true');
-      bubble.spellcheck = true;
-      // Prevent drag when editing text
-      bubble.addEventListener('keydown', function(e) {
-        if (e.key === 'Enter') bubble.blur();
-      });
-      bubble.addEventListener('focus', function() {
-        bubble.classList.add('editing');
-      });
-      bubble.addEventListener('blur', function() {
-        bubble.classList.remove('editing');
-      });
-      // Only allow drag if not focused for editing
-      bubble.addEventListener('mousedown', function(e) {
-        if (document.activeElement === bubble) {
-          isDragging = false;
-          return;
-        }
-      });
-      // Bubble style selector
-      const styleSelector = document.createElement('select');
-      styleSelector.className = 'bubble-style-selector';
-      [
-        { value: 'default', label: 'Speech' },
-        { value: 'thought', label: 'Thought' },
-        { value: 'jagged', label: 'Shout' }
-      ].forEach(opt => {
-        const o = document.createElement('option');
-        o.value = opt.value;
-        o.innerText = opt.label;
-        styleSelector.appendChild(o);
-      });
-      styleSelector.value = 'default';
-      styleSelector.addEventListener('change', function() {
-        bubble.classList.remove('thought', 'jagged');
-        bubbleStyle = styleSelector.value;
-        if (bubbleStyle === 'thought') bubble.classList.add('thought');
-        else if (bubbleStyle === 'jagged') bubble.classList.add('jagged');
-      });
-      // Download with Bubble button
-      const dlBubbleBtn = document.createElement('button');
-      dlBubbleBtn.innerText = 'Download with Bubble';
-      dlBubbleBtn.type = 'button';
-      dlBubbleBtn.style.marginLeft = '8px';
-      dlBubbleBtn.onclick = function() {
-        exportPanelWithBubble(image, bubble, bubbleStyle, card);
-      };
-      // Assemble
-      imgContainer.appendChild(bubble);
-      card.appendChild(imgContainer);
-      card.appendChild(input);
-      card.appendChild(styleSelector);
-      // Download buttons
-      const actions = document.createElement('div');
-      actions.className = 'panel-actions';
-      // Download PNG
-      const dlBtn = document.createElement('button');
-      dlBtn.innerText = 'Download PNG';
-      dlBtn.onclick = () => downloadImage(image.src, img.filename || `panel_${idx+1}.png`);
-      actions.appendChild(dlBtn);
-      actions.appendChild(dlBubbleBtn);
-      card.appendChild(actions);
-      panelsSection.appendChild(card);
-      // If readOnly mode is requested, disable editable controls for this panel
-      if (readOnly) {
-        bubble.contentEditable = 'false';
-        bubble.classList.add('readonly-bubble');
-        bubble.style.pointerEvents = 'none';
-        input.disabled = true;
-        styleSelector.disabled = true;
+    }
+    // Move bubble helper
+    function moveBubble(clientX, clientY) {
+      const containerRect = imgContainer.getBoundingClientRect();
+      const bubbleRect = bubble.getBoundingClientRect();
+      let x = clientX - containerRect.left - dragOffsetX;
+      let y = clientY - containerRect.top - dragOffsetY;
+      // Clamp within container
+      x = Math.max(0, Math.min(x, containerRect.width - bubbleRect.width));
+      y = Math.max(0, Math.min(y, containerRect.height - bubbleRect.height));
+      bubble.style.left = x + 'px';
+      bubble.style.top = y + 'px';
+      bubble.style.transform = 'none';
+    }
+    // Input field for live editing
+    const input = document.createElement('input');
+    input.type = 'text';
+    input.className = 'speech-input';
+    input.value = bubbleText;
+    input.placeholder = 'Type dialogue...';
+    input.addEventListener('input', function() {
+      bubble.innerText = input.value;
+    });
+    // Sync bubble edits back to input (if user edits bubble directly)
+    bubble.addEventListener('input', function() {
+      input.value = bubble.innerText;
+    });
+    // Make bubble editable on double click
+    bubble.setAttribute('contenteditable', 'true');
+    bubble.spellcheck = true;
+    // Prevent drag when editing text
+    bubble.addEventListener('keydown', function(e) {
+      if (e.key === 'Enter') bubble.blur();
+    });
+    bubble.addEventListener('focus', function() {
+      bubble.classList.add('editing');
+    });
+    bubble.addEventListener('blur', function() {
+      bubble.classList.remove('editing');
+    });
+    // Only allow drag if not focused for editing
+    bubble.addEventListener('mousedown', function(e) {
+      if (document.activeElement === bubble) {
+        isDragging = false;
+        return;
       }
     });
+    // Bubble style selector
+    const styleSelector = document.createElement('select');
+    styleSelector.className = 'bubble-style-selector';
+    [
+      { value: 'default', label: 'Speech' },
+      { value: 'thought', label: 'Thought' },
+      { value: 'jagged', label: 'Shout' }
+    ].forEach(opt => {
+      const o = document.createElement('option');
+      o.value = opt.value;
+      o.innerText = opt.label;
+      styleSelector.appendChild(o);
+    });
+    styleSelector.value = 'default';
+    styleSelector.addEventListener('change', function() {
+      bubble.classList.remove('thought', 'jagged');
+      bubbleStyle = styleSelector.value;
+      if (bubbleStyle === 'thought') bubble.classList.add('thought');
+      else if (bubbleStyle === 'jagged') bubble.classList.add('jagged');
+    });
+    // Download with Bubble button
+    const dlBubbleBtn = document.createElement('button');
+    dlBubbleBtn.innerText = 'Download with Bubble';
+    dlBubbleBtn.type = 'button';
+    dlBubbleBtn.style.marginLeft = '8px';
+    dlBubbleBtn.onclick = function() {
+      exportPanelWithBubble(image, bubble, bubbleStyle, card);
+    };
+    // Assemble
+    imgContainer.appendChild(bubble);
+    card.appendChild(imgContainer);
+    card.appendChild(input);
+    card.appendChild(styleSelector);
+    // Download buttons
+    const actions = document.createElement('div');
+    actions.className = 'panel-actions';
+    // Download PNG
+    const dlBtn = document.createElement('button');
+    dlBtn.innerText = 'Download PNG';
+    dlBtn.onclick = () => downloadImage(image.src, img.filename || `panel_${idx+1}.png`);
+    actions.appendChild(dlBtn);
+    actions.appendChild(dlBubbleBtn);
+    card.appendChild(actions);
+    // If readOnly mode is requested, disable editable controls for this panel
+    if (readOnly) {
+      bubble.contentEditable = 'false';
+      bubble.classList.add('readonly-bubble');
+      bubble.style.pointerEvents = 'none';
+      input.disabled = true;
+      styleSelector.disabled = true;
+    }
+    return card;
+  }
+
+  // Wire export controls once all panels are on the page
+  function finishRender(images, readOnly = false) {
     // Hook up the right-side download panel button instead of creating an in-panel button
     const downloadSideBtn = document.getElementById('download-zip-panel-btn');
     if (downloadSideBtn) {
@@ -362,6 +372,67 @@ document.addEventListener('DOMContentLoaded', function () {
     ctx.closePath();
   }
 
+  // Request the comic as an NDJSON stream and render panels incrementally
+  async function streamComic(body, dir) {
+    const resp = await fetch('/generate/comic/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(body)
+    });
+    if (resp.status === 429) throw new Error('Server is busy, please try again shortly');
+    if (!resp.ok || !resp.body) throw new Error('Failed to generate comic');
+    const images = [];
+    const slots = [];
+    const handleEvent = (event) => {
+      if (event.type === 'start') {
+        panelsSection.innerHTML = '';
+        setDirection(dir);
+        for (let i = 0; i < event.total; i++) {
+          const slot = document.createElement('div');
+          slot.className = 'comic-panel-card';
+          slot.style.textAlign = 'center';
+          slot.style.padding = '32px';
+          slot.innerText = `Panel ${i+1}: waiting...`;
+          panelsSection.appendChild(slot);
+          slots.push(slot);
+        }
+      } else if (event.type === 'progress') {
+        (event.panels || []).forEach((i) => {
+          if (slots[i] && !images[i]) slots[i].innerText = `Panel ${i+1}: step ${event.step}/${event.steps}`;
+        });
+      } else if (event.type === 'panel') {
+        const img = { id: event.id, url: event.url, b64: event.b64, filename: event.filename, media_type: event.media_type };
+        images[event.index] = img;
+        // Cache hits or placeholders may arrive without a start slot
+        const card = buildPanelCard(img, event.index, event.dialogues || [], false);
+        if (slots[event.index]) {
+          slots[event.index].replaceWith(card);
+          slots[event.index] = card;
+        } else {
+          panelsSection.appendChild(card);
+        }
+      } else if (event.type === 'error') {
+        throw new Error(event.detail || 'Failed to generate comic');
+      }
+    };
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (value) buffer += decoder.decode(value, { stream: true });
+      let newline;
+      while ((newline = buffer.indexOf('\n')) >= 0) {
+        const line = buffer.slice(0, newline).trim();
+        buffer = buffer.slice(newline + 1);
+        if (line) handleEvent(JSON.parse(line));
+      }
+      if (done) break;
+    }
+    generateBtn.disabled = false;
+    finishRender(images.filter(Boolean), false);
+  }
+
   // Handle form submission
   form.addEventListener('submit', async function (e) {
     e.preventDefault();
@@ -389,18 +460,10 @@ document.addEventListener('DOMContentLoaded', function () {
       if (Object.keys(genParams).length) body.generation = genParams;
       // Include overlay_bubbles=false so backend doesn't render bubbles into images
       body.overlay_bubbles = false;
-      const resp = await fetch('/generate/comic', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(body)
-      });
-      if (!resp.ok) throw new Error('Failed to generate comic');
-      const data = await resp.json();
-      const images = data.images || [];
-      const dialoguesList = data.dialogues || images.map(() => []);
-      // After generating, render panels and allow client-side editing of bubbles
-      // Also send overlay_bubbles=false in the request so server doesn't bake bubbles into PNGs
-      renderPanels(images, dialoguesList, dir, false);
+      // Fetch panels by URL instead of inlining base64 in the stream
+      body.inline_images = false;
+      // Stream NDJSON events so each panel renders as soon as it is ready
+      await streamComic(body, dir);
     } catch (err) {
       panelsSection.innerHTML = '<div style="color:#ffb4b4;text-align:center;padding:32px;">Error: ' + err.message + '</div>';
       generateBtn.disabled = false;
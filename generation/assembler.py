@@ -1,52 +1,145 @@
-"""Assemble generated panel images into a comic page and export as PDF/PNG."""
-from typing import List
+"""Assemble generated panel images into a comic page and export as PDF/PNG.
+
+Panels can be given as file paths, PIL images or in-memory
+`generation.panel.Panel` objects, so freshly rendered panels are laid out
+without a round trip through disk.
+"""
+from typing import List, Optional, Union
 from PIL import Image
+import io
 import os
-try:
-    from reportlab.pdfgen import canvas  # type: ignore
-    from reportlab.lib.pagesizes import letter  # type: ignore
-    _HAS_REPORTLAB = True
-except Exception:
-    _HAS_REPORTLAB = False
+
+from generation.encoding import Encoding, encoder_pool, page_encoding
+from generation.exporter import write_pdf
+from generation.panel import Panel
+
+PanelSource = Union[str, Image.Image, Panel]
+
+
+def _shrink(img: Image.Image, thumb_size) -> Image.Image:
+    w, h = thumb_size
+    factor = min(img.width // w, img.height // h)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img.resize(thumb_size)
 
 
-def assemble_grid(image_paths: List[str], columns: int = 2, thumb_size=(512, 512), output_path: str = "output/comic_page.png") -> str:
-    """Arrange images in a grid and save a single PNG.
+def _load_thumbnail(source: PanelSource, thumb_size) -> Image.Image:
+    """Decode one panel at (close to) the target size and return it as RGB.
 
-    Returns path to the saved PNG.
+    JPEG sources are decoded at a reduced scale via `draft`; other formats
+    are shrunk with `reduce` before the final resample, so the full-size
+    bitmap is released as early as possible. An in-memory panel's bitmap
+    is used if it is already decoded; otherwise its encoded bytes are
+    decoded like a file, without caching the bitmap on the panel.
     """
-    if not image_paths:
-        raise ValueError("No images to assemble")
-    images = [Image.open(p).convert("RGB") for p in image_paths]
-    rows = (len(images) + columns - 1) // columns
+    if isinstance(source, Panel):
+        source = source.image if source.decoded else io.BytesIO(source.encode())
+    if isinstance(source, Image.Image):
+        return _shrink(source, thumb_size)
+    with Image.open(source) as img:
+        img.draft("RGB", thumb_size)
+        return _shrink(img, thumb_size)
+
+
+def _compose_page(image_paths: List[PanelSource], columns: int, thumb_size) -> Image.Image:
+    """Paste panels onto a page one at a time, holding a single panel in memory."""
+    rows = (len(image_paths) + columns - 1) // columns
     w, h = thumb_size
     page = Image.new("RGB", (w * columns, h * rows), color=(255, 255, 255))
-    for idx, img in enumerate(images):
-        img = img.resize(thumb_size)
+    for idx, path in enumerate(image_paths):
+        img = _load_thumbnail(path, thumb_size)
         x = (idx % columns) * w
         y = (idx // columns) * h
         page.paste(img, (x, y))
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    page.save(output_path)
+        img.close()
+        if isinstance(path, Panel):
+            # Only the encoded bytes stay resident once the thumbnail is placed
+            path.release_image()
+    return page
+
+
+def _save_page(page: Image.Image, output_path: str, encoding: Encoding) -> str:
+    out_dir = os.path.dirname(output_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    encoding.save(page, output_path)
+    page.close()
     return output_path
 
 
-def export_pdf(image_path: str, pdf_path: str = "output/comic.pdf") -> str:
-    """Embed the PNG into a PDF page and save."""
-    if _HAS_REPORTLAB:
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        # Fit the image into the page while preserving aspect
-        c.drawImage(image_path, 0, 0, width=letter[0], height=letter[1])
-        c.showPage()
-        c.save()
-        return pdf_path
-    # Fallback: create a one-page PDF using PIL (very simple)
+def _encoding_for(output_path: str) -> Encoding:
+    """`PAGE_*` settings, in the format the path's extension asks for."""
+    encoding = page_encoding()
+    ext = os.path.splitext(output_path)[1].lower().lstrip(".")
+    if ext and ext != encoding.extension.lstrip("."):
+        encoding = Encoding(ext, quality=encoding.quality, lossless=encoding.lossless, compress_level=encoding.compress_level)
+    return encoding
+
+
+def assemble_grid(
+    image_paths: List[PanelSource],
+    columns: int = 2,
+    thumb_size=(512, 512),
+    output_path: str = "output/comic_page.png",
+) -> str:
+    """Arrange images in a grid and save a single page.
+
+    The page is encoded in the format of `output_path`'s extension using
+    the `PAGE_*` settings (see `generation.encoding`).
+    Returns path to the saved page.
+    """
+    if not image_paths:
+        raise ValueError("No images to assemble")
+    return _save_page(_compose_page(image_paths, columns, thumb_size), output_path, _encoding_for(output_path))
+
+
+def assemble_pages(
+    image_paths: List[PanelSource],
+    columns: int = 2,
+    thumb_size=(512, 512),
+    panels_per_page: Optional[int] = None,
+    output_dir: str = "output",
+    prefix: str = "comic_page",
+    encoding: Optional[Encoding] = None,
+) -> List[str]:
+    """Paginate panels into pages of `panels_per_page` and save each one.
+
+    Pages are composed one after another while the previous page is encoded
+    on the shared encoder pool, so memory stays bounded by two pages plus one
+    decoded panel regardless of story length. Defaults to
+    `COMIC_PANELS_PER_PAGE` (6) and the `PAGE_FORMAT` encoding.
+
+    Returns paths to the saved pages, in order.
+    """
+    if not image_paths:
+        raise ValueError("No images to assemble")
+    if panels_per_page is None:
+        panels_per_page = int(os.environ.get("COMIC_PANELS_PER_PAGE", 6))
+    panels_per_page = max(1, panels_per_page)
+    encoding = encoding or page_encoding()
+    pool = encoder_pool()
+    pages = []
+    pending = None
+    for n, start in enumerate(range(0, len(image_paths), panels_per_page)):
+        page = _compose_page(image_paths[start:start + panels_per_page], columns, thumb_size)
+        if pending is not None:
+            pages.append(pending.result())
+        pending = pool.submit(_save_page, page, os.path.join(output_dir, f"{prefix}_{n}{encoding.extension}"), encoding)
+    pages.append(pending.result())
+    return pages
+
+
+def export_pdf(image_path: Union[str, List[str]], pdf_path: str = "output/comic.pdf") -> str:
+    """Export one page, or a list of pages, as a PDF with one page per image.
+
+    Pages keep their aspect ratio and are embedded without re-encoding
+    (see `generation.exporter.write_pdf`).
+    """
+    pages = [image_path] if isinstance(image_path, str) else list(image_path)
     try:
-        from PIL import Image
-        im = Image.open(image_path).convert("RGB")
-        im.save(pdf_path, "PDF", resolution=100.0)
-        return pdf_path
+        return write_pdf(pages, pdf_path)
     except Exception as e:
         raise RuntimeError(f"Cannot export PDF: {e}")
-
-
@@ -0,0 +1,98 @@
+"""Output encoding settings for panels and assembled pages.
+
+PIL's default PNG settings are slow to compress and produce large files, so
+the format and its knobs are configurable separately for panels and pages via
+environment variables (`PANEL_*` for panels, `PAGE_*` for pages):
+
+- `PANEL_FORMAT` / `PAGE_FORMAT` (default: "png") one of png, webp, jpeg
+- `PANEL_QUALITY` / `PAGE_QUALITY` (default: 90) lossy WebP/JPEG quality
+- `PANEL_LOSSLESS` / `PAGE_LOSSLESS` (default: 0) lossless WebP
+- `PNG_COMPRESS_LEVEL` (default: 3) zlib level for PNG; 1 is fastest, 9 smallest
+- `ENCODE_WORKERS` (default: 2) threads encoding pages off the request path
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+import os
+import threading
+
+from PIL import Image
+
+_FORMATS = {
+    "png": ("PNG", ".png", "image/png"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "jpg": ("JPEG", ".jpg", "image/jpeg"),
+}
+
+
+class Encoding:
+    """An image format plus the PIL save options used to encode it.
+
+    Plain data only, so it can be pickled to process-pool workers.
+    """
+
+    def __init__(self, format: str = "png", quality: int = 90, lossless: bool = False, compress_level: int = 3):
+        key = format.lower()
+        if key not in _FORMATS:
+            raise ValueError(f"Unsupported image format: {format}")
+        self.format, self.extension, self.media_type = _FORMATS[key]
+        self.quality = quality
+        self.lossless = lossless
+        self.compress_level = compress_level
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "Encoding":
+        return cls(
+            format=os.environ.get(f"{prefix}_FORMAT", "png"),
+            quality=int(os.environ.get(f"{prefix}_QUALITY", 90)),
+            lossless=os.environ.get(f"{prefix}_LOSSLESS", "0").lower() in ("1", "true", "yes"),
+            compress_level=int(os.environ.get("PNG_COMPRESS_LEVEL", 3)),
+        )
+
+    @property
+    def is_png(self) -> bool:
+        return self.format == "PNG"
+
+    def save_kwargs(self) -> Dict:
+        if self.format == "PNG":
+            return {"compress_level": self.compress_level}
+        if self.format == "WEBP":
+            # method 4 is PIL's speed/size middle ground (0 fastest, 6 smallest)
+            return {"quality": self.quality, "lossless": self.lossless, "method": 4}
+        return {"quality": self.quality, "optimize": True}
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        """Convert modes the target format cannot store (e.g. RGBA -> JPEG)."""
+        if self.format == "JPEG" and image.mode not in ("RGB", "L"):
+            return image.convert("RGB")
+        return image
+
+    def save(self, image: Image.Image, fp) -> None:
+        """Encode `image` to a path or file object in this format."""
+        self.prepare(image).save(fp, format=self.format, **self.save_kwargs())
+
+
+#: Lossless PNG used for the panel cache, independent of the output format
+PNG = Encoding("png")
+
+
+def panel_encoding() -> Encoding:
+    return Encoding.from_env("PANEL")
+
+
+def page_encoding() -> Encoding:
+    return Encoding.from_env("PAGE")
+
+
+_ENCODER: Optional[ThreadPoolExecutor] = None
+_ENCODER_LOCK = threading.Lock()
+
+
+def encoder_pool() -> ThreadPoolExecutor:
+    """Shared threads for encoding assembled pages."""
+    global _ENCODER
+    with _ENCODER_LOCK:
+        if _ENCODER is None:
+            workers = int(os.environ.get("ENCODE_WORKERS", 2))
+            _ENCODER = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="encoder")
+        return _ENCODER
@@ -0,0 +1,208 @@
+"""Export assembled comic pages as multi-page PDF or CBZ.
+
+Both writers stream pages straight from disk to the output file one page at a
+time, so memory stays constant regardless of page count, and neither decodes
+or re-encodes already-compressed images:
+
+- PDF: JPEG pages are embedded as-is (`DCTDecode`) and 8-bit gray/RGB PNG
+  pages by copying their IDAT data into a `FlateDecode` stream with PNG
+  predictors. Other PNG variants (alpha, palette, interlaced) are decoded
+  and deflated as a fallback.
+- CBZ: a stored (uncompressed) ZIP of the page files plus `ComicInfo.xml`.
+"""
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+import functools
+import os
+import struct
+import zipfile
+import zlib
+
+from PIL import Image
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_CHUNK = 1024 * 1024
+
+
+def _png_chunks(f: BinaryIO) -> Iterator[Tuple[bytes, int]]:
+    """Yield (chunk_type, length) for each PNG chunk, leaving `f` at its data."""
+    if f.read(8) != _PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", header)
+        pos = f.tell()
+        yield chunk_type, length
+        f.seek(pos + length + 4)  # skip data and CRC
+        if chunk_type == b"IEND":
+            return
+
+
+def _png_info(path: str) -> Optional[Dict]:
+    """Return IHDR info if the PNG can be embedded without re-encoding."""
+    with open(path, "rb") as f:
+        for chunk_type, _ in _png_chunks(f):
+            if chunk_type != b"IHDR":
+                return None
+            width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", f.read(13))
+            break
+        else:
+            return None
+    colors = {0: 1, 2: 3}.get(color_type)
+    if depth != 8 or colors is None or interlace != 0:
+        return None
+    return {"width": width, "height": height, "colors": colors}
+
+
+def _copy_idat(path: str, out: BinaryIO) -> int:
+    """Copy the concatenated IDAT payload of a PNG into `out`; return bytes written."""
+    written = 0
+    with open(path, "rb") as f:
+        for chunk_type, length in _png_chunks(f):
+            if chunk_type != b"IDAT":
+                continue
+            remaining = length
+            while remaining:
+                data = f.read(min(remaining, _CHUNK))
+                out.write(data)
+                remaining -= len(data)
+                written += len(data)
+    return written
+
+
+def _copy_file(path: str, out: BinaryIO) -> int:
+    written = 0
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(_CHUNK), b""):
+            out.write(data)
+            written += len(data)
+    return written
+
+
+def _write_bytes(data: bytes, out: BinaryIO) -> int:
+    out.write(data)
+    return len(data)
+
+
+class _PdfWriter:
+    """Minimal streaming PDF writer: one full-page image per page."""
+
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.offsets: Dict[int, int] = {}
+        self.next_id = 3  # 1 = catalog, 2 = page tree
+        self.page_ids: List[int] = []
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _alloc(self) -> int:
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _begin(self, obj_id: int) -> None:
+        self.offsets[obj_id] = self.out.tell()
+        self.out.write(f"{obj_id} 0 obj\n".encode("ascii"))
+
+    def _object(self, obj_id: int, body: str) -> None:
+        self._begin(obj_id)
+        self.out.write(body.encode("ascii") + b"\nendobj\n")
+
+    def add_page(self, path: str, dpi: float) -> None:
+        image_id, length_id, content_id, page_id = (self._alloc() for _ in range(4))
+        png = _png_info(path) if path.lower().endswith(".png") else None
+        if png is not None:
+            width, height = png["width"], png["height"]
+            colorspace = "/DeviceGray" if png["colors"] == 1 else "/DeviceRGB"
+            filters = f"/Filter /FlateDecode /DecodeParms << /Predictor 15 /Colors {png['colors']} /BitsPerComponent 8 /Columns {width} >>"
+            writer = functools.partial(_copy_idat, path)
+        else:
+            with Image.open(path) as img:
+                width, height = img.size
+                if img.format == "JPEG" and img.mode in ("L", "RGB"):
+                    colorspace = "/DeviceGray" if img.mode == "L" else "/DeviceRGB"
+                    filters = "/Filter /DCTDecode"
+                    writer = functools.partial(_copy_file, path)
+                else:
+                    # Fallback: decode once and deflate the raw RGB samples
+                    raw = zlib.compress(img.convert("RGB").tobytes(), 6)
+                    colorspace, filters = "/DeviceRGB", "/Filter /FlateDecode"
+                    writer = functools.partial(_write_bytes, raw)
+
+        self._begin(image_id)
+        self.out.write(
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace {colorspace} "
+            f"/BitsPerComponent 8 {filters} /Length {length_id} 0 R >>\nstream\n".encode("ascii")
+        )
+        length = writer(self.out)
+        self.out.write(b"\nendstream\nendobj\n")
+        self._object(length_id, str(length))
+
+        # Page size follows the image aspect ratio at the given resolution
+        pw, ph = width * 72.0 / dpi, height * 72.0 / dpi
+        content = f"q {pw:.2f} 0 0 {ph:.2f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._begin(content_id)
+        self.out.write(f"<< /Length {len(content)} >>\nstream\n".encode("ascii") + content + b"\nendstream\nendobj\n")
+        self._object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {pw:.2f} {ph:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>",
+        )
+        self.page_ids.append(page_id)
+
+    def close(self) -> None:
+        kids = " ".join(f"{pid} 0 R" for pid in self.page_ids)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        self._object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.out.tell()
+        self.out.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode("ascii"))
+        for obj_id in range(1, self.next_id):
+            self.out.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode("ascii"))
+        self.out.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+
+def write_pdf(page_paths: List[str], pdf_path: str, dpi: float = 100.0) -> str:
+    """Write one PDF page per image, streaming pages to disk."""
+    if not page_paths:
+        raise ValueError("No pages to export")
+    out_dir = os.path.dirname(pdf_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(pdf_path, "wb") as f:
+        writer = _PdfWriter(f)
+        for path in page_paths:
+            writer.add_page(path, dpi)
+        writer.close()
+    return pdf_path
+
+
+def _comic_info(page_count: int, title: Optional[str]) -> str:
+    pages = "\n".join(f'    <Page Image="{n}"' + (' Type="FrontCover"' if n == 0 else "") + " />" for n in range(page_count))
+    title_xml = f"  <Title>{escape(title)}</Title>\n" if title else ""
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<ComicInfo xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n'
+        f"{title_xml}"
+        f"  <PageCount>{page_count}</PageCount>\n"
+        "  <Pages>\n"
+        f"{pages}\n"
+        "  </Pages>\n"
+        "</ComicInfo>\n"
+    )
+
+
+def write_cbz(page_paths: List[str], cbz_path: str, title: Optional[str] = None) -> str:
+    """Write a CBZ archive (stored ZIP of pages + ComicInfo.xml)."""
+    if not page_paths:
+        raise ValueError("No pages to export")
+    out_dir = os.path.dirname(cbz_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    width = max(3, len(str(len(page_paths))))
+    with zipfile.ZipFile(cbz_path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for n, path in enumerate(page_paths):
+            # ZipFile.write copies in chunks; pages are never decoded
+            zf.write(path, arcname=f"{n:0{width}d}{os.path.splitext(path)[1].lower()}")
+        zf.writestr("ComicInfo.xml", _comic_info(len(page_paths), title))
+    return cbz_path
@@ -0,0 +1,151 @@
+"""Content-addressed on-disk cache for generated panel images.
+
+Panels are keyed by a hash of everything that influences the rendered pixels
+(prompts, seed, size, steps, guidance and model id) so identical requests can
+skip the diffusion pipeline entirely. The cache is bounded by total size and
+evicts least-recently-used entries. Configuration via environment variables:
+
+- `SD_CACHE_DIR` (default: "output/cache")
+- `SD_CACHE_MAX_MB` (default: 1024; 0 disables the cache)
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import functools
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from generation.encoding import PNG
+
+
+def cache_key(prompt: Dict, params: Dict, model_id: str) -> Optional[str]:
+    """Return the cache key for a prompt, or None if it is not reproducible.
+
+    Prompts without an explicit seed render differently every time, so they
+    are never cached.
+    """
+    seed = prompt.get("seed")
+    if seed is None:
+        return None
+    payload = {
+        "positive_prompt": prompt.get("positive_prompt", ""),
+        "negative_prompt": prompt.get("negative_prompt", "") or "",
+        "seed": int(seed),
+        "model_id": model_id,
+        **params,
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+class PanelCache:
+    """Size-bounded LRU cache of PNG files stored under `root/<key[:2]>/<key>.png`."""
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or os.environ.get("SD_CACHE_DIR", "output/cache")
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("SD_CACHE_MAX_MB", 1024)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU index from disk, oldest mtime first."""
+        if self._loaded:
+            return
+        found = []
+        if os.path.isdir(self.root):
+            for sub in os.scandir(self.root):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".png"):
+                        st = entry.stat()
+                        found.append((st.st_mtime, entry.name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        self._loaded = True
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the cached file path for `key` (marking it recently used), or None."""
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            self._load_index()
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        """Store already-encoded PNG bytes under `key`."""
+        def _write(tmp):
+            with open(tmp, "wb") as f:
+                f.write(data)
+
+        self._store(key, _write)
+
+    def put_image(self, key: str, image) -> None:
+        """Encode a PIL image as PNG under `key` and evict down to the size limit."""
+        self._store(key, functools.partial(PNG.save, image))
+
+    def _store(self, key: str, write: Callable[[str], None]) -> None:
+        if not self.enabled or key is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        write(tmp)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._load_index()
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._load_index()
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load_index()
+            return len(self._entries)
+
+
+_CACHE: Optional[PanelCache] = None
+
+
+def get_cache() -> PanelCache:
+    """Return the process-wide cache configured from the environment."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = PanelCache()
+    return _CACHE
@@ -0,0 +1,194 @@
+"""Process-wide metrics in the Prometheus text format.
+
+Counters, gauges and histograms are registered once at import time and
+updated where the work happens; `GET /metrics` renders them all. Time per
+comic stage is recorded in `comic_stage_seconds{stage=...}`:
+
+- `parse` / `prompts` story parsing and prompt building
+- `queue_wait` / `denoise` waiting for and running on the device worker
+- `pipeline_load` cold pipeline loads (also per model in `sd_pipeline_load_seconds`)
+- `overlay`, `encode`, `base64`, `store` per-panel post-processing
+
+Work done inside `SD_PROCESS_WORKERS` worker processes is not recorded
+(their panels still count in `panels_rendered_total`).
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+import bisect
+import threading
+import time
+
+# Seconds; covers millisecond post-processing up to multi-minute loads
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for every series of this metric."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        if not self.label_names:
+            # Unlabelled series are exported from the start
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels)) or ([0], 0.0)
+            return sum(counts)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram("comic_stage_seconds", "Time spent per pipeline stage.", ("stage",)))
+REQUEST_SECONDS = REGISTRY.register(Histogram("http_request_duration_seconds", "Time to response headers per endpoint.", ("method", "route", "status")))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "Requests currently being handled."))
+PANELS_RENDERED = REGISTRY.register(Counter("panels_rendered_total", "Panels produced, by source (pipeline, cache, placeholder).", ("source",)))
+PLACEHOLDER_FALLBACKS = REGISTRY.register(Counter("placeholder_fallbacks_total", "Renders that fell back to placeholder panels.", ("reason",)))
+GENERATION_FAILURES = REGISTRY.register(Counter("generation_failures_total", "Failed pipeline or process-pool renders.", ("path",)))
+SCHEDULER_QUEUE_DEPTH = REGISTRY.register(Gauge("sd_scheduler_queue_depth", "Tasks waiting for the device worker."))
+PIPELINE_LOAD_SECONDS = REGISTRY.register(Histogram("sd_pipeline_load_seconds", "Cold pipeline load time per model.", ("model_id",)))
+PIPELINES_LOADING = REGISTRY.register(Gauge("sd_pipelines_loading", "Pipelines currently being loaded."))
+PIPELINES_RESIDENT = REGISTRY.register(Gauge("sd_pipelines_resident", "Pipelines kept loaded in the registry."))
+PIPELINE_READY = REGISTRY.register(Gauge("sd_pipeline_ready", "1 once the first pipeline initialization has finished."))
+PIPELINE_AVAILABLE = REGISTRY.register(Gauge("sd_pipeline_available", "1 if that initialization produced a pipeline, 0 if placeholders are served."))
+
+
+def stage_timer(stage: str):
+    """`with stage_timer("parse"): ...` records the block in `comic_stage_seconds`."""
+    return STAGE_SECONDS.time(stage=stage)
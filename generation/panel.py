@@ -0,0 +1,113 @@
+"""In-memory panel model passed between generation, overlay, encoding and assembly.
+
+A `Panel` holds the decoded image and/or its encoded bytes plus its prompt.
+Each representation is produced at most once: the image is only decoded if
+someone needs pixels, and it is only encoded once no matter how many
+consumers (base64 response, image store, cache, disk) ask for the bytes.
+Writing to disk or the image store is a single explicit step.
+"""
+from typing import Dict, Optional
+import io
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+from generation.encoding import Encoding, panel_encoding
+from generation.metrics import stage_timer
+
+
+class Panel:
+    def __init__(
+        self,
+        index: int,
+        image: Optional[Image.Image] = None,
+        encoded: Optional[bytes] = None,
+        encoding: Optional[Encoding] = None,
+        prompt: Optional[Dict] = None,
+        from_pipeline: bool = False,
+    ):
+        if image is None and encoded is None:
+            raise ValueError("Panel needs an image or encoded bytes")
+        self.index = index
+        # Format of `encoded` (or of the bytes to produce); PANEL_FORMAT by default
+        self.encoding = encoding or panel_encoding()
+        self.prompt = prompt or {}
+        # True when rendered by the diffusion pipeline (not a placeholder)
+        self.from_pipeline = from_pipeline
+        self.path: Optional[str] = None
+        self.image_id: Optional[str] = None
+        self._image = image
+        self._encoded = encoded
+        self._lock = threading.Lock()
+
+    @property
+    def extension(self) -> str:
+        return self.encoding.extension
+
+    @property
+    def media_type(self) -> str:
+        return self.encoding.media_type
+
+    @property
+    def filename(self) -> str:
+        return f"panel_{self.index}{self.extension}"
+
+    @property
+    def image(self) -> Image.Image:
+        """The decoded image, decoding the encoded bytes on first access."""
+        with self._lock:
+            if self._image is None:
+                img = Image.open(io.BytesIO(self._encoded))
+                img.load()
+                self._image = img
+            return self._image
+
+    @property
+    def decoded(self) -> bool:
+        """Whether the decoded bitmap is currently held in memory."""
+        return self._image is not None
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def encode(self) -> bytes:
+        """Return the encoded bytes, encoding the image only the first time."""
+        with self._lock:
+            if self._encoded is None:
+                buf = io.BytesIO()
+                with stage_timer("encode"):
+                    self.encoding.save(self._image, buf)
+                self._encoded = buf.getvalue()
+            return self._encoded
+
+    def release_image(self) -> None:
+        """Drop the decoded bitmap once encoded, keeping only the bytes."""
+        self.encode()
+        with self._lock:
+            self._image = None
+
+    def save(self, path: str) -> str:
+        """Write the encoded bytes to `path` (no re-encode) and remember it."""
+        data = self.encode()
+        # A unique temp file per call so concurrent saves to one path don't collide
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.path = path
+        return path
+
+    def persist(self, store) -> str:
+        """Add the encoded bytes to an image store and return the image id."""
+        self.image_id = store.put_bytes(self.encode(), self.extension)
+        return self.image_id
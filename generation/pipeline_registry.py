@@ -0,0 +1,315 @@
+"""Registry of resident Stable Diffusion pipelines.
+
+Pipelines are keyed by (model id, dtype, device) and kept loaded up to a
+memory budget; when a new load would exceed it, the least recently used
+pipelines are evicted before the new one is loaded, so peak usage stays
+within the budget (a model not loaded before is assumed to be as large as
+the largest pipeline seen so far). Switching between resident models (e.g.
+one checkpoint per comic style) is a dictionary lookup instead of a cold
+load.
+Configuration via environment variables:
+
+- `SD_PIPELINE_BUDGET_MB` (default: 8192) memory budget for resident
+  pipelines; the most recently used pipeline is always kept
+- `SD_PIPELINE_ESTIMATE_MB` (default: 2560) assumed size of a pipeline
+  before any has been loaded
+- `SD_MODEL_DIR` (optional) directory of local snapshots; a model id
+  "org/name" is loaded from `<dir>/org--name` (or `<dir>/org/name`) when
+  present, without network access
+- `SD_STYLE_MODELS` (optional) per-style checkpoints, e.g.
+  "manga=org/manga-model,webtoon=org/webtoon-model"
+- `SD_ALLOWED_MODELS` (optional) comma-separated model ids requests may
+  select, in addition to the default and per-style models
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from generation.metrics import PIPELINE_LOAD_SECONDS, PIPELINES_LOADING, PIPELINES_RESIDENT, STAGE_SECONDS
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MODEL_ID = "runwayml/stable-diffusion-v1-5"
+
+Key = Tuple[str, str, str]  # (model_id, dtype, device)
+
+
+def default_model_id() -> str:
+    return os.environ.get("SD_MODEL_ID") or DEFAULT_MODEL_ID
+
+
+def style_models() -> Dict[str, str]:
+    """Parse `SD_STYLE_MODELS` into {style: model_id}."""
+    mapping = {}
+    for entry in os.environ.get("SD_STYLE_MODELS", "").split(","):
+        style, sep, model_id = entry.partition("=")
+        if sep and style.strip() and model_id.strip():
+            mapping[style.strip()] = model_id.strip()
+    return mapping
+
+
+def allowed_models() -> List[str]:
+    models = [default_model_id(), *style_models().values()]
+    models += [m.strip() for m in os.environ.get("SD_ALLOWED_MODELS", "").split(",") if m.strip()]
+    return list(dict.fromkeys(models))
+
+
+def resolve_model_id(model_id: Optional[str] = None, style: Optional[str] = None) -> str:
+    """Pick the model for a request: explicit id, then the style's model, then the default.
+
+    Raises ValueError for a model id that is not allowed.
+    """
+    if model_id:
+        if model_id not in allowed_models():
+            raise ValueError(f"Model not allowed: {model_id}")
+        return model_id
+    if style and style in style_models():
+        return style_models()[style]
+    return default_model_id()
+
+
+def local_snapshot(model_id: str) -> Optional[str]:
+    """Return the local snapshot directory for `model_id` under `SD_MODEL_DIR`, if any."""
+    root = os.environ.get("SD_MODEL_DIR")
+    if not root:
+        return None
+    if os.path.isdir(model_id):
+        return model_id
+    for candidate in (os.path.join(root, model_id.replace("/", "--")), os.path.join(root, model_id)):
+        if os.path.isfile(os.path.join(candidate, "model_index.json")):
+            return candidate
+    return None
+
+
+def _default_device() -> Tuple[str, str]:
+    """(device, dtype) for new pipelines; raises ImportError without torch."""
+    import torch
+
+    if torch.cuda.is_available():
+        # Use fp16 for faster inference on CUDA
+        return "cuda", "float16"
+    return "cpu", "float32"
+
+
+def load_pipeline(model_id: str, device: str, dtype: str, hf_token: Optional[str] = None):
+    """Load a diffusers pipeline with safetensors and low-CPU-memory loading."""
+    import torch
+    from diffusers import StableDiffusionPipeline
+
+    kwargs = {"torch_dtype": getattr(torch, dtype), "low_cpu_mem_usage": True, "use_safetensors": True}
+    source = local_snapshot(model_id)
+    if source is not None:
+        kwargs["local_files_only"] = True
+    else:
+        source = model_id
+        # Support passing an auth token for private models
+        if hf_token:
+            kwargs["token"] = hf_token
+
+    try:
+        pipe = StableDiffusionPipeline.from_pretrained(source, **kwargs)
+    except TypeError:
+        # older diffusers versions take "use_auth_token" instead of "token"
+        if "token" in kwargs:
+            kwargs["use_auth_token"] = kwargs.pop("token")
+        pipe = StableDiffusionPipeline.from_pretrained(source, **kwargs)
+    except (OSError, ValueError) as exc:
+        # Checkpoint without safetensors weights: fall back to pickled weights
+        _LOGGER.warning("No safetensors weights for %s (%s), loading default weights", model_id, exc)
+        kwargs.pop("use_safetensors")
+        pipe = StableDiffusionPipeline.from_pretrained(source, **kwargs)
+    return pipe.to(device)
+
+
+def pipeline_bytes(pipe) -> int:
+    """Approximate resident size of a pipeline from its parameters and buffers."""
+    total = 0
+    components = getattr(pipe, "components", None) or {}
+    for component in components.values():
+        for attr in ("parameters", "buffers"):
+            tensors = getattr(component, attr, None)
+            if not callable(tensors):
+                continue
+            for t in tensors():
+                total += t.numel() * t.element_size()
+    return total
+
+
+class _Entry:
+    __slots__ = ("pipe", "size", "load_seconds", "loaded_at", "hits")
+
+    def __init__(self, pipe, size: int, load_seconds: float):
+        self.pipe = pipe
+        self.size = size
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.hits = 0
+
+
+class PipelineRegistry:
+    """LRU of loaded pipelines bounded by a memory budget.
+
+    Loads are single-flight per key: concurrent requests for a model that is
+    still loading wait for that load instead of starting another.
+    `loader(model_id, device, dtype, hf_token)` and `sizer(pipe)` default to
+    the diffusers loader and a parameter count.
+    """
+
+    def __init__(self, budget_bytes: int = None, loader: Callable = None, sizer: Callable = None, device: Tuple[str, str] = None):
+        if budget_bytes is None:
+            budget_bytes = int(float(os.environ.get("SD_PIPELINE_BUDGET_MB", 8192)) * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self._loader = loader or load_pipeline
+        self._sizer = sizer or pipeline_bytes
+        self._device = device
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [load lock, number of threads using it]
+        self._loading: Dict[Key, list] = {}
+        # Last measured size per key, kept after eviction to size reloads
+        self._sizes: Dict[Key, int] = {}
+        # Estimated sizes of the loads in flight
+        self._reserved: Dict[Key, int] = {}
+        self._loads: List[Dict] = []
+        self._evictions = 0
+
+    def _key(self, model_id: str) -> Key:
+        device, dtype = self._device or _default_device()
+        return (model_id, dtype, device)
+
+    def _lookup(self, key: Key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            return entry.pipe
+
+    def _estimate(self, key: Key) -> int:
+        """Expected size of `key`'s pipeline: last seen, else the largest seen."""
+        if key in self._sizes:
+            return self._sizes[key]
+        if self._sizes:
+            return max(self._sizes.values())
+        return int(float(os.environ.get("SD_PIPELINE_ESTIMATE_MB", 2560)) * 1024 * 1024)
+
+    def get(self, model_id: Optional[str] = None, hf_token: Optional[str] = None):
+        """Return the pipeline for `model_id`, loading it if needed.
+
+        Returns None on any import/runtime failure (caller should fallback).
+        """
+        model_id = model_id or default_model_id()
+        try:
+            key = self._key(model_id)
+        except Exception as exc:  # noqa: BLE001 - torch is optional
+            _LOGGER.warning("Could not initialize Stable Diffusion pipeline: %s", exc)
+            return None
+        pipe = self._lookup(key)
+        if pipe is not None:
+            return pipe
+
+        with self._lock:
+            slot = self._loading.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                pipe = self._lookup(key)
+                if pipe is not None:
+                    return pipe
+                return self._load(key, hf_token)
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._loading[key]
+
+    def _load(self, key: Key, hf_token: Optional[str]):
+        model_id = key[0]
+        with self._lock:
+            # Make room first so the new pipeline never lands on top of a
+            # full budget (other loads in flight count against it too)
+            self._reserved[key] = self._estimate(key)
+            self._evict(reserve=sum(self._reserved.values()), keep=0)
+            PIPELINES_RESIDENT.set(len(self._entries))
+        start = time.perf_counter()
+        try:
+            with PIPELINES_LOADING.track():
+                pipe = self._loader(model_id, key[2], key[1], hf_token)
+        except Exception as exc:  # noqa: BLE001 - broad fallback for optional dependency
+            _LOGGER.warning("Could not initialize Stable Diffusion pipeline %s: %s", model_id, exc)
+            with self._lock:
+                self._reserved.pop(key, None)
+            return None
+        seconds = time.perf_counter() - start
+        PIPELINE_LOAD_SECONDS.observe(seconds, model_id=model_id)
+        STAGE_SECONDS.observe(seconds, stage="pipeline_load")
+        size = self._sizer(pipe)
+        _LOGGER.info("Loaded pipeline %s (%s on %s, %.0f MB) in %.1fs", model_id, key[1], key[2], size / 2**20, seconds)
+        with self._lock:
+            # Only publish the pipeline once it is fully on its device
+            self._entries[key] = _Entry(pipe, size, seconds)
+            self._sizes[key] = size
+            self._reserved.pop(key, None)
+            self._loads.append({"model_id": model_id, "dtype": key[1], "device": key[2], "seconds": round(seconds, 3), "at": time.time()})
+            del self._loads[:-50]
+            # The estimate may have been low; the new pipeline is always kept
+            self._evict(reserve=sum(self._reserved.values()))
+            PIPELINES_RESIDENT.set(len(self._entries))
+        return pipe
+
+    def _evict(self, reserve: int = 0, keep: int = 1) -> None:
+        """Drop LRU pipelines until `reserve` more bytes fit, keeping at least `keep`."""
+        total = sum(e.size for e in self._entries.values())
+        evicted = False
+        while total + reserve > self.budget_bytes and len(self._entries) > keep:
+            key, entry = self._entries.popitem(last=False)
+            total -= entry.size
+            self._evictions += 1
+            evicted = True
+            _LOGGER.info("Evicted pipeline %s (%s on %s) to stay within %.0f MB", key[0], key[1], key[2], self.budget_bytes / 2**20)
+        if evicted:
+            try:
+                import torch
+
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except Exception:  # noqa: BLE001 - torch is optional
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            resident = [
+                {
+                    "model_id": key[0],
+                    "dtype": key[1],
+                    "device": key[2],
+                    "size_mb": round(entry.size / 2**20, 1),
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "hits": entry.hits,
+                }
+                for key, entry in reversed(self._entries.items())
+            ]
+            return {
+                "budget_mb": round(self.budget_bytes / 2**20, 1),
+                "resident_mb": round(sum(e.size for e in self._entries.values()) / 2**20, 1),
+                "resident": resident,
+                "evictions": self._evictions,
+                "recent_loads": list(self._loads),
+            }
+
+
+_REGISTRY: Optional[PipelineRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> PipelineRegistry:
+    """Return the process-wide registry configured from the environment."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = PipelineRegistry()
+        return _REGISTRY
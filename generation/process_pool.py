@@ -0,0 +1,202 @@
+"""Multi-process panel rendering for CPU-only deployments.
+
+On CPU nodes a single pipeline running in the request thread leaves most
+cores idle. This pool starts N worker processes, each holding its own
+pipeline (or the placeholder renderer when the pipeline is unavailable), and
+shards the panels of a request across them one micro-batch at a time. If a
+worker dies (e.g. OOM-killed), the broken pool is replaced and the
+unfinished panels are retried once. `warm()` loads the pipeline inside the
+workers; the parent process never holds one in this mode.
+Configuration via environment variables:
+
+- `SD_PROCESS_WORKERS` (default: 0, disabled) number of worker processes
+- `SD_THREADS_PER_WORKER` (default: cores / workers) torch threads per worker
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import multiprocessing
+import os
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+# Per-process flag set by the worker initializer
+_PLACEHOLDER_ONLY = False
+
+
+def _worker_init(threads: int, placeholder_only: bool) -> None:
+    """Limit intra-op threads so N workers don't oversubscribe the cores."""
+    global _PLACEHOLDER_ONLY
+    _PLACEHOLDER_ONLY = placeholder_only
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except Exception:  # noqa: BLE001 - torch is optional in placeholder mode
+        pass
+
+
+def _render_batch(items: List[Tuple[int, Dict]], transform: Optional[Callable] = None, encoding=None, model_id: Optional[str] = None) -> List[Tuple[int, bytes, bool]]:
+    """Render one micro-batch inside a worker process.
+
+    `transform(index, image)` (picklable, e.g. `compositor.BubbleOverlay`)
+    is applied before each panel is encoded in `encoding`.
+    Returns (index, encoded_bytes, used_pipeline) for each panel; nothing is
+    written to disk in the worker.
+    """
+    from generation import sd_generator
+    from generation.panel import Panel
+
+    pipe = None
+    if not _PLACEHOLDER_ONLY:
+        # Each worker process lazily loads and keeps its own pipelines
+        pipe = sd_generator._init_pipeline(model_id=model_id, hf_token=os.environ.get("HF_TOKEN"))
+    if pipe is not None:
+        try:
+            images = sd_generator._run_batch(pipe, sd_generator._pipeline_device(pipe), [p for _, p in items])
+            results = []
+            for (i, _), image in zip(items, images):
+                if transform is not None:
+                    image = transform(i, image)
+                results.append((i, Panel(i, image=image, encoding=encoding).encode(), True))
+            return results
+        except Exception:  # noqa: BLE001 - degrade to placeholders like render_panels
+            _LOGGER.exception("Worker generation failed, falling back to placeholder")
+    results = []
+    for i, p in items:
+        image = sd_generator._placeholder_image(i, p)
+        if transform is not None:
+            image = transform(i, image)
+        results.append((i, Panel(i, image=image, encoding=encoding).encode(), False))
+    return results
+
+
+def _warm_worker(model_id: Optional[str] = None) -> Tuple[int, bool]:
+    """Load the pipeline in a worker process; returns (pid, loaded)."""
+    if _PLACEHOLDER_ONLY:
+        return os.getpid(), False
+    from generation import sd_generator
+
+    return os.getpid(), sd_generator._init_pipeline(model_id=model_id, hf_token=os.environ.get("HF_TOKEN")) is not None
+
+
+class ProcessPipelinePool:
+    def __init__(self, workers: int = None, threads_per_worker: int = None, placeholder_only: bool = False):
+        self.workers = workers or int(os.environ.get("SD_PROCESS_WORKERS", 0)) or 1
+        if threads_per_worker is None:
+            env_threads = os.environ.get("SD_THREADS_PER_WORKER")
+            threads_per_worker = int(env_threads) if env_threads else max(1, (os.cpu_count() or 1) // self.workers)
+        self.threads_per_worker = threads_per_worker
+        self.placeholder_only = placeholder_only
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a threaded server (and torch) is unsafe
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+            initargs=(self.threads_per_worker, self.placeholder_only),
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace `broken` with a fresh executor unless another caller already did."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            _LOGGER.warning("Worker process died, restarting the process pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+            self.restarts += 1
+
+    def warm(self, model_id: Optional[str] = None) -> bool:
+        """Load `model_id` in the worker processes; True if they have a real pipeline.
+
+        One task is submitted per worker at once so each process is started
+        and loads its own pipeline before the first request arrives.
+        """
+        for attempt in range(2):
+            executor = self._executor
+            try:
+                futures = [executor.submit(_warm_worker, model_id) for _ in range(self.workers)]
+                results = [future.result() for future in futures]
+                break
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                self._restart(executor)
+        _LOGGER.info("Warmed %d worker process(es) for %s", len({pid for pid, _ in results}), model_id or "the default model")
+        return any(loaded for _, loaded in results)
+
+    def render(
+        self,
+        prompts: List[Dict],
+        indices: List[int],
+        batch_size: int,
+        on_result: Optional[Callable[[int, bytes, bool], None]] = None,
+        transform: Optional[Callable] = None,
+        encoding=None,
+        model_id: Optional[str] = None,
+    ) -> List[Tuple[int, bytes, bool]]:
+        """Render `prompts[i]` for each i in `indices` across the workers.
+
+        Panels are grouped into compatible micro-batches and each batch is a
+        separate task, so idle workers pick up the next shard.
+        `on_result(index, encoded_bytes, used_pipeline)` is called in this process as
+        each batch completes. If the pool breaks, it is restarted and the
+        panels not returned yet are rendered once more.
+        """
+        results: List[Tuple[int, bytes, bool]] = []
+        for attempt in range(2):
+            executor = self._executor
+            done = {i for i, _, _ in results}
+            try:
+                self._render_once(executor, prompts, [i for i in indices if i not in done], batch_size, results, on_result, transform, encoding, model_id)
+                return results
+            except BrokenProcessPool:
+                # A worker died: start fresh processes and retry the panels
+                # that had not come back yet
+                if attempt:
+                    raise
+                self._restart(executor)
+        return results
+
+    def _render_once(self, executor, prompts, indices, batch_size, results, on_result, transform, encoding, model_id) -> None:
+        from generation.sd_generator import _batch_prompts
+
+        selected = [prompts[i] for i in indices]
+        futures = []
+        for batch in _batch_prompts(selected, batch_size):
+            items = [(indices[j], prompts[indices[j]]) for j in batch]
+            futures.append(executor.submit(_render_batch, items, transform, encoding, model_id))
+        for future in as_completed(futures):
+            for i, data, used_pipeline in future.result():
+                results.append((i, data, used_pipeline))
+                if on_result is not None:
+                    on_result(i, data, used_pipeline)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_POOL: Optional[ProcessPipelinePool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def process_workers() -> int:
+    return int(os.environ.get("SD_PROCESS_WORKERS", 0))
+
+
+def get_process_pool() -> ProcessPipelinePool:
+    """Return the process-wide pool configured from the environment."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPipelinePool()
+        return _POOL
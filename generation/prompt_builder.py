@@ -2,16 +2,30 @@
 
 Creates positive and negative prompts from panel text and style.
 """
-from typing import Dict, List
+from typing import Dict, List, Optional
+import hashlib
 import random
 
 
-def build_prompts_for_panels(panels: List[Dict], style: str = "manga") -> List[Dict]:
+def panel_seed(story_seed: int, index: int, text: str) -> int:
+    """Derive a stable 32-bit seed from the story seed, panel index and text.
+
+    Unchanged panels keep their seed across reruns, so re-rendering a story
+    after editing one scene only changes the edited panel.
+    """
+    digest = hashlib.sha256(f"{story_seed}:{index}:{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big")
+
+
+def build_prompts_for_panels(panels: List[Dict], style: str = "manga", seed: Optional[int] = None, random_seed: bool = False) -> List[Dict]:
     """Build image generation prompts for each panel.
 
     Args:
-        panels: List of panel dicts containing scene text and dialogues.
+        panels: List of panel dicts containing scene text, dialogues and
+            optionally the panel's `characters` (named in the prompt).
         style: One of 'manga', 'american', 'webtoon'.
+        seed: Story-level seed; panel seeds are derived from it (default 0).
+        random_seed: Opt out of deterministic seeding and draw random seeds.
 
     Returns:
         List of dicts: {positive_prompt, negative_prompt, seed}
@@ -23,16 +37,26 @@ def build_prompts_for_panels(panels: List[Dict], style: str = "manga") -> List[D
     }
     base_style = style_map.get(style, style_map["manga"])
     prompts = []
-    for panel in panels:
+    story_seed = seed if seed is not None else 0
+    for index, panel in enumerate(panels):
         text = panel.get("scene", "")
         dialogues = panel.get("dialogues", [])
         # Incorporate first line of dialogue to focus composition
         focus = ""
         if dialogues:
             focus = dialogues[0][1]
-        positive = f"{base_style}, {focus}, {text[:120]}"
+        # Name the characters featured in this panel (at most three)
+        characters = ", ".join((panel.get("characters") or [])[:3])
+        if characters:
+            positive = f"{base_style}, {characters}, {focus}, {text[:120]}"
+        else:
+            positive = f"{base_style}, {focus}, {text[:120]}"
         negative = "text, watermark, logo, signature, blurry, lowres, artifacts, bad quality, cropped, error, jpeg artifacts, signature, username, letters, numbers"
-        prompts.append({"positive_prompt": positive, "negative_prompt": negative, "seed": random.randint(0, 2**32 - 1)})
+        if random_seed:
+            panel_seed_value = random.randint(0, 2**32 - 1)
+        else:
+            panel_seed_value = panel_seed(story_seed, index, text)
+        prompts.append({"positive_prompt": positive, "negative_prompt": negative, "seed": panel_seed_value})
     return prompts
 
 
@@ -0,0 +1,105 @@
+"""Serialized, prioritized access to the shared diffusion pipeline.
+
+A single device worker thread executes every pipeline call, so FastAPI's
+threadpool never drives the pipeline concurrently. Work is pulled from a
+priority queue: interactive requests (e.g. `/generate`) run ahead of bulk
+jobs, and since each micro-batch is its own task an interactive request can
+slot in between the batches of a long job. Queue wait and compute time are
+tracked separately so slow responses can be attributed correctly.
+"""
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from generation.metrics import SCHEDULER_QUEUE_DEPTH, STAGE_SECONDS
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class PipelineScheduler:
+    def __init__(self, name: str = "sd_device_worker"):
+        self.name = name
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            "tasks": 0,
+            "failures": 0,
+            "queue_wait_seconds": 0.0,
+            "compute_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+            "max_compute_seconds": 0.0,
+        }
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, fn: Callable[[], Any], priority: int = PRIORITY_INTERACTIVE) -> Future:
+        """Queue `fn` for the device worker; lower priority values run first."""
+        self._ensure_worker()
+        future: Future = Future()
+        # The sequence number keeps FIFO order within a priority level
+        self._queue.put((priority, next(self._seq), time.perf_counter(), fn, future))
+        SCHEDULER_QUEUE_DEPTH.set(self._queue.qsize())
+        return future
+
+    def run(self, fn: Callable[[], Any], priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Submit `fn` and block until the device worker has run it."""
+        if threading.current_thread() is self._thread:
+            # Already on the device worker (nested call); run inline
+            return fn()
+        return self.submit(fn, priority).result()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.queue_depth()
+        return stats
+
+    def _worker(self) -> None:
+        while True:
+            priority, _, enqueued, fn, future = self._queue.get()
+            SCHEDULER_QUEUE_DEPTH.set(self._queue.qsize())
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            failed = False
+            try:
+                future.set_result(fn())
+            except BaseException as exc:  # noqa: BLE001 - surface on the caller's future
+                failed = True
+                future.set_exception(exc)
+            finished = time.perf_counter()
+            wait, compute = started - enqueued, finished - started
+            STAGE_SECONDS.observe(wait, stage="queue_wait")
+            STAGE_SECONDS.observe(compute, stage="denoise")
+            with self._lock:
+                self._stats["tasks"] += 1
+                self._stats["failures"] += int(failed)
+                self._stats["queue_wait_seconds"] += wait
+                self._stats["compute_seconds"] += compute
+                self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], wait)
+                self._stats["max_compute_seconds"] = max(self._stats["max_compute_seconds"], compute)
+            _LOGGER.debug("Pipeline task (priority %s) waited %.3fs, ran %.3fs", priority, wait, compute)
+
+
+_SCHEDULER = PipelineScheduler()
+
+
+def get_scheduler() -> PipelineScheduler:
+    return _SCHEDULER
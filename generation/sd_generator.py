@@ -1,153 +1,500 @@
 """Stable Diffusion generator.
 
 This module attempts to use Hugging Face `diffusers` with a CUDA GPU when
-available. It lazily initializes a pipeline on first use and supports
-configuration via environment variables:
+available. Pipelines are loaded lazily on first use and kept resident per
+model in `generation.pipeline_registry`; configuration via environment
+variables:
 
 - `SD_MODEL_ID` (default: "runwayml/stable-diffusion-v1-5")
 - `HF_TOKEN` (optional Hugging Face token for private models)
 - `SD_OUTPUT_DIR` (default: "output/images")
+- `SD_BATCH_SIZE` (default: 4) max prompts per batched pipeline call
+- `SD_CACHE_DIR` / `SD_CACHE_MAX_MB` panel cache location and size limit
+- `SD_PROCESS_WORKERS` render in N worker processes (CPU deployments)
+
+`render_panels` returns in-memory `generation.panel.Panel` objects (image
+plus encoded bytes) that the API publishes directly; `generate_images` is the
+file-writing wrapper around it.
 
 If the heavy dependencies or GPU are unavailable, it falls back to the
-lightweight placeholder generator that writes a simple illustrative PNG so the
+lightweight placeholder generator that draws a simple illustrative PNG so the
 rest of the app can continue working in constrained environments.
 """
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import os
 import logging
+import random
+import threading
 from PIL import Image, ImageDraw, ImageFont
 
+from generation.encoding import PNG, Encoding, panel_encoding
+from generation.image_cache import cache_key, get_cache
+from generation.metrics import GENERATION_FAILURES, PANELS_RENDERED, PIPELINE_AVAILABLE, PIPELINE_READY, PLACEHOLDER_FALLBACKS, stage_timer
+from generation.panel import Panel
+from generation.pipeline_registry import default_model_id, get_registry
+from generation.process_pool import get_process_pool, process_workers
+from generation.quality import get_tier, use_scheduler
+from generation.scheduler import PRIORITY_INTERACTIVE, get_scheduler
+from generation.text_embeddings import embedding_cache
+
 _LOGGER = logging.getLogger(__name__)
 
-# Lazy-loaded pipeline stored here after successful initialization
-_PIPE = None
+Transform = Callable[[int, Image.Image], Image.Image]
+
+# "pending" until the first `_init_pipeline` call returns, then "loaded" or
+# "unavailable" (placeholders are served); see `pipeline_state`
+_PIPELINE_STATE = "pending"
+
+
+def _apply_transform(transform: Optional[Transform], i: int, image: Image.Image) -> Image.Image:
+    if transform is None:
+        return image
+    with stage_timer("overlay"):
+        return transform(i, image)
+
+
+def _placeholder_image(i: int, p: Dict) -> Image.Image:
+    """Draw the in-memory placeholder image for panel `i`."""
+    img = Image.new("RGB", (512, 512), color=(240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    text = f"Panel{i}\n{p.get('positive_prompt', '')[:150]}"
+    try:
+        font = ImageFont.load_default()
+    except Exception:
+        font = None
+    draw.multiline_text((10, 10), text, fill=(10, 10, 10), font=font)
+    return img
+
+
+def _placeholder_panel(i: int, p: Dict, output_dir: str) -> str:
+    """Render the placeholder image for panel `i` and return its path."""
+    path = os.path.join(output_dir, f"panel_{i}.png")
+    PNG.save(_placeholder_image(i, p), path)
+    return path
+
+
+def _placeholder_panels(
+    prompts: List[Dict],
+    indices: Optional[List[int]] = None,
+    on_panel: Optional[Callable[[Panel], None]] = None,
+    transform: Optional[Transform] = None,
+    encoding: Optional[Encoding] = None,
+) -> List[Panel]:
+    """Render placeholder panels for `indices` (default: every prompt)."""
+    if indices is None:
+        indices = list(range(len(prompts)))
+    PANELS_RENDERED.inc(len(indices), source="placeholder")
+    panels: List[Panel] = []
+    for i in indices:
+        p = prompts[i]
+        img = _apply_transform(transform, i, _placeholder_image(i, p))
+        panel = Panel(i, image=img, prompt=p, encoding=encoding)
+        panels.append(panel)
+        if on_panel is not None:
+            on_panel(panel)
+    return panels
 
 
 def _placeholder_generate(prompts: List[Dict], output_dir: str) -> List[str]:
     os.makedirs(output_dir, exist_ok=True)
-    paths: List[str] = []
+    return [_placeholder_panel(i, p, output_dir) for i, p in enumerate(prompts)]
+
+
+_FINALIZE_POOL: Optional[ThreadPoolExecutor] = None
+_FINALIZE_LOCK = threading.Lock()
+
+
+def _finalize_pool() -> ThreadPoolExecutor:
+    """Shared threads for per-panel post-processing (overlay + encode)."""
+    global _FINALIZE_POOL
+    with _FINALIZE_LOCK:
+        if _FINALIZE_POOL is None:
+            workers = int(os.environ.get("SD_FINALIZE_WORKERS", 4))
+            _FINALIZE_POOL = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sd_finalize")
+        return _FINALIZE_POOL
+
+
+def _finalize_panel(i: int, image: Image.Image, prompt: Dict, transform: Optional[Transform], cache, key: Optional[str], encoding: Encoding) -> Panel:
+    """Cache the raw render, apply the transform in memory and encode once."""
+    if transform is None and encoding.is_png:
+        panel = Panel(i, image=image, prompt=prompt, encoding=encoding, from_pipeline=True)
+        if cache is not None:
+            cache.put_bytes(key, panel.encode())
+    else:
+        if cache is not None:
+            # The cache holds the untransformed, lossless render so overlays
+            # and output formats can change
+            cache.put_image(key, image)
+        image = _apply_transform(transform, i, image)
+        panel = Panel(i, image=image, prompt=prompt, encoding=encoding, from_pipeline=True)
+    # Encode here, off the caller's thread, so consumers get bytes for free
+    panel.encode()
+    return panel
+
+
+def _finalize_cached(i: int, data: bytes, prompt: Dict, transform: Optional[Transform], encoding: Encoding) -> Panel:
+    """Turn cached PNG bytes into a panel, re-encoding only when it must change."""
+    panel = Panel(i, encoded=data, prompt=prompt, encoding=PNG, from_pipeline=True)
+    if transform is None and encoding.is_png:
+        return panel
+    panel = Panel(i, image=_apply_transform(transform, i, panel.image), prompt=prompt, encoding=encoding, from_pipeline=True)
+    panel.encode()
+    return panel
+
+
+def _init_pipeline(model_id: Optional[str] = None, hf_token: Optional[str] = None):
+    """Return a loaded Stable Diffusion pipeline for `model_id` (default: `SD_MODEL_ID`).
+
+    Pipelines are kept resident in the shared `PipelineRegistry`, so
+    switching between loaded models is a lookup; loads are single-flight per
+    model. Returns None on any import/runtime failure (caller should fallback).
+    """
+    pipe = get_registry().get(model_id, hf_token or os.environ.get("HF_TOKEN"))
+    _record_pipeline_state(pipe is not None)
+    return pipe
+
+
+def _record_pipeline_state(available: bool) -> None:
+    global _PIPELINE_STATE
+    if _PIPELINE_STATE == "pending" or available:
+        _PIPELINE_STATE = "loaded" if available else "unavailable"
+        PIPELINE_READY.set(1)
+        PIPELINE_AVAILABLE.set(int(available))
+
+
+def warm_pipeline(model_id: Optional[str] = None) -> bool:
+    """Load the pipeline for `model_id` wherever panels are rendered.
+
+    With `SD_PROCESS_WORKERS` set the worker processes load it and
+    readiness follows them; the parent process keeps no pipeline of its
+    own. Otherwise this is `_init_pipeline`. Returns True when a real
+    pipeline is available.
+    """
+    if process_workers() > 0:
+        try:
+            available = get_process_pool().warm(model_id=model_id or default_model_id())
+        except Exception:  # noqa: BLE001 - report the pool as unavailable
+            _LOGGER.exception("Could not warm the process pool")
+            available = False
+        _record_pipeline_state(available)
+        return available
+    return _init_pipeline(model_id=model_id) is not None
+
+
+def pipeline_state() -> str:
+    """"pending" until a pipeline initialization has finished, then "loaded" or "unavailable"."""
+    return _PIPELINE_STATE
+
+
+def _round_multiple(value, base=8):
+    """Round to the nearest model-friendly multiple (SD latents are /8)."""
+    return max(base, int(round(value / base) * base))
+
+
+def _resolve_params(p: Dict) -> Dict:
+    """Return the effective generation parameters for a single prompt dict.
+
+    Respects caller-provided values but falls back to the prompt's quality
+    tier (`generation.quality`) and then to environment defaults. A tier
+    with its own scheduler adds a "scheduler" entry, which is not a
+    pipeline argument (see `_run_batch`).
+    """
+    tier = get_tier(p.get("quality"))
+    steps = int(p.get("steps", tier.steps or os.environ.get("SD_STEPS", 28)))
+    guidance_scale = float(p.get("guidance_scale", os.environ.get("SD_GUIDANCE", 7.5)))
+    width = int(p.get("width", os.environ.get("SD_WIDTH", 512))) * tier.scale
+    height = int(p.get("height", os.environ.get("SD_HEIGHT", 512))) * tier.scale
+    params = {
+        "width": _round_multiple(width, 8),
+        "height": _round_multiple(height, 8),
+        "num_inference_steps": steps,
+        "guidance_scale": guidance_scale,
+    }
+    if tier.scheduler:
+        params["scheduler"] = tier.scheduler
+    return params
+
+
+def _batch_prompts(prompts: List[Dict], max_batch_size: int) -> List[List[int]]:
+    """Group prompt indices into micro-batches that can share a pipeline call.
+
+    Prompts are compatible when their width/height/steps/guidance/scheduler match.
+    Groups keep first-appearance order and are chunked to `max_batch_size`.
+    """
+    max_batch_size = max(1, int(max_batch_size))
+    groups: Dict[tuple, List[int]] = {}
     for i, p in enumerate(prompts):
-        img = Image.new("RGB", (512, 512), color=(240, 240, 240))
-        draw = ImageDraw.Draw(img)
-        text = f"Panel{i}\n{p.get('positive_prompt', '')[:150]}"
+        params = _resolve_params(p)
+        key = (params["width"], params["height"], params["num_inference_steps"], params["guidance_scale"], params.get("scheduler"))
+        groups.setdefault(key, []).append(i)
+    batches: List[List[int]] = []
+    for indices in groups.values():
+        for start in range(0, len(indices), max_batch_size):
+            batches.append(indices[start:start + max_batch_size])
+    return batches
+
+
+def _pipeline_device(pipe) -> str:
+    """Best-effort device string for a loaded pipeline ("cuda", "cpu", ...)."""
+    device = getattr(pipe, "device", None)
+    if device is None and hasattr(pipe, "parameters"):
+        device = next(pipe.parameters()).device
+    return str(device) if device is not None else "cpu"
+
+
+def _make_generator(seed: int, device: str):
+    """Create a seeded `torch.Generator` so each prompt keeps its own seed."""
+    import torch
+
+    return torch.Generator(device=device).manual_seed(int(seed))
+
+
+def _text_inputs(pipe, device: str, prompt_texts: List[str], negative_prompts: List[str]) -> Dict:
+    """Pipeline text arguments for a batch: cached embeddings when supported, else strings."""
+    cache = embedding_cache(pipe)
+    if cache is not None:
         try:
-            font = ImageFont.load_default()
-        except Exception:
-            font = None
-        draw.multiline_text((10, 10), text, fill=(10, 10, 10), font=font)
-        path = os.path.join(output_dir, f"panel_{i}.png")
-        img.save(path)
-        paths.append(path)
-    return paths
+            return {
+                "prompt_embeds": cache.embed(pipe, device, prompt_texts),
+                "negative_prompt_embeds": cache.embed(pipe, device, negative_prompts),
+            }
+        except Exception:  # noqa: BLE001 - let the pipeline encode the strings itself
+            _LOGGER.warning("Could not reuse text embeddings, passing prompt strings", exc_info=True)
+    if len(prompt_texts) == 1:
+        return {"prompt": prompt_texts[0], "negative_prompt": negative_prompts[0]}
+    return {"prompt": prompt_texts, "negative_prompt": negative_prompts}
 
 
-def _init_pipeline(model_id: Optional[str] = None, hf_token: Optional[str] = None):
-    """Attempt to initialize and return a Stable Diffusion pipeline.
+def _call_pipeline(pipe, device: str, text: Dict, generator, params: Dict, on_step: Optional[Callable[[int, int], None]] = None):
+    """Invoke the pipeline, using autocast on CUDA for fp16 pipelines.
 
-    Returns None on any import/runtime failure (caller should fallback).
+    `text` holds either the prompt strings or their embeddings (see
+    `_text_inputs`). `on_step(step, total_steps)` is reported through
+    diffusers' `callback_on_step_end` hook after every denoising step.
     """
-    global _PIPE
-    if _PIPE is not None:
-        return _PIPE
+    extra = {}
+    if on_step is not None:
+        total_steps = params["num_inference_steps"]
+
+        def _on_step_end(_pipe, step, _timestep, callback_kwargs):
+            on_step(step + 1, total_steps)
+            return callback_kwargs
+
+        extra["callback_on_step_end"] = _on_step_end
+    if device.startswith("cuda"):
+        from torch import autocast
+
+        with autocast(device_type="cuda"):
+            return pipe(**text, generator=generator, **params, **extra)
+    return pipe(**text, generator=generator, **params, **extra)
+
+
+def _run_batch(pipe, device: str, batch: List[Dict], on_step: Optional[Callable[[int, int], None]] = None) -> List:
+    """Run one micro-batch of compatible prompts and return PIL images in order."""
+    params = _resolve_params(batch[0])
+    use_scheduler(pipe, params.pop("scheduler", None))
+    prompt_texts = [p.get("positive_prompt", "") for p in batch]
+    negative_prompts = [p.get("negative_prompt", "") or "" for p in batch]
+    seeds = [p.get("seed") for p in batch]
+    generators = None
+    if any(seed is not None for seed in seeds):
+        # diffusers expects either no generator or one per prompt; give
+        # unseeded prompts a fresh random seed so seeded ones stay stable.
+        generators = [_make_generator(seed if seed is not None else random.randint(0, 2**32 - 1), device) for seed in seeds]
+
+    if len(batch) == 1:
+        prompt_arg, negative_arg = prompt_texts[0], negative_prompts[0]
+        generator_arg = generators[0] if generators else None
+    else:
+        prompt_arg, negative_arg, generator_arg = prompt_texts, negative_prompts, generators
 
     try:
-        import torch
-        from diffusers import StableDiffusionPipeline
+        # The shared negative prompt and repeated prompts skip the text encoder
+        text = _text_inputs(pipe, device, prompt_texts, negative_prompts)
+        result = _call_pipeline(pipe, device, text, generator_arg, params, on_step=on_step)
+    except Exception:
+        if len(batch) > 1:
+            # Batch may not fit in memory or the pipeline may not accept
+            # lists; retry prompt by prompt.
+            _LOGGER.warning("Batched call of %d prompts failed, retrying one at a time", len(batch), exc_info=True)
+            images = []
+            for p in batch:
+                images.extend(_run_batch(pipe, device, [p], on_step=on_step))
+            return images
+        # Fallback to a simpler call if the pipeline has different signature
+        result = pipe(prompt_arg, negative_prompt=negative_arg, num_inference_steps=params["num_inference_steps"], generator=generator_arg)
+    return list(result.images)
 
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        model_id = model_id or os.environ.get("SD_MODEL_ID", "runwayml/stable-diffusion-v1-5")
 
-        pipeline_kwargs = {}
-        if device == "cuda":
-            # Use fp16 for faster inference on CUDA if available
-            from torch import float16
+def render_panels(
+    prompts: List[Dict],
+    batch_size: Optional[int] = None,
+    on_panel: Optional[Callable[[Panel], None]] = None,
+    use_cache: bool = True,
+    on_step: Optional[Callable[[List[int], int, int], None]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    transform: Optional[Transform] = None,
+    encoding: Optional[Encoding] = None,
+    model_id: Optional[str] = None,
+) -> List[Panel]:
+    """Render prompts to in-memory `Panel` objects without touching the output dir.
 
-            pipeline_kwargs["torch_dtype"] = float16
+    Seeded prompts are first looked up in the content-addressed panel cache
+    (`generation.image_cache`); only misses reach the pipeline. Prompts with
+    matching width/height/steps/guidance are grouped into micro-batches of up
+    to `batch_size` (default `SD_BATCH_SIZE`, 4) and run in a single pipeline
+    call, each with its own seeded generator.
+    `on_panel(panel)` is called as soon as each panel is ready and
+    `on_step(indices, step, total_steps)` after every denoising step of the
+    batch rendering `indices`. Each batch runs on the shared device worker
+    (`generation.scheduler`) at `priority`, so pipeline calls never overlap.
+    A prompt's `quality` ("draft", "standard", "final") picks its steps,
+    scheduler and resolution (see `generation.quality`).
+    `transform(index, image)` (e.g. `compositor.BubbleOverlay`) is applied
+    to the in-memory image, then the panel is encoded once in `encoding`
+    (default: `PANEL_FORMAT`, see `generation.encoding`), on a thread pool
+    across the panels of a batch. `model_id` selects the checkpoint
+    (default: `SD_MODEL_ID`; see `generation.pipeline_registry`).
 
-        # Support passing an auth token for private models
-        if hf_token:
-            try:
-                # newer diffusers versions accept "use_auth_token" or "token"
-                _PIPE = StableDiffusionPipeline.from_pretrained(model_id, use_auth_token=hf_token, **pipeline_kwargs)
-            except TypeError:
-                _PIPE = StableDiffusionPipeline.from_pretrained(model_id, token=hf_token, **pipeline_kwargs)
-        else:
-            _PIPE = StableDiffusionPipeline.from_pretrained(model_id, **pipeline_kwargs)
-
-        _PIPE = _PIPE.to(device)
-        _LOGGER.info("Initialized Stable Diffusion pipeline on %s using model %s", device, model_id)
-        return _PIPE
-    except Exception as exc:  # noqa: BLE001 - broad fallback for optional dependency
-        _LOGGER.warning("Could not initialize Stable Diffusion pipeline: %s", exc)
-        _PIPE = None
-        return None
-
-
-def generate_images(prompts: List[Dict], output_dir: str = None) -> List[str]:
-    """Generate images using Stable Diffusion when available.
-
-    Falls back to `_placeholder_generate` on any error so callers always get
-    a set of image paths to work with.
+    Falls back to placeholder panels on any error so callers always get a
+    full set of panels to work with.
     """
-    output_dir = output_dir or os.environ.get("SD_OUTPUT_DIR", "output/images")
-    os.makedirs(output_dir, exist_ok=True)
+    if batch_size is None:
+        batch_size = int(os.environ.get("SD_BATCH_SIZE", 4))
 
-    # Try to initialize pipeline lazily using environment configuration
+    encoding = encoding or panel_encoding()
     hf_token = os.environ.get("HF_TOKEN")
-    model_id = os.environ.get("SD_MODEL_ID")
-    pipe = _init_pipeline(model_id=model_id, hf_token=hf_token)
+    model_id = model_id or default_model_id()
+    cache = get_cache() if use_cache else None
+    keys = [cache_key(p, _resolve_params(p), model_id) if cache is not None else None for p in prompts]
 
-    if pipe is None:
-        return _placeholder_generate(prompts, output_dir)
+    panels: List[Optional[Panel]] = [None] * len(prompts)
 
-    try:
-        import torch
+    def _emit(panel: Panel) -> None:
+        panels[panel.index] = panel
+        if on_panel is not None:
+            on_panel(panel)
 
-        # Determine device from the loaded pipeline
-        device = next(pipe.parameters()).device if hasattr(pipe, "parameters") else ("cuda" if torch.cuda.is_available() else "cpu")
+    def _fallback() -> List[Panel]:
+        # Panels already emitted (cache hits, finished batches) are kept;
+        # only the missing ones become placeholders so none is sent twice
+        missing = [i for i, panel in enumerate(panels) if panel is None]
+        _placeholder_panels(prompts, missing, on_panel=_emit, transform=transform, encoding=encoding)
+        return panels
 
-        paths: List[str] = []
-        for i, p in enumerate(prompts):
-            prompt_text = p.get("positive_prompt", "")
-            negative_prompt = p.get("negative_prompt", "")
+    pending: List[int] = []
+    hits = []
+    for i, key in enumerate(keys):
+        cached = cache.lookup(key) if cache is not None else None
+        data = None
+        if cached is not None:
+            try:
+                with open(cached, "rb") as f:
+                    data = f.read()
+            except OSError:
+                # Evicted by another request since the lookup: a miss
+                data = None
+        if data is None:
+            pending.append(i)
+            continue
+        hits.append(_finalize_pool().submit(_finalize_cached, i, data, prompts[i], transform, encoding))
+    PANELS_RENDERED.inc(len(hits), source="cache")
+    for future in hits:
+        _emit(future.result())
+    if not pending:
+        return panels
 
-            # Use generator for deterministic seeds when provided
-            seed = p.get("seed")
-            generator = None
-            if seed is not None:
-                generator = torch.Generator(device=device).manual_seed(int(seed))
+    if process_workers() > 0:
+        # CPU process-pool mode: worker processes own their pipelines and
+        # send back encoded bytes. Only untransformed PNG output is the raw
+        # render the cache expects.
+        def _on_result(i, data, used_pipeline):
+            if used_pipeline and cache is not None and transform is None and encoding.is_png:
+                cache.put_bytes(keys[i], data)
+            if not used_pipeline:
+                PLACEHOLDER_FALLBACKS.inc(reason="worker")
+            PANELS_RENDERED.inc(source="pipeline" if used_pipeline else "placeholder")
+            _emit(Panel(i, encoded=data, prompt=prompts[i], encoding=encoding, from_pipeline=used_pipeline))
 
-            # Respect caller-provided parameters but fall back to sane defaults
-            steps = int(p.get("steps", os.environ.get("SD_STEPS", 28)))
-            guidance_scale = float(p.get("guidance_scale", os.environ.get("SD_GUIDANCE", 7.5)))
-            width = int(p.get("width", os.environ.get("SD_WIDTH", 512)))
-            height = int(p.get("height", os.environ.get("SD_HEIGHT", 512)))
+        try:
+            get_process_pool().render(prompts, pending, batch_size, on_result=_on_result, transform=transform, encoding=encoding, model_id=model_id)
+            return panels
+        except Exception as exc:
+            _LOGGER.exception("Process pool generation failed, falling back to placeholder: %s", exc)
+            GENERATION_FAILURES.inc(path="process_pool")
+            PLACEHOLDER_FALLBACKS.inc(reason="generation_failed")
+            return _fallback()
 
-            # Enforce common model-friendly constraints: multiples of 8
-            def _round_multiple(value, base=8):
-                return max(base, int(round(value / base) * base))
+    # Try to initialize pipeline lazily using environment configuration
+    pipe = _init_pipeline(model_id=model_id, hf_token=hf_token)
 
-            width = _round_multiple(width, 8)
-            height = _round_multiple(height, 8)
+    if pipe is None:
+        PLACEHOLDER_FALLBACKS.inc(reason="pipeline_unavailable")
+        return _fallback()
 
-            # Call pipeline with explicit parameters where supported
-            # Use autocast on CUDA for fp16 pipelines
-            try:
-                from torch import autocast
-                if device == "cuda":
-                    with autocast(device_type="cuda"):
-                        result = pipe(prompt_text, negative_prompt=negative_prompt, height=height, width=width, num_inference_steps=steps, guidance_scale=guidance_scale, generator=generator)
-                else:
-                    result = pipe(prompt_text, negative_prompt=negative_prompt, height=height, width=width, num_inference_steps=steps, guidance_scale=guidance_scale, generator=generator)
-            except Exception:
-                # Fallback to a simpler call if the pipeline has different signature
-                result = pipe(prompt_text, negative_prompt=negative_prompt, num_inference_steps=steps, generator=generator)
-
-            image = result.images[0]
-            path = os.path.join(output_dir, f"panel_{i}.png")
-            image.save(path)
-            paths.append(path)
-        return paths
+    try:
+        device = _pipeline_device(pipe)
+        pool = _finalize_pool()
+
+        pending_prompts = [prompts[i] for i in pending]
+        for batch in _batch_prompts(pending_prompts, batch_size):
+            indices = [pending[j] for j in batch]
+            step_cb = None
+            if on_step is not None:
+                step_cb = functools.partial(on_step, indices)
+            batch_prompts = [prompts[i] for i in indices]
+            images = get_scheduler().run(functools.partial(_run_batch, pipe, device, batch_prompts, on_step=step_cb), priority=priority)
+            futures = [pool.submit(_finalize_panel, i, image, prompts[i], transform, cache, keys[i], encoding) for i, image in zip(indices, images)]
+            for future in futures:
+                _emit(future.result())
+            PANELS_RENDERED.inc(len(futures), source="pipeline")
+        return panels
     except Exception as exc:
         _LOGGER.exception("Stable Diffusion generation failed, falling back to placeholder: %s", exc)
-        return _placeholder_generate(prompts, output_dir)
+        GENERATION_FAILURES.inc(path="pipeline")
+        PLACEHOLDER_FALLBACKS.inc(reason="generation_failed")
+        return _fallback()
+
+
+def generate_images(
+    prompts: List[Dict],
+    output_dir: str = None,
+    batch_size: Optional[int] = None,
+    on_image: Optional[Callable[[int, str], None]] = None,
+    use_cache: bool = True,
+    on_step: Optional[Callable[[List[int], int, int], None]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    transform: Optional[Transform] = None,
+    encoding: Optional[Encoding] = None,
+    model_id: Optional[str] = None,
+) -> List[str]:
+    """Generate images using Stable Diffusion when available and save them.
+
+    Thin wrapper around `render_panels` for callers that want files: each
+    panel is written to `output_dir` as `panel_{i}` plus the extension of
+    its format (`.png` by default) exactly once, and
+    `on_image(index, path)` is called right after. See `render_panels` for
+    the remaining arguments.
+    """
+    output_dir = output_dir or os.environ.get("SD_OUTPUT_DIR", "output/images")
+    os.makedirs(output_dir, exist_ok=True)
+
+    def _save(panel: Panel) -> None:
+        path = panel.save(os.path.join(output_dir, panel.filename))
+        if on_image is not None:
+            on_image(panel.index, path)
+
+    panels = render_panels(
+        prompts,
+        batch_size=batch_size,
+        on_panel=_save,
+        use_cache=use_cache,
+        on_step=on_step,
+        priority=priority,
+        transform=transform,
+        encoding=encoding,
+        model_id=model_id,
+    )
+    return [panel.path for panel in panels]
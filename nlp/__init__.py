@@ -7,11 +7,15 @@ Expose the commonly-used functions at the package level for convenience.
 from .scene_splitter import split_into_scenes
 from .character_extractor import extract_characters
 from .dialogue_detector import detect_dialogue_lines
+from .parser import Scene, iter_scenes, parse_story
 
 __all__ = [
     "split_into_scenes",
     "extract_characters",
     "detect_dialogue_lines",
+    "Scene",
+    "iter_scenes",
+    "parse_story",
 ]
 
 
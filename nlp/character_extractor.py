@@ -1,11 +1,158 @@
 """Character extraction utilities.
 
-This module provides a simple rule-based extractor. For production,
-replace or augment with an NER model (spaCy, transformers).
+This module provides a simple rule-based extractor: Titlecase words (and
+two-word names) are candidates, common capitalized words such as sentence
+openers and pronouns are filtered out (words that are also common names,
+such as "May", only at the start of a sentence), and the rest are ranked by how often
+they are mentioned, how often they share a scene with other candidates and
+how often they speak. Everything is counted in a casefolded index, so the
+cost is linear in the length of the story. For NER-based mentions (spaCy)
+see `nlp.ner`; ranking works the same with either backend.
 """
-from typing import List
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
 import re
 
+# Titlecase words, optionally followed by a second one on the same line
+_NAME_RE = re.compile(r"\b([A-Z][a-z]{1,20}(?:[ \t]+[A-Z][a-z]{1,20})?)\b")
+
+# Capitalized words that are almost never character names (casefolded)
+STOP_WORDS = frozenset("""
+a about above after again against all also although an and another any are as at
+be because before behind besides between both but by can could did do does down
+during each either even every for from had has have he her here hers herself him
+himself his how however i if in inside instead into is it its itself just later
+let like maybe me meanwhile might mine more most my myself near neither never
+next no nobody none nor not nothing now of off oh ok okay on once one only or
+other our ours out outside over perhaps please same she should since so some
+someone something soon still such suddenly than that the their theirs them
+themselves then there these they this those though through thus to today
+together tomorrow tonight too toward under until up upon us very was we well
+were what whatever when where whether which while who whom whose why with
+within without would yes yesterday yet you your yours yourself
+chapter scene part end
+monday tuesday wednesday thursday friday saturday sunday
+january february september october november december
+mr mrs ms dr sir lady lord
+""".split())
+
+# Months and modal verbs that are also common names ("May", "March"): their
+# capital letter only says something mid-sentence, so they are filtered at
+# the start of a sentence or line and kept elsewhere ("Then May smiled.")
+AMBIGUOUS_WORDS = frozenset({"may", "march"})
+
+# Characters after which the next word starts a sentence
+_SENTENCE_ENDS = ".!?:;\"'\u201c\u201d\u2018\u2019\u2026([-\u2013\u2014"
+
+
+def _starts_sentence(text: str, start: int) -> bool:
+    """Whether the word at `text[start]` opens a sentence (or the line)."""
+    before = text[:start].rstrip()
+    if not before:
+        return True
+    if before[-1] in "\"'\u201d\u2019" and before[:-1].rstrip().endswith(","):
+        # '"Hi," May said' - the quote closes a clause, not a sentence
+        return False
+    return before[-1] in _SENTENCE_ENDS
+
+
+def _clean(candidate: str, sentence_start: bool = False) -> Optional[str]:
+    """Drop stop words around a candidate ("Then Charlie" -> "Charlie").
+
+    With `sentence_start`, the candidate's first word opens a sentence and
+    `AMBIGUOUS_WORDS` are dropped there too.
+    """
+    words = candidate.split()
+    first = 0  # index in the original candidate of words[0]
+    while words and (words[0].casefold() in STOP_WORDS or (first == 0 and sentence_start and words[0].casefold() in AMBIGUOUS_WORDS)):
+        words.pop(0)
+        first += 1
+    while words and words[-1].casefold() in STOP_WORDS:
+        words.pop()
+    name = " ".join(words)
+    # filter out very short words
+    if len(name) <= 2:
+        return None
+    return name
+
+
+def find_name_candidates(text: str) -> List[str]:
+    """Return every character-name candidate in `text`, in order."""
+    names = []
+    for match in _NAME_RE.finditer(text):
+        # A speaker label ("May: Hello!") is a name wherever it stands
+        speaker = text[match.end():match.end() + 1] == ":"
+        name = _clean(match.group(1), sentence_start=not speaker and _starts_sentence(text, match.start()))
+        if name is not None:
+            names.append(name)
+    return names
+
+
+class CharacterIndex:
+    """Counts name mentions scene by scene and ranks the story's characters.
+
+    Score = mentions + scenes shared with another candidate + 2 * spoken
+    lines; ties go to the name mentioned first. Names are matched
+    casefolded and reported in the form they were first seen.
+    """
+
+    def __init__(self):
+        self.mentions: Counter = Counter()
+        self.cooccurrence: Counter = Counter()
+        self.spoken: Counter = Counter()
+        self.display: Dict[str, str] = {}
+        self.scene_keys: List[List[str]] = []
+
+    def add_scene(self, mentions: Iterable[str], speakers: Iterable[str] = ()) -> None:
+        keys: Dict[str, None] = {}
+        for name in mentions:
+            key = name.casefold()
+            self.mentions[key] += 1
+            self.display.setdefault(key, name)
+            keys[key] = None
+        for speaker in speakers:
+            key = (speaker or "").casefold()
+            if key in keys:
+                self.spoken[key] += 1
+        scene_keys = list(keys)
+        if len(scene_keys) > 1:
+            self.cooccurrence.update(scene_keys)
+        self.scene_keys.append(scene_keys)
+
+    def _score(self, key: str) -> int:
+        return self.mentions[key] + self.cooccurrence[key] + 2 * self.spoken[key]
+
+    def _ranked_keys(self, max_characters: int) -> List[str]:
+        # `display` preserves first-seen order, which sorted() keeps for ties
+        return sorted(self.display, key=self._score, reverse=True)[:max_characters]
+
+    def rank(self, max_characters: int = 8) -> List[str]:
+        """The top `max_characters` names of the story, best first."""
+        return [self.display[key] for key in self._ranked_keys(max_characters)]
+
+    def scene_characters(self, max_characters: int = 8) -> List[List[str]]:
+        """Per scene, the ranked characters it mentions.
+
+        A scene that mentions none of them (e.g. "She walked away.") keeps
+        the characters of the scene before it.
+        """
+        ranked = self._ranked_keys(max_characters)
+        result: List[List[str]] = []
+        previous: List[str] = []
+        for keys in self.scene_keys:
+            present = set(keys)
+            chars = [self.display[key] for key in ranked if key in present] or previous
+            result.append(chars)
+            previous = chars
+        return result
+
+
+def rank_characters(candidates: Iterable[str], max_characters: int = 8, speakers: Sequence[str] = ()) -> List[str]:
+    """Rank a stream of candidates (see `find_name_candidates`) as a single scene."""
+    index = CharacterIndex()
+    index.add_scene(candidates, speakers)
+    return index.rank(max_characters)
+
 
 def extract_characters(text: str, max_characters: int = 8) -> List[str]:
     """Extract character names by looking for Titlecase words and simple patterns.
@@ -15,22 +162,8 @@ def extract_characters(text: str, max_characters: int = 8) -> List[str]:
         max_characters: Max number of characters to return.
 
     Returns:
-        List of unique character name guesses.
+        List of unique character name guesses, most prominent first.
     """
     if not text:
         return []
-    # Simple heuristic: look for capitalized words (including multi-word names)
-    candidates = re.findall(r"\b([A-Z][a-z]{1,20}(?:\s+[A-Z][a-z]{1,20})?)\b", text)
-    unique = []
-    for name in candidates:
-        if name.lower() in (n.lower() for n in unique):
-            continue
-        # filter out common sentence-start words
-        if len(name) <= 2:
-            continue
-        unique.append(name)
-        if len(unique) >= max_characters:
-            break
-    return unique
-
-
+    return rank_characters(find_name_candidates(text), max_characters)
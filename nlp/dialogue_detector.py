@@ -1,5 +1,23 @@
 """Detect dialogue lines in a scene."""
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+
+def parse_dialogue_line(line: str) -> Optional[Tuple[str, str]]:
+    """Return (speaker, speech) if a single stripped line is dialogue, else None.
+
+    Recognizes "Name: speech" (a speaker of up to three words) and lines
+    that open with a quoted "speech".
+    """
+    # Name: speech
+    speaker, sep, speech = line.partition(":")
+    if sep and len(speaker.split()) <= 3:
+        return (speaker.strip(), speech.strip().strip('"'))
+    # "speech"
+    if line.startswith('"'):
+        end = line.find('"', 1)
+        if end != -1:
+            return ("", line[1:end].strip())
+    return None
 
 
 def detect_dialogue_lines(scene: str) -> List[Tuple[str, str]]:
@@ -10,20 +28,12 @@ def detect_dialogue_lines(scene: str) -> List[Tuple[str, str]]:
     """
     if not scene:
         return []
-    lines = [line.strip() for line in scene.splitlines() if line.strip()]
     dialogues = []
-    for line in lines:
-        # Name: speech
-        if ":" in line and len(line.split(":", 1)[0].split()) <= 3:
-            speaker, speech = line.split(":", 1)
-            dialogues.append((speaker.strip(), speech.strip().strip('"')))
-            continue
-        # "speech"
-        if line.startswith('"') and '"' in line[1:]:
-            end = line.find('"', 1)
-            speech = line[1:end]
-            dialogues.append(("", speech.strip()))
+    for line in scene.splitlines():
+        line = line.strip()
+        if not line:
             continue
+        dialogue = parse_dialogue_line(line)
+        if dialogue is not None:
+            dialogues.append(dialogue)
     return dialogues
-
-
@@ -0,0 +1,98 @@
+"""Pluggable character-mention backends.
+
+`parse_story` finds character-name mentions per scene with one of these
+backends, selected via environment variables:
+
+- `NLP_CHARACTER_BACKEND` (default: "regex") "regex" or "spacy"
+- `SPACY_MODEL` (default: "en_core_web_sm") spaCy pipeline to load
+- `SPACY_BATCH_SIZE` (default: 64) scenes per `nlp.pipe` batch
+- `SPACY_PROCESSES` (default: 1) worker processes for `nlp.pipe`
+
+The spaCy pipeline is loaded lazily on first use, never at import time, with
+every component except NER disabled. If spaCy or the model is not installed
+the regex backend is used instead, so the NER backend can be switched on in
+config without risking startup.
+"""
+from typing import List, Optional, Sequence
+import logging
+import os
+import threading
+
+from nlp.character_extractor import find_name_candidates
+
+_LOGGER = logging.getLogger(__name__)
+
+# Components named character mentions never need
+_UNUSED_PIPES = ("tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer", "textcat")
+
+
+class RegexBackend:
+    """Titlecase heuristics from `nlp.character_extractor`."""
+
+    name = "regex"
+
+    def mentions(self, texts: Sequence[str]) -> List[List[str]]:
+        return [find_name_candidates(text) for text in texts]
+
+
+class SpacyBackend:
+    """PERSON entities from a spaCy pipeline, processed in batches."""
+
+    name = "spacy"
+
+    def __init__(self, model: str = None, batch_size: int = None, processes: int = None):
+        self.model = model or os.environ.get("SPACY_MODEL", "en_core_web_sm")
+        self.batch_size = batch_size or int(os.environ.get("SPACY_BATCH_SIZE", 64))
+        self.processes = processes or int(os.environ.get("SPACY_PROCESSES", 1))
+        self._nlp = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the pipeline once; raises ImportError/OSError if unavailable."""
+        with self._lock:
+            if self._nlp is None:
+                import spacy
+
+                self._nlp = spacy.load(self.model, disable=list(_UNUSED_PIPES))
+                _LOGGER.info("Loaded spaCy pipeline %s with pipes %s", self.model, self._nlp.pipe_names)
+            return self._nlp
+
+    def mentions(self, texts: Sequence[str]) -> List[List[str]]:
+        nlp = self.load()
+        # Multiple processes only pay off for large batches of scenes
+        processes = self.processes if len(texts) > self.batch_size else 1
+        return [
+            [ent.text.strip() for ent in doc.ents if ent.label_ == "PERSON" and ent.text.strip()]
+            for doc in nlp.pipe(texts, batch_size=self.batch_size, n_process=processes)
+        ]
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def _create_backend(name: str):
+    if name == "spacy":
+        backend = SpacyBackend()
+        try:
+            backend.load()
+            return backend
+        except Exception as exc:  # noqa: BLE001 - missing package or model
+            _LOGGER.warning("spaCy backend unavailable (%s), falling back to regex character extraction", exc)
+    elif name != "regex":
+        _LOGGER.warning("Unknown NLP_CHARACTER_BACKEND %r, using regex", name)
+    return RegexBackend()
+
+
+def get_character_backend(name: Optional[str] = None):
+    """Return the configured mention backend (created once per process).
+
+    Pass `name` to build a specific backend instead of the shared one.
+    """
+    global _BACKEND
+    if name is not None:
+        return _create_backend(name)
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = _create_backend(os.environ.get("NLP_CHARACTER_BACKEND", "regex").lower())
+        return _BACKEND
@@ -0,0 +1,136 @@
+"""Single-pass story parser.
+
+`split_into_scenes`, `detect_dialogue_lines` and `extract_characters` each
+walk the text separately. This parser reads the story once, line by line,
+and produces scenes, their dialogue and the character-name mentions in the
+same pass. `iter_scenes` is a generator that also accepts a file object (or
+any iterable of lines), so novel-length manuscripts are parsed in constant
+memory per scene.
+
+Results match the individual helpers: scenes are separated by blank lines
+and one-word paragraphs are merged into the previous scene.
+"""
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import itertools
+
+from nlp.character_extractor import CharacterIndex, find_name_candidates
+from nlp.dialogue_detector import parse_dialogue_line
+from nlp.ner import get_character_backend
+
+Source = Union[str, Iterable[str]]
+
+
+class Scene(NamedTuple):
+    index: int
+    text: str
+    dialogues: List[Tuple[str, str]]
+    # Character-name candidates in order of appearance
+    mentions: List[str]
+    # Ranked story characters present in this scene (filled by `parse_story`)
+    characters: List[str] = []
+
+
+class _SceneBuilder:
+    """Accumulates one scene; re-parses its last line when a word is merged in."""
+
+    __slots__ = ("lines", "dialogues", "mentions", "last_dialogue", "last_mentions")
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.dialogues: List[Tuple[str, str]] = []
+        self.mentions: List[str] = []
+        self.last_dialogue = False
+        self.last_mentions = 0
+
+    def add_line(self, raw: str, line: str) -> None:
+        self.lines.append(raw)
+        self._scan(line)
+
+    def _scan(self, line: str) -> None:
+        dialogue = parse_dialogue_line(line)
+        self.last_dialogue = dialogue is not None
+        if dialogue is not None:
+            self.dialogues.append(dialogue)
+        found = find_name_candidates(line)
+        self.last_mentions = len(found)
+        self.mentions.extend(found)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+    def merge_word(self, word: str) -> None:
+        """Append a one-word paragraph to the last line, like `split_into_scenes`."""
+        text = f"{self.text} {word}"
+        self.lines = [text]
+        # Only the last line changed; undo its results and scan it again
+        if self.last_dialogue:
+            self.dialogues.pop()
+        if self.last_mentions:
+            del self.mentions[-self.last_mentions:]
+        self._scan(text.rsplit("\n", 1)[-1].strip())
+
+    def build(self, index: int) -> Scene:
+        return Scene(index, self.text, self.dialogues, self.mentions)
+
+
+def _lines(source: Source) -> Iterable[str]:
+    if isinstance(source, str):
+        return source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return source
+
+
+def iter_scenes(source: Source) -> Iterator[Scene]:
+    """Yield `Scene`s from a story string or an iterable of lines.
+
+    A scene is yielded as soon as the next one starts (one-word paragraphs
+    may still be merged into it until then).
+    """
+    index = 0
+    previous: Optional[_SceneBuilder] = None
+    current: Optional[_SceneBuilder] = None
+    # A trailing blank line flushes the last paragraph
+    for raw in itertools.chain(_lines(source), ("",)):
+        raw = raw.rstrip("\r\n")
+        line = raw.strip()
+        if line:
+            if current is None:
+                current = _SceneBuilder()
+            current.add_line(raw, line)
+            continue
+        if current is None:
+            continue
+        # Paragraph finished: merge one-word paragraphs into the previous scene
+        text = current.text
+        if previous is not None and len(text.split()) <= 1:
+            previous.merge_word(text)
+        else:
+            if previous is not None:
+                yield previous.build(index)
+                index += 1
+            previous = current
+        current = None
+    if previous is not None:
+        yield previous.build(index)
+
+
+def parse_story(source: Source, max_characters: int = 8, backend=None) -> Tuple[List[Scene], List[str]]:
+    """Parse a whole story in one pass; return (scenes, characters).
+
+    Mentions come from `backend` (default: `nlp.ner.get_character_backend()`);
+    the regex backend reuses the mentions found while scanning, others
+    (spaCy NER) process all scenes in batches. Characters are ranked over the
+    whole story (see `CharacterIndex`) and each scene's `characters` lists
+    the ones it features.
+    """
+    backend = backend or get_character_backend()
+    scenes = list(iter_scenes(source))
+    if backend.name != "regex":
+        mentions = backend.mentions([scene.text for scene in scenes])
+        scenes = [scene._replace(mentions=found) for scene, found in zip(scenes, mentions)]
+    index = CharacterIndex()
+    for scene in scenes:
+        index.add_scene(scene.mentions, [speaker for speaker, _ in scene.dialogues])
+    per_scene = index.scene_characters(max_characters)
+    scenes = [scene._replace(characters=chars) for scene, chars in zip(scenes, per_scene)]
+    return scenes, index.rank(max_characters)
@@ -4,6 +4,10 @@ This is a lightweight placeholder implementation using simple
 heuristics. Replace with a model-based approach for production.
 """
 from typing import List
+import re
+
+# One or more blank (or whitespace-only) lines separate scenes
+_PARAGRAPH_RE = re.compile(r"\n\s*\n+")
 
 
 def split_into_scenes(text: str) -> List[str]:
@@ -20,8 +24,7 @@ def split_into_scenes(text: str) -> List[str]:
     # Normalize newlines to '\n' and split on one or more blank lines as scene separators
     normalized = text.replace('\r\n', '\n').replace('\r', '\n')
     # Use double-newline groups as separators: join lines with '\n' then split on two or more newlines
-    import re
-    paragraphs = [p.strip() for p in re.split(r"\n\s*\n+", normalized) if p.strip()]
+    paragraphs = [p.strip() for p in _PARAGRAPH_RE.split(normalized) if p.strip()]
     # Merge very short paragraphs (empty or single-word) with previous scene
     scenes: List[str] = []
     for p in paragraphs:
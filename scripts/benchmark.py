@@ -0,0 +1,318 @@
+"""Benchmarks for the hot paths and an HTTP load driver for the API.
+
+Usage:
+    python scripts/benchmark.py micro [--sizes short,medium] [--output out.json]
+    python scripts/benchmark.py load [--url http://localhost:8000] [--scenario parse] [--concurrency 1,4,16]
+    python scripts/benchmark.py micro --compare previous.json
+
+`micro` times story parsing, prompt building, placeholder generation, bubble
+overlay and page assembly on a synthetic story corpus (short to
+novel-length). `load` drives the FastAPI app with N concurrent clients and
+reports throughput and p50/p95/p99 latency; without `--url` it serves the
+app in-process with uvicorn (`--asgi` skips the network and calls the app
+through the test client instead). Both print JSON (or write it to
+`--output`); `--compare` reports the change in p50 against an earlier run
+and exits with status 1 if any benchmark got slower than `--tolerance`.
+"""
+import sys
+from pathlib import Path
+
+# Ensure project root is importable when running from the repo root
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from PIL import Image
+
+# Scenes per corpus size; "novel" is roughly 100k words
+SIZES = {"short": 5, "medium": 50, "long": 500, "novel": 5000}
+
+_NAMES = ["Alice", "Bob", "Charlie", "Mina Park", "Kenji", "Rosa", "Tariq", "Yuki Tanaka", "Olga", "Marcus"]
+_PLACES = ["the harbor", "a neon alley", "the old library", "a rooftop garden", "the train station", "a quiet forest"]
+_ACTIONS = ["waits for", "argues with", "runs after", "whispers to", "laughs at", "hides from"]
+_LINES = ["We have to go now!", "Did you hear that?", "I never wanted this.", "Look over there.", "It's not over yet.", "Follow me, quickly."]
+
+
+def synthetic_story(scenes: int, seed: int = 0) -> str:
+    """A deterministic story of `scenes` scenes mixing narration and dialogue."""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(scenes):
+        a, b = rng.sample(_NAMES, 2)
+        lines = [f"{a} {rng.choice(_ACTIONS)} {b} at {rng.choice(_PLACES)}. The wind was cold and the lights flickered."]
+        for _ in range(rng.randint(0, 3)):
+            lines.append(f"{rng.choice((a, b))}: {rng.choice(_LINES)}")
+        if rng.random() < 0.3:
+            lines.append(f'"{rng.choice(_LINES)}" said {a}.')
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Linearly interpolated percentile (q in 0-100) of `samples`."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    pos = (len(ordered) - 1) * q / 100.0
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def summarize(name: str, samples: List[float], **extra) -> Dict:
+    """Latency summary in milliseconds for samples in seconds."""
+    ms = [s * 1000.0 for s in samples]
+    return {
+        "name": name,
+        **extra,
+        "runs": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
+
+
+def measure(fn: Callable[[], object], min_runs: int = 3, max_runs: int = 50, budget: float = 1.0) -> List[float]:
+    """Time `fn` after one warm-up call until `budget` seconds or `max_runs` runs."""
+    fn()
+    samples: List[float] = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _meta() -> Dict:
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_micro(sizes: List[str], budget: float = 1.0, max_runs: int = 50) -> Dict:
+    """Time the NLP and image hot paths; returns the JSON report."""
+    from generation.assembler import assemble_grid
+    from generation.compositor import BubbleOverlay
+    from generation.prompt_builder import build_prompts_for_panels
+    from generation.sd_generator import _placeholder_generate
+    from nlp.character_extractor import extract_characters
+    from nlp.dialogue_detector import detect_dialogue_lines
+    from nlp.parser import parse_story
+    from nlp.scene_splitter import split_into_scenes
+
+    results = []
+
+    def _bench(name, fn, **extra):
+        results.append(summarize(name, measure(fn, max_runs=max_runs, budget=budget), **extra))
+
+    for size in sizes:
+        story = synthetic_story(SIZES[size])
+        scenes = split_into_scenes(story)
+        panels = [{"scene": s.text, "dialogues": s.dialogues, "characters": s.characters} for s in parse_story(story)[0]]
+        extra = {"size": size, "scenes": len(scenes), "chars": len(story)}
+        _bench("split_into_scenes", lambda: split_into_scenes(story), **extra)
+        _bench("extract_characters", lambda: extract_characters(story), **extra)
+        _bench("detect_dialogue_lines", lambda: [detect_dialogue_lines(s) for s in scenes], **extra)
+        _bench("parse_story", lambda: parse_story(story), **extra)
+        _bench("build_prompts_for_panels", lambda: build_prompts_for_panels(panels, "manga", seed=1), **extra)
+
+    dialogues = [[("Alice", "We have to go now!"), ("Bob", "Did you hear that?")]] * 4
+    prompts = [{"positive_prompt": f"manga panel {i}"} for i in range(4)]
+    overlay = BubbleOverlay(dialogues)
+    base = Image.new("RGB", (512, 512), (240, 240, 240))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _placeholder_generate(prompts, os.path.join(tmp, "panels"))
+        counter = iter(range(10**9))
+        _bench("_placeholder_generate", lambda: _placeholder_generate(prompts, os.path.join(tmp, "panels")), panels=len(prompts))
+        _bench("bubble_overlay", lambda: overlay(0, base.copy()), width=512)
+        # Distinct text every run: layout and drawing without the bubble-layer cache
+        _bench("bubble_overlay_uncached", lambda: BubbleOverlay([[("Alice", f"Line {next(counter)}")]])(0, base.copy()), width=512)
+        _bench("assemble_grid", lambda: assemble_grid(paths, columns=2, output_path=os.path.join(tmp, "page.png")), panels=len(paths))
+    return {"suite": "micro", "meta": _meta(), "results": results}
+
+
+def _scenario_request(scenario: str) -> Dict:
+    story = synthetic_story(SIZES["short"])
+    if scenario == "health":
+        return {"method": "GET", "path": "/health", "body": None}
+    if scenario == "parse":
+        return {"method": "POST", "path": "/parse", "body": {"title": "bench", "text": synthetic_story(SIZES["medium"])}}
+    if scenario == "prompts":
+        panels = [{"scene": s, "dialogues": []} for s in story.split("\n\n")]
+        return {"method": "POST", "path": "/prompts", "body": {"panels": panels, "style": "manga", "seed": 1}}
+    if scenario == "comic":
+        return {"method": "POST", "path": "/generate/comic", "body": {"story": story, "seed": 1, "inline_images": False}}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def http_sender(base_url: str) -> Callable[[str, str, Optional[Dict]], int]:
+    def _send(method, path, body):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(base_url.rstrip("/") + path, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=600) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+    return _send
+
+
+def asgi_sender(app) -> Callable[[str, str, Optional[Dict]], int]:
+    """Call the app in-process through the test client (one client per thread)."""
+    from fastapi.testclient import TestClient
+
+    local = threading.local()
+
+    def _send(method, path, body):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = TestClient(app)
+        return client.request(method, path, json=body).status_code
+
+    return _send
+
+
+def run_load(send: Callable[[str, str, Optional[Dict]], int], scenario: str, concurrency: int, requests: int) -> Dict:
+    """Issue `requests` requests from `concurrency` clients; summarize latency and throughput."""
+    request = _scenario_request(scenario)
+    send(**request)  # warm-up (first pipeline load, imports)
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def _one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = send(**request) < 400
+        except Exception:  # noqa: BLE001 - counted, the run goes on
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_one, range(requests)))
+    wall = time.perf_counter() - started
+    return summarize(
+        f"{request['method']} {request['path']}",
+        latencies,
+        scenario=scenario,
+        concurrency=concurrency,
+        errors=errors,
+        throughput_rps=round(len(latencies) / wall, 2) if wall else 0.0,
+    )
+
+
+def _serve_in_process():
+    """Start the app with uvicorn on a free local port; returns (base_url, server)."""
+    import socket
+    import uvicorn
+    from backend.main import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="bench_server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """p50 ratio of each benchmark against the baseline run; `regressed` beyond `tolerance`."""
+    def _key(result):
+        return (result["name"], result.get("size"), result.get("scenario"), result.get("concurrency"))
+
+    previous = {_key(r): r for r in baseline.get("results", [])}
+    rows = []
+    for result in report["results"]:
+        old = previous.get(_key(result))
+        if old is None or not old["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"]
+        rows.append({"name": result["name"], "size": result.get("size"), "concurrency": result.get("concurrency"), "p50_ratio": round(ratio, 3), "regressed": ratio > tolerance})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="suite", required=True)
+    micro = sub.add_parser("micro", help="micro-benchmarks of the hot paths")
+    micro.add_argument("--sizes", default="short,medium,long", help=f"comma-separated corpus sizes: {', '.join(SIZES)}")
+    micro.add_argument("--budget", type=float, default=1.0, help="seconds per benchmark")
+    micro.add_argument("--max-runs", type=int, default=50)
+    load = sub.add_parser("load", help="HTTP load test against the API")
+    load.add_argument("--url", help="base URL of a running server (default: serve the app in-process)")
+    load.add_argument("--asgi", action="store_true", help="call the app in-process without HTTP")
+    load.add_argument("--scenario", default="parse", choices=["health", "parse", "prompts", "comic"])
+    load.add_argument("--concurrency", default="1,4,16", help="comma-separated client counts")
+    load.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    for p in (micro, load):
+        p.add_argument("--output", help="write the JSON report here instead of stdout")
+        p.add_argument("--compare", help="earlier JSON report to compare p50 latencies against")
+        p.add_argument("--tolerance", type=float, default=1.25, help="p50 ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    if args.suite == "micro":
+        report = run_micro([s.strip() for s in args.sizes.split(",") if s.strip()], budget=args.budget, max_runs=args.max_runs)
+    else:
+        server = None
+        if args.url:
+            send = http_sender(args.url)
+        elif args.asgi:
+            from backend.main import app
+
+            send = asgi_sender(app)
+        else:
+            base_url, server = _serve_in_process()
+            send = http_sender(base_url)
+        try:
+            levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+            results = [run_load(send, args.scenario, c, args.requests) for c in levels]
+        finally:
+            if server is not None:
+                server.should_exit = True
+        report = {"suite": "load", "meta": _meta(), "results": results}
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        regressed = any(row["regressed"] for row in report["comparison"])
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
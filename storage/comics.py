@@ -0,0 +1,88 @@
+"""Repository of generated comics on top of `storage.db`.
+
+A comic record keeps everything needed to resume or edit it without redoing
+the expensive steps: the story and request options, the parse output
+(scenes, dialogues, characters), the prompt and seed of every panel and the
+image store id of its latest render. Records are stored under
+"comic:<id>" keys.
+"""
+from typing import Any, Callable, Dict, List, Optional, Set
+import time
+import uuid
+
+from storage.db import LocalDB, get_db
+
+_PREFIX = "comic:"
+
+
+class ComicRepository:
+    def __init__(self, db: LocalDB = None):
+        self._db = db
+
+    @property
+    def db(self) -> LocalDB:
+        return self._db or get_db()
+
+    def create(self, record: Dict[str, Any]) -> str:
+        """Store a new comic record and return its id."""
+        comic_id = uuid.uuid4().hex
+        now = time.time()
+        self.db.save(_PREFIX + comic_id, {**record, "id": comic_id, "created_at": now, "updated_at": now})
+        return comic_id
+
+    def get(self, comic_id: str) -> Optional[Dict[str, Any]]:
+        return self.db.load(_PREFIX + comic_id)
+
+    def update(self, comic_id: str, mutate: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        """Apply `mutate(record)` to the stored record and save it.
+
+        The read, `mutate` and write happen in one database transaction
+        (`LocalDB.update`), so concurrent updates from any worker process
+        are applied one after another. Returns the updated record, or None
+        if the comic does not exist.
+        """
+        def _apply(record):
+            mutate(record)
+            record["updated_at"] = time.time()
+
+        return self.db.update(_PREFIX + comic_id, _apply)
+
+    def set_images(self, comic_id: str, image_ids: Dict[int, str]) -> Optional[Dict[str, Any]]:
+        """Record the image store id of freshly rendered panels."""
+        def _apply(record):
+            for index, image_id in image_ids.items():
+                record["panels"][index]["image_id"] = image_id
+
+        return self.update(comic_id, _apply)
+
+    def list(self, limit: int = 50, after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return up to `limit` comic records in id order, starting after `after`."""
+        keys = self.db.list(_PREFIX, limit=limit, after=_PREFIX + after if after else None)
+        records = self.db.load_many(keys)
+        return [records[key] for key in keys if key in records]
+
+    def image_ids(self) -> Set[str]:
+        """Image store ids referenced by any stored comic."""
+        ids: Set[str] = set()
+        after = None
+        while True:
+            records = self.list(limit=500, after=after)
+            for record in records:
+                ids.update(panel["image_id"] for panel in record.get("panels", []) if panel.get("image_id"))
+            if len(records) < 500:
+                return ids
+            after = records[-1]["id"]
+
+    def delete(self, comic_id: str) -> bool:
+        return self.db.delete(_PREFIX + comic_id)
+
+
+_REPOSITORY: Optional[ComicRepository] = None
+
+
+def get_comic_repository() -> ComicRepository:
+    """Return the process-wide comic repository (backed by `get_db()`)."""
+    global _REPOSITORY
+    if _REPOSITORY is None:
+        _REPOSITORY = ComicRepository()
+    return _REPOSITORY
@@ -1,33 +1,167 @@
-"""Simple local JSON storage for prototypes.
+"""Local record storage backed by SQLite.
 
-Provides basic save/load for records keyed by id. In production, replace
-with MongoDB integration.
+Provides save/load for JSON records keyed by id, plus listing, deletion and
+batch operations. Records live in a single indexed table, so a write touches
+one row instead of rewriting the whole data set. The database runs in WAL
+mode: readers never block the writer, concurrent writers (threads or
+processes) are serialized by SQLite, and a crash mid-write never corrupts
+committed records. Configure the location with `DB_PATH` (default:
+"output/db.sqlite3").
+
+Keys are free-form strings; namespacing them by prefix (e.g. "story:<id>")
+lets `list` return one kind of record with an index range scan. A legacy
+JSON file written by the previous implementation is imported on first use.
 """
 import json
 import os
-from typing import Any, Dict
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Legacy single-file JSON store imported on first use
+_LEGACY_JSON = "storage/db.json"
 
 
 class LocalDB:
-    def __init__(self, path: str = "storage/db.json"):
-        self.path = path
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        if not os.path.exists(path):
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+    def __init__(self, path: str = None, legacy_json: Optional[str] = _LEGACY_JSON):
+        self.path = path or os.environ.get("DB_PATH", "output/db.sqlite3")
+        db_dir = os.path.dirname(self.path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+        if legacy_json and os.path.exists(legacy_json) and not self.list(limit=1):
+            self.import_json(legacy_json)
 
-    def _read_all(self) -> Dict[str, Any]:
-        with open(self.path, "r", encoding="utf-8") as f:
-            return json.load(f)
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints; safe against corruption in WAL mode
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
 
     def save(self, key: str, record: Dict[str, Any]) -> None:
-        data = self._read_all()
-        data[key] = record
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.save_many({key: record})
+
+    def save_many(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """Insert or replace several records in a single transaction."""
+        now = time.time()
+        rows = [(key, json.dumps(record, ensure_ascii=False), now) for key, record in records.items()]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO records (key, value, updated_at) VALUES (?, ?, ?)", rows)
+
+    def update(self, key: str, mutate: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        """Read, change and write one record in a single transaction.
+
+        `mutate(record)` edits the record in place under `BEGIN IMMEDIATE`,
+        which takes the write lock up front, so concurrent updates from
+        other threads or processes are serialized instead of lost. Returns
+        the updated record, or None (without calling `mutate`) if `key` is
+        missing.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM records WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            record = json.loads(row[0])
+            mutate(record)
+            conn.execute(
+                "INSERT OR REPLACE INTO records (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(record, ensure_ascii=False), time.time()),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return record
 
     def load(self, key: str) -> Dict[str, Any]:
-        data = self._read_all()
-        return data.get(key)
+        row = self._connect().execute("SELECT value FROM records WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the records found for `keys`; missing keys are omitted."""
+        keys = list(keys)
+        found: Dict[str, Dict[str, Any]] = {}
+        conn = self._connect()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for key, value in conn.execute(f"SELECT key, value FROM records WHERE key IN ({marks})", chunk):
+                found[key] = json.loads(value)
+        return found
+
+    def delete(self, key: str) -> bool:
+        """Delete one record; return True if it existed."""
+        return self.delete_many([key]) > 0
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete several records in one transaction; return how many existed."""
+        with self._connect() as conn:
+            cur = conn.executemany("DELETE FROM records WHERE key = ?", [(key,) for key in keys])
+            return cur.rowcount
+
+    def list(self, prefix: str = "", limit: Optional[int] = None, after: Optional[str] = None) -> List[str]:
+        """Return keys starting with `prefix` in key order.
+
+        Pass the last key of a page as `after` to fetch the next one.
+        """
+        sql = "SELECT key FROM records WHERE key >= ?"
+        args: List[Any] = [prefix]
+        if prefix:
+            # Upper bound of the prefix range, so the primary key index is used
+            sql += " AND key < ?"
+            args.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if after is not None:
+            sql += " AND key > ?"
+            args.append(after)
+        sql += " ORDER BY key"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [row[0] for row in self._connect().execute(sql, args)]
+
+    def import_json(self, path: str) -> int:
+        """Import every record of a legacy JSON store; return the count."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.save_many(data)
+        return len(data)
+
+    def close(self) -> None:
+        """Close this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_DB: Optional[LocalDB] = None
+_DB_LOCK = threading.Lock()
 
 
+def get_db() -> LocalDB:
+    """Return the process-wide database configured from the environment."""
+    global _DB
+    with _DB_LOCK:
+        if _DB is None:
+            _DB = LocalDB()
+        return _DB
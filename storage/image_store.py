@@ -0,0 +1,162 @@
+"""Content-addressed store for images served over HTTP.
+
+Images are stored once under the SHA-256 of their bytes, so the id doubles
+as a strong ETag and responses can be cached forever. A background janitor
+removes images no stored comic references once they expire, and the oldest
+of those when the store is over its quota. Configuration via environment
+variables:
+
+- `IMAGE_STORE_DIR` (default: "output/store")
+- `IMAGE_STORE_MAX_AGE` (default: 604800) seconds an unreferenced image is kept
+- `IMAGE_STORE_MAX_MB` (default: 4096) disk quota for the store
+- `IMAGE_STORE_MIN_AGE` (default: 3600) images younger than this are never
+  removed, so freshly published panels stay servable
+- `IMAGE_STORE_SWEEP_INTERVAL` (default: 900) seconds between sweeps
+"""
+from typing import Iterable, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+_LOGGER = logging.getLogger(__name__)
+
+_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg")
+
+
+class ImageStore:
+    def __init__(self, root: str = None):
+        self.root = root or os.environ.get("IMAGE_STORE_DIR", "output/store")
+
+    def _path(self, image_id: str, ext: str) -> str:
+        return os.path.join(self.root, image_id[:2], f"{image_id}{ext}")
+
+    def put_bytes(self, data: bytes, ext: str = ".png") -> str:
+        """Add already-encoded image bytes to the store and return the id."""
+        image_id = hashlib.sha256(data).hexdigest()
+        dest = self._path(image_id, ext)
+        try:
+            # Already stored: restart its expiry clock
+            os.utime(dest)
+        except OSError:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dest)
+        return image_id
+
+    def get_path(self, image_id: str) -> Optional[str]:
+        """Return the file path for `image_id`, or None if unknown/invalid."""
+        if not _ID_RE.match(image_id or ""):
+            return None
+        for ext in _EXTENSIONS:
+            path = self._path(image_id, ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def sweep(
+        self,
+        keep: Iterable[str] = (),
+        max_age: float = None,
+        max_bytes: int = None,
+        min_age: float = None,
+        now: float = None,
+    ) -> List[str]:
+        """Remove expired images, then the oldest ones until under quota.
+
+        Ids in `keep` (images of stored comics) and images younger than
+        `min_age` are never removed. Returns the removed ids.
+        """
+        if max_age is None:
+            max_age = float(os.environ.get("IMAGE_STORE_MAX_AGE", 7 * 24 * 3600))
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("IMAGE_STORE_MAX_MB", 4096)) * 1024 * 1024)
+        if min_age is None:
+            min_age = float(os.environ.get("IMAGE_STORE_MIN_AGE", 3600))
+        now = now if now is not None else time.time()
+        if not os.path.isdir(self.root):
+            return []
+
+        keep = set(keep)
+        total = 0
+        candidates: List[Tuple[float, str, str, int]] = []
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                image_id, ext = os.path.splitext(entry.name)
+                if ext not in _EXTENSIONS or not _ID_RE.match(image_id):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                total += st.st_size
+                if image_id not in keep and now - st.st_mtime >= min_age:
+                    candidates.append((st.st_mtime, image_id, entry.path, st.st_size))
+        candidates.sort()
+
+        removed = []
+        for mtime, image_id, path, size in candidates:
+            if now - mtime <= max_age and total <= max_bytes:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed.append(image_id)
+            total -= size
+        if removed:
+            _LOGGER.info("Image store janitor removed %d image(s)", len(removed))
+        return removed
+
+
+def image_url(image_id: str) -> str:
+    return f"/images/{image_id}"
+
+
+_STORE: Optional[ImageStore] = None
+
+
+def get_store() -> ImageStore:
+    """Return the process-wide image store configured from the environment."""
+    global _STORE
+    if _STORE is None:
+        _STORE = ImageStore()
+    return _STORE
+
+
+def sweep_store() -> List[str]:
+    """Apply retention to the shared store, keeping every image a stored comic uses."""
+    from storage.comics import get_comic_repository
+
+    return get_store().sweep(keep=get_comic_repository().image_ids())
+
+
+_JANITOR: Optional[threading.Thread] = None
+
+
+def start_janitor(interval: float = None) -> threading.Thread:
+    """Start the background image store sweep thread once per process."""
+    global _JANITOR
+    if _JANITOR is not None and _JANITOR.is_alive():
+        return _JANITOR
+    interval = interval or float(os.environ.get("IMAGE_STORE_SWEEP_INTERVAL", 900))
+
+    def _run():
+        while True:
+            try:
+                sweep_store()
+            except Exception:  # noqa: BLE001 - keep the janitor alive
+                _LOGGER.exception("Image store sweep failed")
+            time.sleep(interval)
+
+    _JANITOR = threading.Thread(target=_run, name="image_store_janitor", daemon=True)
+    _JANITOR.start()
+    return _JANITOR
@@ -0,0 +1,126 @@
+"""Per-request workspaces for generated files.
+
+Each request or job writes its panels, pages and PDFs into its own directory
+so concurrent requests never overwrite each other's `panel_{i}.png` or
+`comic_page.png`. A background janitor expires old workspaces by age and
+keeps the total size under a quota. Configuration via environment variables:
+
+- `WORKSPACE_DIR` (default: "output/workspaces")
+- `WORKSPACE_MAX_AGE` (default: 3600) seconds before a workspace expires
+- `WORKSPACE_MAX_MB` (default: 2048) total disk quota for all workspaces
+- `WORKSPACE_SWEEP_INTERVAL` (default: 300) seconds between janitor sweeps
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+_LOGGER = logging.getLogger(__name__)
+
+# Workspaces currently in use; the janitor never removes these
+_ACTIVE = set()
+_LOCK = threading.Lock()
+
+
+def workspace_root() -> str:
+    return os.environ.get("WORKSPACE_DIR", "output/workspaces")
+
+
+def create_workspace(prefix: str = "ws") -> str:
+    """Create and return a new uniquely named workspace directory."""
+    name = f"{prefix}-{int(time.time())}-{uuid.uuid4().hex[:12]}"
+    path = os.path.join(workspace_root(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def workspace(prefix: str = "ws") -> Iterator[str]:
+    """Yield a fresh workspace, protected from the janitor while in use."""
+    path = create_workspace(prefix)
+    with _LOCK:
+        _ACTIVE.add(os.path.abspath(path))
+    try:
+        yield path
+    finally:
+        with _LOCK:
+            _ACTIVE.discard(os.path.abspath(path))
+        try:
+            # Restart the expiry clock from when the work finished
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def sweep(root: str = None, max_age: float = None, max_bytes: int = None, now: float = None) -> List[str]:
+    """Remove expired workspaces, then the oldest ones until under quota.
+
+    Returns the removed paths.
+    """
+    root = root or workspace_root()
+    if max_age is None:
+        max_age = float(os.environ.get("WORKSPACE_MAX_AGE", 3600))
+    if max_bytes is None:
+        max_bytes = int(float(os.environ.get("WORKSPACE_MAX_MB", 2048)) * 1024 * 1024)
+    now = now if now is not None else time.time()
+    if not os.path.isdir(root):
+        return []
+
+    with _LOCK:
+        active = set(_ACTIVE)
+    entries: List[Tuple[float, str, int]] = []
+    for entry in os.scandir(root):
+        if not entry.is_dir() or os.path.abspath(entry.path) in active:
+            continue
+        entries.append((entry.stat().st_mtime, entry.path, _dir_size(entry.path)))
+    entries.sort()
+
+    removed = []
+    total = sum(size for _, _, size in entries)
+    for mtime, path, size in entries:
+        if now - mtime <= max_age and total <= max_bytes:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+        total -= size
+    if removed:
+        _LOGGER.info("Workspace janitor removed %d workspace(s)", len(removed))
+    return removed
+
+
+_JANITOR: Optional[threading.Thread] = None
+
+
+def start_janitor(interval: float = None) -> threading.Thread:
+    """Start the background sweep thread once per process."""
+    global _JANITOR
+    if _JANITOR is not None and _JANITOR.is_alive():
+        return _JANITOR
+    interval = interval or float(os.environ.get("WORKSPACE_SWEEP_INTERVAL", 300))
+
+    def _run():
+        while True:
+            try:
+                sweep()
+            except Exception:  # noqa: BLE001 - keep the janitor alive
+                _LOGGER.exception("Workspace sweep failed")
+            time.sleep(interval)
+
+    _JANITOR = threading.Thread(target=_run, name="workspace_janitor", daemon=True)
+    _JANITOR.start()
+    return _JANITOR
@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_output(tmp_path, monkeypatch):
+    """Keep generated panels, workspaces, cache entries, stored images, records and loaded pipelines out of the repo."""
+    from generation import image_cache, pipeline_registry
+    from nlp import ner
+    from storage import db, image_store
+
+    monkeypatch.setenv("SD_OUTPUT_DIR", str(tmp_path / "images"))
+    monkeypatch.setenv("SD_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("IMAGE_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setenv("WORKSPACE_DIR", str(tmp_path / "workspaces"))
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "db.sqlite3"))
+    monkeypatch.setattr(image_cache, "_CACHE", None)
+    monkeypatch.setattr(image_store, "_STORE", None)
+    monkeypatch.setattr(db, "_DB", None)
+    monkeypatch.setattr(ner, "_BACKEND", None)
+    monkeypatch.setattr(pipeline_registry, "_REGISTRY", None)
+    return tmp_path
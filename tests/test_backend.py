@@ -0,0 +1,454 @@
+import threading
+import time
+
+import pytest
+
+from backend.jobs import JobManager, JobQueueFull
+
+
+def test_job_manager_rejects_when_queue_full():
+    release = threading.Event()
+    manager = JobManager(workers=1, max_queue=1)
+    running = manager.submit("test", lambda job: release.wait(5))
+    # Wait for the worker to pick up the first job so the queue is empty
+    for _ in range(100):
+        if running.status == "running":
+            break
+        time.sleep(0.01)
+    manager.submit("test", lambda job: None)
+    with pytest.raises(JobQueueFull):
+        manager.submit("test", lambda job: None)
+    release.set()
+    with pytest.raises(ValueError):
+        JobManager(workers=0)
+
+
+def test_comic_job_round_trip(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    client = TestClient(app)
+
+    resp = client.post("/jobs/comic", json={"story": "Alice waits.\n\nBob: Hello there!"})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+    for _ in range(200):
+        status = client.get(f"/jobs/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.02)
+    assert status["status"] == "done"
+    assert status["progress"] == {"done": 2, "total": 2}
+    panel = client.get(f"/jobs/{job_id}/panels/1").json()
+    assert "b64" not in panel and panel["dialogues"] == [["Bob", "Hello there!"]]
+    assert client.get(panel["url"]).content.startswith(b"\x89PNG")
+    # Finished jobs keep ids and dialogues, not image payloads
+    from backend.jobs import JOBS
+    assert set(JOBS.get(job_id).result) == {"comic_id", "dialogues"}
+    assert client.get(f"/jobs/{job_id}/panels/2").status_code == 404
+
+
+def test_comic_stream_emits_panels_as_ndjson(tmp_path, monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    client = TestClient(app)
+
+    resp = client.post("/generate/comic/stream", json={"story": "Alice waits.\n\nBob: Hello there!"})
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert [e["type"] for e in events] == ["queued", "start", "panel", "panel", "done"]
+    assert events[1]["total"] == 2
+    assert events[3]["index"] == 1 and events[3]["b64"]
+
+
+def test_comic_stream_does_not_wait_behind_bulk_jobs(monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from backend.routers import jobs as jobs_router
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    release = threading.Event()
+    bulk = JobManager(workers=1, max_queue=1)
+    monkeypatch.setattr(jobs_router, "JOBS", bulk)
+    running = bulk.submit("test", lambda job: release.wait(5))
+    for _ in range(100):
+        if running.status == "running":
+            break
+        time.sleep(0.01)
+    bulk.submit("test", lambda job: release.wait(5))
+    client = TestClient(app)
+    try:
+        assert client.post("/jobs/comic", json={"story": "Alice waits."}).status_code == 429
+        resp = client.post("/generate/comic/stream", json={"story": "Alice waits."})
+        events = [json.loads(line) for line in resp.text.splitlines()]
+        assert events[-1]["type"] == "done"
+        assert client.get(f"/jobs/{events[0]['job_id']}").json()["status"] == "done"
+    finally:
+        release.set()
+
+
+def test_generate_returns_image_urls_with_etag(monkeypatch):
+    import io
+    import zipfile
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    client = TestClient(app)
+
+    resp = client.post("/generate", json={"prompts": [{"positive_prompt": "a"}, {"positive_prompt": "b"}], "inline_images": False})
+    images = resp.json()["images"]
+    assert "b64" not in images[0]
+    img = client.get(images[0]["url"])
+    assert img.status_code == 200 and img.headers["content-type"] == "image/png"
+    assert "immutable" in img.headers["cache-control"]
+    assert client.get(images[0]["url"], headers={"If-None-Match": img.headers["etag"]}).status_code == 304
+    assert client.get(images[0]["url"], headers={"If-None-Match": f'"other", W/{img.headers["etag"]}'}).status_code == 304
+    assert client.get(images[0]["url"], headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get(images[0]["url"], headers={"If-None-Match": '"other"'}).status_code == 200
+
+    archive = client.get("/images/archive", params={"ids": ",".join(i["id"] for i in images)})
+    assert zipfile.ZipFile(io.BytesIO(archive.content)).namelist() == ["panel_0.png", "panel_1.png"]
+    assert client.get("/images/" + "0" * 64).status_code == 404
+
+
+def test_workspace_sweep_expires_by_age_and_quota(tmp_path):
+    import os
+    from storage import workspace
+
+    root = tmp_path / "ws"
+    old, mid, new = (root / name for name in ("old", "mid", "new"))
+    for age, path in ((500, old), (200, mid), (10, new)):
+        path.mkdir(parents=True)
+        (path / "panel_0.png").write_bytes(b"x" * 100)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    assert workspace.sweep(str(root), max_age=300, max_bytes=10_000, now=1000) == [str(old)]
+    assert workspace.sweep(str(root), max_age=300, max_bytes=150, now=1000) == [str(mid)]
+    assert new.exists()
+
+    with workspace.workspace("job") as ws:
+        assert os.path.isdir(ws)
+        assert workspace.sweep(max_age=0, max_bytes=0) == []
+
+
+def test_assemble_exports_multipage_pdf_and_cbz(tmp_path):
+    import io
+    import zipfile
+    from PIL import Image
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    from storage.image_store import get_store
+
+    panels = []
+    for i in range(3):
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64), color=(i * 60, 0, 0)).save(buf, format="PNG")
+        panels.append(get_store().put_bytes(buf.getvalue()))
+    client = TestClient(app)
+
+    resp = client.post("/assemble", json={"images": panels, "panels_per_page": 2, "formats": ["pdf", "cbz"], "title": "Tom & Jerry"})
+    data = resp.json()
+    assert len(data["pages"]) == 2 and "pages" not in data["downloads"]
+
+    pdf = client.get(data["downloads"]["pdf"])
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert pdf.content.startswith(b"%PDF") and pdf.content.count(b"/Type /Page ") == 2
+
+    cbz = zipfile.ZipFile(io.BytesIO(client.get(data["downloads"]["cbz"]).content))
+    assert cbz.namelist() == ["000.png", "001.png", "ComicInfo.xml"]
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in cbz.infolist())
+    assert b"<Title>Tom &amp; Jerry</Title>" in cbz.read("ComicInfo.xml")
+    assert client.post("/assemble", json={"images": panels, "formats": ["gif"]}).status_code == 400
+
+    # Only store ids and assemble workspace files are accepted, never server paths
+    outside = tmp_path / "secret.png"
+    Image.new("RGB", (8, 8)).save(outside)
+    assert client.post("/assemble", json={"images": [str(outside)]}).status_code == 400
+    assert client.post("/assemble", json={"images": ["../../secret.png"]}).status_code == 400
+    page_ref = data["downloads"]["cbz"].rsplit("/", 1)[0] + "/comic_page_0.png"
+    assert client.post("/assemble", json={"images": [page_ref], "formats": ["png"]}).status_code == 200
+
+
+def test_local_db_batches_lists_and_survives_concurrent_writers(tmp_path):
+    import json
+    import threading
+    from storage.db import LocalDB
+
+    legacy = tmp_path / "db.json"
+    legacy.write_text(json.dumps({"story:legacy": {"title": "old"}}), encoding="utf-8")
+    db = LocalDB(str(tmp_path / "records.sqlite3"), legacy_json=str(legacy))
+    assert db.load("story:legacy") == {"title": "old"}
+
+    def _writer(n):
+        for i in range(25):
+            db.save(f"job:{n:02d}-{i:02d}", {"n": n, "i": i})
+
+    threads = [threading.Thread(target=_writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(db.list("job:")) == 100 and db.list("story:") == ["story:legacy"]
+    assert db.list("job:", limit=2, after="job:00-01") == ["job:00-02", "job:00-03"]
+
+    db.save_many({"panel:1": {"seed": 1}, "panel:2": {"seed": 2}})
+    assert db.load_many(["panel:1", "panel:2", "panel:3"]) == {"panel:1": {"seed": 1}, "panel:2": {"seed": 2}}
+    assert db.delete("panel:1") and not db.delete("panel:1")
+    assert db.delete_many(["panel:2", "job:00-00"]) == 2 and db.load("panel:2") is None
+
+    # A second handle (e.g. another worker process) sees committed records
+    assert LocalDB(str(tmp_path / "records.sqlite3")).load("job:03-24") == {"n": 3, "i": 24}
+
+
+def test_comic_updates_from_separate_connections_are_not_lost(tmp_path):
+    import threading
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from storage.comics import ComicRepository
+    from storage.db import LocalDB
+
+    path = str(tmp_path / "records.sqlite3")
+    comic_id = ComicRepository(LocalDB(path)).create({"panels": [], "count": 0})
+
+    def _bump():
+        # One handle per thread, like separate uvicorn worker processes
+        repo = ComicRepository(LocalDB(path))
+        for _ in range(20):
+            repo.update(comic_id, lambda record: record.update(count=record["count"] + 1))
+
+    threads = [threading.Thread(target=_bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ComicRepository(LocalDB(path)).get(comic_id)["count"] == 80
+    assert ComicRepository(LocalDB(path)).update("missing", lambda record: None) is None
+
+    # Pagination keeps going when the requested page size is clamped
+    from storage.db import get_db
+    get_db().save_many({f"comic:{i:04d}": {"id": f"{i:04d}", "panels": []} for i in range(501)})
+    page = TestClient(app).get("/comics", params={"limit": 1000}).json()
+    assert len(page["comics"]) == 500 and page["next"] == "0499"
+
+
+def test_stored_comic_regenerates_only_edited_panels(monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    client = TestClient(app)
+
+    created = client.post("/generate/comic", json={"story": "Alice waits.\n\nBob: Hello there!", "inline_images": False}).json()
+    comic_id = created["comic_id"]
+    stored = client.get(f"/comics/{comic_id}").json()
+    assert [p["image_id"] for p in stored["panels"]] == [img["id"] for img in created["images"]]
+    assert stored["panels"][1]["dialogues"] == [["Bob", "Hello there!"]] and stored["panels"][0]["prompt"]["seed"] is not None
+
+    resp = client.post(f"/comics/{comic_id}/regenerate", json={"scenes": {"1": "Carol: Goodbye!"}, "inline_images": False})
+    assert [p["index"] for p in resp.json()["panels"]] == [1]
+    updated = client.get(f"/comics/{comic_id}").json()
+    assert updated["panels"][0] == stored["panels"][0]
+    assert updated["panels"][1]["image_id"] != stored["panels"][1]["image_id"]
+    assert updated["panels"][1]["dialogues"] == [["Carol", "Goodbye!"]]
+    assert updated["panels"][1]["prompt"]["seed"] != stored["panels"][1]["prompt"]["seed"]
+
+    # Edited scenes take their characters from the configured mention backend
+    from types import SimpleNamespace
+    from nlp import ner
+    monkeypatch.setattr(ner, "_BACKEND", SimpleNamespace(name="fake", mentions=lambda texts: [["alice"] for _ in texts]))
+    client.post(f"/comics/{comic_id}/regenerate", json={"scenes": {"1": "Someone waves."}, "inline_images": False})
+    assert client.get(f"/comics/{comic_id}").json()["panels"][1]["characters"] == ["Alice"]
+
+    assert client.post(f"/comics/{comic_id}/regenerate", json={"panels": [5]}).status_code == 400
+    assert comic_id in [c["id"] for c in client.get("/comics").json()["comics"]]
+    assert client.delete(f"/comics/{comic_id}").status_code == 200
+    assert client.get(f"/comics/{comic_id}").status_code == 404
+
+
+def test_parse_and_prompts_batch_stream_ndjson_in_order(monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+    from backend import batch
+    from backend.main import app
+
+    monkeypatch.setenv("NLP_BATCH_WORKERS", "2")
+    monkeypatch.setattr(batch, "_POOL", None)
+    client = TestClient(app)
+    try:
+        stories = [{"title": f"s{i}", "text": f"Alice{'a' * i} waits.\n\nBob: Hi {i}!"} for i in range(20)]
+        upload = "\n".join(json.dumps(s) for s in stories[:3]) + "\nnot json\n" + json.dumps({"title": "no text"}) + "\n"
+        resp = client.post("/parse/batch", content=upload, headers={"content-type": "application/x-ndjson"})
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        assert [line["index"] for line in lines] == [0, 1, 2, 3, 4]
+        assert lines[1]["title"] == "s1" and lines[1]["panels"][1]["dialogues"] == [["Bob", "Hi 1!"]]
+        assert "Invalid JSON" in lines[3]["error"] and "text" in lines[4]["error"]
+
+        resp = client.post("/parse/batch", json={"stories": stories})
+        assert [json.loads(line)["title"] for line in resp.text.splitlines()] == [s["title"] for s in stories]
+
+        items = [{"panels": [{"scene": f"scene {i}"}], "seed": i} for i in range(3)]
+        lines = [json.loads(line) for line in client.post("/prompts/batch", json=items).text.splitlines()]
+        assert [line["prompts"][0]["seed"] for line in lines] == [client.post("/prompts", json=item).json()[0]["seed"] for item in items]
+        assert client.post("/prompts/batch", json={"items": "nope"}).status_code == 400
+    finally:
+        batch.get_batch_pool().shutdown()
+
+
+def test_batch_splits_streamed_lines_and_reports_a_dead_pool(monkeypatch):
+    import asyncio
+    import json
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    from backend import batch
+
+    class _Request:
+        headers = {"content-type": "application/x-ndjson"}
+
+        async def stream(self):
+            body = "".join(json.dumps({"text": f"Alice says {i}."}) + "\n" for i in range(3)).encode()
+            for start in range(0, len(body), 7):
+                yield body[start:start + 7]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        ordered = batch.OrderedBatch(batch.parse_item, executor=executor, chunk_size=2)
+        asyncio.run(batch.submit_from_request(_Request(), ordered, "stories"))
+        assert [(line["index"], line["characters"]) for line in ordered.results()] == [(i, ["Alice"]) for i in range(3)]
+
+    class _BrokenExecutor:
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    broken = _BrokenExecutor()
+    monkeypatch.setattr(batch, "_POOL", broken)
+    ordered = batch.OrderedBatch(batch.parse_item, executor=broken, chunk_size=2)
+    for i in range(3):
+        ordered.submit({"text": f"Alice says {i}."})
+    assert [(line["index"], line["error"]) for line in ordered.results()] == [(i, "Worker process died") for i in range(3)]
+    assert batch._POOL is None
+
+
+def test_generate_selects_model_per_style_and_rejects_unknown(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    requested = []
+    monkeypatch.setenv("SD_STYLE_MODELS", "webtoon=org/webtoon")
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda model_id=None, **kwargs: requested.append(model_id))
+    client = TestClient(app)
+
+    resp = client.post("/generate/comic", json={"story": "Alice waits.", "style": "webtoon"})
+    assert resp.status_code == 200
+    assert requested == ["org/webtoon"]
+    assert client.get(f"/comics/{resp.json()['comic_id']}").json()["model_id"] == "org/webtoon"
+
+    resp = client.post("/generate", json={"prompts": [{"positive_prompt": "p"}], "model_id": "org/unknown"})
+    assert resp.status_code == 400
+    assert "org/webtoon" in client.get("/generate/models").json()["allowed"]
+
+
+def test_draft_comic_promotes_panels_to_final_with_same_seed(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    client = TestClient(app)
+
+    assert client.post("/generate/comic", json={"story": "Alice waits.", "quality": "rough"}).status_code == 400
+    comic_id = client.post("/generate/comic", json={"story": "Alice waits.\n\nBob: Hello!", "quality": "draft", "seed": 7}).json()["comic_id"]
+    before = client.get(f"/comics/{comic_id}").json()["panels"]
+    assert [p["prompt"]["quality"] for p in before] == ["draft", "draft"]
+
+    resp = client.post(f"/comics/{comic_id}/promote", json={"panels": [1], "inline_images": False})
+    assert [p["index"] for p in resp.json()["panels"]] == [1]
+    after = client.get(f"/comics/{comic_id}").json()["panels"]
+    assert [p["prompt"]["quality"] for p in after] == ["draft", "final"]
+    assert after[1]["prompt"]["seed"] == before[1]["prompt"]["seed"]
+
+    resp = client.post(f"/comics/{comic_id}/promote", json={})
+    assert [p["index"] for p in resp.json()["panels"]] == [0]
+
+
+def test_readiness_waits_for_pipeline_init_and_metrics_cover_stages(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    monkeypatch.setattr(sd_generator, "_PIPELINE_STATE", "pending")
+    client = TestClient(app)
+
+    assert client.get("/ready").status_code == 503
+    sd_generator._init_pipeline()  # torch is not installed here: placeholders
+    assert client.get("/ready").json() == {"status": "ready", "pipeline": "unavailable"}
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    comic_id = client.post("/generate/comic", json={"story": "Alice waits.\n\nBob: Hello!"}).json()["comic_id"]
+    client.get(f"/comics/{comic_id}")
+    text = client.get("/metrics").text
+    for stage in ("parse", "prompts", "overlay", "encode", "store", "base64"):
+        assert f'comic_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'placeholder_fallbacks_total{reason="pipeline_unavailable"}' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/comics/{comic_id}",status="200"}' in text
+    assert "sd_pipeline_ready 1" in text
+
+
+def test_prewarm_in_process_pool_mode_warms_workers_not_the_api_process(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+
+    warmed = []
+    monkeypatch.setenv("SD_PROCESS_WORKERS", "2")
+    monkeypatch.setattr(sd_generator, "_PIPELINE_STATE", "pending")
+    monkeypatch.setattr(sd_generator, "get_process_pool", lambda: SimpleNamespace(warm=lambda model_id: warmed.append(model_id) or True))
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: pytest.fail("parent process loaded a pipeline"))
+    client = TestClient(app)
+
+    assert client.post("/generate/prewarm").json()["status"] == "ok"
+    assert warmed == [sd_generator.default_model_id()]
+    assert client.get("/ready").json() == {"status": "ready", "pipeline": "loaded"}
+
+
+def test_image_store_sweep_keeps_images_of_stored_comics(tmp_path, monkeypatch):
+    import os
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from generation import sd_generator
+    from storage.image_store import get_store, sweep_store
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    client = TestClient(app)
+    comic = client.post("/generate/comic", json={"story": "Alice waits.", "inline_images": False}).json()
+    [loose] = client.post("/generate", json={"prompts": [{"positive_prompt": "loose"}], "inline_images": False}).json()["images"]
+    store = get_store()
+    for path in (store.get_path(comic["images"][0]["id"]), store.get_path(loose["id"])):
+        os.utime(path, (0, 0))
+
+    monkeypatch.setenv("IMAGE_STORE_MAX_AGE", "60")
+    assert sweep_store() == [loose["id"]]
+    assert client.get(comic["images"][0]["url"]).status_code == 200
+    assert client.get(loose["url"]).status_code == 404
+
+    # Fresh images survive even over quota
+    [fresh] = client.post("/generate", json={"prompts": [{"positive_prompt": "fresh"}], "inline_images": False}).json()["images"]
+    assert store.sweep(keep=[comic["images"][0]["id"]], max_bytes=0) == [] and store.get_path(fresh["id"])
@@ -0,0 +1,13 @@
+def test_benchmark_corpus_and_report_helpers():
+    from nlp.parser import parse_story
+    from scripts import benchmark
+
+    story = benchmark.synthetic_story(20, seed=3)
+    assert story == benchmark.synthetic_story(20, seed=3)
+    scenes, characters = parse_story(story)
+    assert len(scenes) == 20 and {"Alice", "Bob", "Yuki Tanaka"} <= set(characters)
+
+    assert benchmark.percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    report = {"results": [benchmark.summarize("parse", [0.002, 0.004], size="short")]}
+    baseline = {"results": [benchmark.summarize("parse", [0.001, 0.002], size="short")]}
+    assert benchmark.compare(report, baseline, tolerance=1.25) == [{"name": "parse", "size": "short", "concurrency": None, "p50_ratio": 2.0, "regressed": True}]
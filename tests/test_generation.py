@@ -1,3 +1,7 @@
+import os
+
+import pytest
+
 from generation.prompt_builder import build_prompts_for_panels
 
 
@@ -8,3 +12,417 @@ def test_build_prompts_for_panels():
     assert "positive_prompt" in prompts[0]
 
 
+def test_prompts_name_each_panels_own_characters():
+    panels = [{"scene": "Mira runs.", "characters": ["Mira"]}, {"scene": "Tomas waits.", "characters": ["Tomas", "Mira"]}]
+    first, second = build_prompts_for_panels(panels)
+    assert "Mira" in first["positive_prompt"] and "Tomas" not in first["positive_prompt"]
+    assert "Tomas, Mira" in second["positive_prompt"]
+
+
+class _FakePipe:
+    """CPU-only stand-in for a diffusers pipeline that records each call."""
+
+    device = "cpu"
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, negative_prompt=None, generator=None, width=512, height=512, **kwargs):
+        from types import SimpleNamespace
+        from PIL import Image
+
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        self.calls.append({"prompts": prompts, "generator": generator, "width": width, "height": height})
+        return SimpleNamespace(images=[Image.new("RGB", (width, height)) for _ in prompts])
+
+
+def test_generate_images_batches_compatible_prompts(tmp_path, monkeypatch):
+    from generation import sd_generator
+
+    pipe = _FakePipe()
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: pipe)
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    prompts = [{"positive_prompt": f"p{i}", "seed": i} for i in range(5)]
+    prompts.append({"positive_prompt": "wide", "seed": 99, "width": 768})
+
+    paths = sd_generator.generate_images(prompts, output_dir=str(tmp_path), batch_size=2, use_cache=False)
+
+    assert [c["prompts"] for c in pipe.calls] == [["p0", "p1"], ["p2", "p3"], ["p4"], ["wide"]]
+    assert pipe.calls[0]["generator"] == [0, 1]
+    assert pipe.calls[-1]["width"] == 768
+    assert paths == [str(tmp_path / f"panel_{i}.png") for i in range(6)]
+
+
+def test_panel_cache_lru_eviction(tmp_path):
+    from generation.image_cache import PanelCache, cache_key
+
+    cache = PanelCache(root=str(tmp_path / "cache"), max_bytes=250)
+    keys = [cache_key({"positive_prompt": f"p{i}", "seed": 1}, {"width": 512}, "model") for i in range(3)]
+    assert cache_key({"positive_prompt": "p"}, {}, "model") is None
+
+    cache.put_bytes(keys[0], b"x" * 100)
+    cache.put_bytes(keys[1], b"x" * 100)
+    hit = cache.lookup(keys[0])
+    cache.put_bytes(keys[2], b"x" * 100)
+
+    assert keys[1] not in cache
+    assert keys[0] in cache and keys[2] in cache
+    assert open(hit, "rb").read() == b"x" * 100
+
+
+def test_generate_images_serves_cache_hits_without_pipeline(tmp_path, monkeypatch):
+    from generation import sd_generator
+    from generation.image_cache import PanelCache
+
+    pipe = _FakePipe()
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: pipe)
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    cache = PanelCache(root=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(sd_generator, "get_cache", lambda: cache)
+    prompts = [{"positive_prompt": "a", "seed": 1}, {"positive_prompt": "b", "seed": 2}]
+
+    sd_generator.generate_images(prompts, output_dir=str(tmp_path / "run1"))
+    prompts[1]["positive_prompt"] = "edited"
+    paths = sd_generator.generate_images(prompts, output_dir=str(tmp_path / "run2"))
+
+    assert [c["prompts"] for c in pipe.calls] == [["a", "b"], ["edited"]]
+    assert all(os.path.exists(p) for p in paths)
+
+
+def test_render_panels_keeps_cache_hits_when_pipeline_is_unavailable(tmp_path, monkeypatch):
+    from generation import sd_generator
+    from generation.image_cache import PanelCache
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: _FakePipe())
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    cache = PanelCache(root=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(sd_generator, "get_cache", lambda: cache)
+    prompts = [{"positive_prompt": "a", "seed": 1}, {"positive_prompt": "b", "seed": 2}]
+    sd_generator.render_panels(prompts[:1])
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: None)
+    emitted = []
+    panels = sd_generator.render_panels(prompts, on_panel=lambda panel: emitted.append((panel.index, panel.from_pipeline)))
+
+    assert emitted == [(0, True), (1, False)]
+    assert [(p.index, p.from_pipeline) for p in panels] == emitted
+
+
+def test_render_panels_treats_a_file_evicted_after_lookup_as_a_miss(tmp_path, monkeypatch):
+    from generation import sd_generator
+    from generation.image_cache import PanelCache
+
+    pipe = _FakePipe()
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: pipe)
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    cache = PanelCache(root=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(sd_generator, "get_cache", lambda: cache)
+    monkeypatch.setattr(cache, "lookup", lambda key: str(tmp_path / "evicted.png"))
+
+    [panel] = sd_generator.render_panels([{"positive_prompt": "a", "seed": 1}])
+    assert panel.from_pipeline and [c["prompts"] for c in pipe.calls] == [["a"]]
+
+
+def test_build_prompts_seeds_are_deterministic_per_panel():
+    panels = [{"scene": "A quiet room"}, {"scene": "A busy street"}]
+    first = build_prompts_for_panels(panels, seed=7)
+    assert [p["seed"] for p in first] == [p["seed"] for p in build_prompts_for_panels(panels, seed=7)]
+    assert first[0]["seed"] != first[1]["seed"]
+
+    edited = build_prompts_for_panels([panels[0], {"scene": "A rainy street"}], seed=7)
+    assert edited[0]["seed"] == first[0]["seed"]
+    assert edited[1]["seed"] != first[1]["seed"]
+    assert build_prompts_for_panels(panels, seed=8)[0]["seed"] != first[0]["seed"]
+
+
+def test_scheduler_runs_interactive_before_bulk():
+    import threading
+    from generation.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, PipelineScheduler
+
+    scheduler = PipelineScheduler(name="test_worker")
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.submit(lambda: gate.wait(5))
+    bulk = scheduler.submit(lambda: order.append("bulk"), priority=PRIORITY_BULK)
+    interactive = scheduler.submit(lambda: order.append("interactive"), priority=PRIORITY_INTERACTIVE)
+    gate.set()
+    for future in (blocker, bulk, interactive):
+        future.result(timeout=5)
+
+    assert order == ["interactive", "bulk"]
+    stats = scheduler.stats()
+    assert stats["tasks"] == 3 and stats["queue_wait_seconds"] > 0
+
+
+def test_process_pool_shards_panels_across_workers():
+    from generation.process_pool import ProcessPipelinePool
+
+    pool = ProcessPipelinePool(workers=2, threads_per_worker=1, placeholder_only=True)
+    try:
+        prompts = [{"positive_prompt": f"p{i}"} for i in range(5)]
+        seen = []
+        results = pool.render(prompts, [0, 2, 3, 4], batch_size=1, on_result=lambda i, data, used: seen.append(i))
+    finally:
+        pool.shutdown()
+
+    assert sorted(i for i, _, _ in results) == sorted(seen) == [0, 2, 3, 4]
+    assert all(data.startswith(b"\x89PNG") and not used for _, data, used in results)
+
+
+def test_process_pool_restarts_after_a_worker_dies():
+    from concurrent.futures.process import BrokenProcessPool
+    from generation.process_pool import ProcessPipelinePool
+
+    pool = ProcessPipelinePool(workers=1, threads_per_worker=1, placeholder_only=True)
+    try:
+        assert pool.warm() is False  # placeholder-only workers have no pipeline
+        with pytest.raises(BrokenProcessPool):
+            pool._executor.submit(os._exit, 1).result()
+        results = pool.render([{"positive_prompt": "p"}], [0], batch_size=1)
+    finally:
+        pool.shutdown()
+
+    assert [i for i, _, _ in results] == [0] and pool.restarts == 1
+
+
+def test_assemble_pages_paginates_and_downscales(tmp_path):
+    from PIL import Image
+    from generation.assembler import assemble_pages
+
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"panel_{i}.png"
+        Image.new("RGBA", (1024, 1024), color=(i * 40, 0, 0, 255)).save(path)
+        paths.append(str(path))
+
+    pages = assemble_pages(paths, columns=2, thumb_size=(64, 64), panels_per_page=4, output_dir=str(tmp_path / "out"))
+
+    assert pages == [str(tmp_path / "out" / "comic_page_0.png"), str(tmp_path / "out" / "comic_page_1.png")]
+    with Image.open(pages[0]) as first, Image.open(pages[1]) as last:
+        assert first.size == (128, 128)
+        assert last.size == (128, 64)
+        assert last.getpixel((10, 10)) == (160, 0, 0)
+
+
+def test_write_pdf_embeds_png_data_without_reencoding(tmp_path):
+    import io
+    from PIL import Image
+    from generation.exporter import _copy_idat, write_pdf
+
+    page = tmp_path / "page.png"
+    Image.new("RGB", (40, 20), color=(10, 200, 30)).save(page)
+    idat = io.BytesIO()
+    _copy_idat(str(page), idat)
+
+    pdf = (tmp_path / "comic.pdf")
+    write_pdf([str(page), str(page)], str(pdf))
+
+    data = pdf.read_bytes()
+    assert data.count(idat.getvalue()) == 2
+    assert b"/MediaBox [0 0 28.80 14.40]" in data
+
+
+def test_composite_bubbles_draws_in_memory_with_cached_layer():
+    import pickle
+    from PIL import Image
+    from generation import compositor
+
+    dialogues = [("Alice", "A rather long line of dialogue that will need to wrap inside the bubble")]
+    layout = compositor.layout_bubbles(dialogues, 256)
+    assert len(layout[0][0]) > 1
+
+    image = Image.new("RGB", (256, 256), color=(0, 0, 255))
+    result = compositor.composite_bubbles(image, dialogues)
+    assert result is image
+    assert image.getpixel((128, 5)) == (0, 0, 255)
+    assert image.getpixel((compositor.MARGIN + 5, 256 - compositor.MARGIN - 20))[0] > 200
+    assert compositor.bubble_layer(dialogues, 256) is compositor.bubble_layer(list(dialogues), 256)
+
+    overlay = pickle.loads(pickle.dumps(compositor.BubbleOverlay([[], dialogues])))
+    blank = Image.new("RGB", (256, 256), color=(0, 0, 255))
+    assert overlay(0, blank).getpixel((128, 250)) == (0, 0, 255)
+
+
+def test_generate_images_applies_transform_before_save_and_caches_raw(tmp_path, monkeypatch):
+    from PIL import Image
+    from generation import sd_generator
+    from generation.image_cache import PanelCache
+
+    pipe = _FakePipe()
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: pipe)
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    cache = PanelCache(root=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(sd_generator, "get_cache", lambda: cache)
+
+    def paint(i, image):
+        image.paste((255, 0, 0), (0, 0, 8, 8))
+        return image
+
+    prompts = [{"positive_prompt": "a", "seed": 1, "width": 64, "height": 64}]
+    [path] = sd_generator.generate_images(prompts, output_dir=str(tmp_path / "run"), transform=paint)
+
+    with Image.open(path) as out, Image.open(cache.lookup(next(iter(cache._entries)))) as raw:
+        assert out.getpixel((0, 0)) == (255, 0, 0)
+        assert raw.getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_panel_encodes_once_and_decodes_lazily(tmp_path):
+    from PIL import Image
+    from generation.panel import Panel
+    from storage.image_store import ImageStore
+
+    panel = Panel(0, image=Image.new("RGB", (32, 32), color=(1, 2, 3)))
+    data = panel.encode()
+    assert panel.encode() is data
+    panel.release_image()
+    store = ImageStore(root=str(tmp_path / "store"))
+    image_id = panel.persist(store)
+    path = panel.save(str(tmp_path / panel.filename))
+    assert open(path, "rb").read() == open(store.get_path(image_id), "rb").read() == data
+
+    lazy = Panel(1, encoded=data)
+    assert lazy._image is None
+    assert lazy.size == (32, 32) and lazy.image.getpixel((0, 0)) == (1, 2, 3)
+
+
+def test_render_panels_stays_in_memory_and_assembles(tmp_path, monkeypatch):
+    from PIL import Image
+    from generation import sd_generator
+    from generation.assembler import assemble_grid
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: _FakePipe())
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    monkeypatch.setenv("SD_OUTPUT_DIR", str(tmp_path / "images"))
+    prompts = [{"positive_prompt": f"p{i}", "seed": i} for i in range(3)]
+
+    panels = sd_generator.render_panels(prompts)
+    assert [p.index for p in panels] == [0, 1, 2] and all(p.from_pipeline for p in panels)
+    assert not (tmp_path / "images").exists()
+
+    page = assemble_grid(panels, columns=3, thumb_size=(16, 16), output_path=str(tmp_path / "page.png"))
+    with Image.open(page) as img:
+        assert img.size == (48, 16)
+    # Full-size bitmaps are released once each thumbnail is on the page
+    assert not any(p.decoded for p in panels)
+    assemble_grid(panels, columns=3, thumb_size=(16, 16), output_path=str(tmp_path / "again.png"))
+    assert not any(p.decoded for p in panels)
+
+
+def test_panel_and_page_encoding_follow_settings(tmp_path, monkeypatch):
+    from generation import sd_generator
+    from generation.assembler import assemble_pages
+    from generation.encoding import Encoding
+    from generation.image_cache import PanelCache
+
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: _FakePipe())
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    cache = PanelCache(root=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(sd_generator, "get_cache", lambda: cache)
+    monkeypatch.setenv("PANEL_FORMAT", "webp")
+    prompts = [{"positive_prompt": "p", "seed": 1}]
+
+    for _ in range(2):  # second run is served from the cache
+        [panel] = sd_generator.render_panels(prompts)
+        assert panel.filename == "panel_0.webp" and panel.media_type == "image/webp"
+        assert panel.encode()[8:12] == b"WEBP"
+    assert open(cache.lookup(next(iter(cache._entries))), "rb").read(4) == b"\x89PNG"
+
+    pages = assemble_pages([panel], thumb_size=(16, 16), output_dir=str(tmp_path / "out"), encoding=Encoding("jpeg", quality=70))
+    assert pages == [str(tmp_path / "out" / "comic_page_0.jpg")]
+    assert open(pages[0], "rb").read(2) == b"\xff\xd8"
+
+
+def test_pipeline_registry_keeps_models_resident_within_budget():
+    import threading
+    from types import SimpleNamespace
+    from generation.pipeline_registry import PipelineRegistry
+
+    loads = []
+    resident_at_load = []
+
+    def _loader(model_id, device, dtype, hf_token):
+        loads.append(model_id)
+        resident_at_load.append([r["model_id"] for r in registry.stats()["resident"]])
+        return SimpleNamespace(model_id=model_id)
+
+    registry = PipelineRegistry(budget_bytes=250, loader=_loader, sizer=lambda pipe: 100, device=("cpu", "float32"))
+    threads = [threading.Thread(target=registry.get, args=("org/a",)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loads == ["org/a"]  # single-flight
+
+    registry.get("org/b")
+    assert registry.get("org/a").model_id == "org/a"  # hit; "org/b" is now least recently used
+    registry.get("org/c")
+    stats = registry.stats()
+    assert [r["model_id"] for r in stats["resident"]] == ["org/c", "org/a"]
+    assert stats["evictions"] == 1 and stats["resident"][1]["hits"] == 4
+    assert [load["model_id"] for load in stats["recent_loads"]] == ["org/a", "org/b", "org/c"]
+    assert loads == ["org/a", "org/b", "org/c"]
+    # "org/b" was evicted before "org/c" was loaded, never after
+    assert resident_at_load[-1] == ["org/a"]
+    assert registry._loading == {} and registry._reserved == {}
+
+
+def test_text_embeddings_encode_each_unique_string_once(tmp_path, monkeypatch):
+    from generation import sd_generator, text_embeddings
+
+    class _EmbeddingPipe(_FakePipe):
+        def encode_prompt(self, *args):
+            raise AssertionError("replaced by text_embeddings._encode")
+
+        def __call__(self, prompt_embeds=None, negative_prompt_embeds=None, **kwargs):
+            self.calls.append({"prompt_embeds": prompt_embeds, "negative_prompt_embeds": negative_prompt_embeds})
+            return super().__call__(["x"] * len(prompt_embeds), **kwargs)
+
+    encoded = []
+    monkeypatch.setattr(text_embeddings, "_encode", lambda pipe, texts, device: encoded.extend(texts) or [f"emb:{t}" for t in texts])
+    monkeypatch.setattr(text_embeddings, "_concat", list)
+    pipe = _EmbeddingPipe()
+    monkeypatch.setattr(sd_generator, "_init_pipeline", lambda **kwargs: pipe)
+    monkeypatch.setattr(sd_generator, "_make_generator", lambda seed, device: seed)
+    prompts = [{"positive_prompt": f"manga style, p{i}", "negative_prompt": "lowres", "seed": i} for i in range(3)]
+
+    sd_generator.render_panels(prompts, batch_size=2, use_cache=False)
+    sd_generator.render_panels(prompts[:1], use_cache=False)
+
+    assert encoded == ["manga style, p0", "manga style, p1", "lowres", "manga style, p2"]
+    assert pipe.calls[0]["prompt_embeds"] == ["emb:manga style, p0", "emb:manga style, p1"]
+    assert pipe.calls[-2]["negative_prompt_embeds"] == ["emb:lowres"]
+    assert text_embeddings.embedding_cache(pipe).stats()["hits"] == 4
+
+
+def test_quality_tiers_pick_steps_scheduler_and_batches(monkeypatch):
+    from generation import sd_generator
+
+    monkeypatch.setenv("SD_DRAFT_SCALE", "0.5")
+    draft = sd_generator._resolve_params({"quality": "draft"})
+    assert draft == {"width": 256, "height": 256, "num_inference_steps": 10, "guidance_scale": 7.5, "scheduler": "dpm++"}
+    assert sd_generator._resolve_params({"quality": "final"})["num_inference_steps"] == 40
+    assert sd_generator._resolve_params({"quality": "draft", "steps": 4})["num_inference_steps"] == 4
+    assert "scheduler" not in sd_generator._resolve_params({})
+
+    prompts = [{"quality": "draft"}, {}, {"quality": "draft"}, {"quality": "standard"}]
+    assert sd_generator._batch_prompts(prompts, 4) == [[0, 2], [1, 3]]
+
+
+def test_metrics_render_prometheus_text():
+    from generation.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+    registry = MetricsRegistry()
+    fallbacks = registry.register(Counter("fallbacks_total", "Fallbacks.", ("reason",)))
+    in_flight = registry.register(Gauge("in_flight", "In flight."))
+    stages = registry.register(Histogram("stage_seconds", "Stages.", ("stage",), buckets=(0.1, 1.0)))
+    fallbacks.inc(reason='no "pipe"')
+    stages.observe(0.05, stage="parse")
+    stages.observe(0.5, stage="parse")
+    with in_flight.track():
+        text = registry.render()
+
+    assert 'fallbacks_total{reason="no \\"pipe\\""} 1' in text
+    assert "# TYPE in_flight gauge\nin_flight 1" in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 2' in text
+    assert 'stage_seconds_count{stage="parse"} 2' in text and in_flight.value() == 0
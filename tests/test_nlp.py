@@ -18,3 +18,97 @@ def test_extract_characters():
     assert "Bob" in chars or "Charlie" in chars
 
 
+def test_parse_story_matches_individual_helpers():
+    from nlp.dialogue_detector import detect_dialogue_lines
+    from nlp.parser import parse_story
+
+    text = 'Alice met Bob.\r\n\r\nBob: "Hi there"\n"Welcome," said Alice.\n\n  \nEnd\n\nCharlie waved.'
+    scenes, characters = parse_story(text)
+    assert [s.text for s in scenes] == split_into_scenes(text)
+    assert [s.dialogues for s in scenes] == [detect_dialogue_lines(s) for s in split_into_scenes(text)]
+    # Names never span a scene break ("End\n\nCharlie"); Bob speaks, so ranks first
+    assert characters == ["Bob", "Alice", "Welcome", "Charlie"]
+    assert [s.characters for s in scenes] == [["Bob", "Alice"], ["Bob", "Alice", "Welcome"], ["Charlie"]]
+
+
+def test_iter_scenes_streams_lines_lazily():
+    from nlp.parser import iter_scenes
+
+    consumed = []
+
+    def lines():
+        for n in range(1000):
+            consumed.append(n)
+            yield f"Scene {n} with Alice.\n"
+            yield "\n"
+
+    scenes = iter_scenes(lines())
+    first = next(scenes)
+    assert first.index == 0 and first.mentions == ["Alice"]
+    assert len(consumed) <= 3
+
+
+def test_characters_ranked_by_frequency_without_stop_words():
+    from nlp.parser import parse_story
+
+    text = (
+        "The night was cold. Then Mira ran.\n\n"
+        "When the door opened, Mira saw Tomas.\n\n"
+        "Tomas: Run!\n\n"
+        "She kept running.\n\n"
+        "Later, an Old Man watched."
+    )
+    scenes, characters = parse_story(text, max_characters=2)
+    assert characters == ["Tomas", "Mira"]
+    # Scenes without a named character keep the previous scene's cast
+    assert [s.characters for s in scenes] == [["Mira"], ["Tomas", "Mira"], ["Tomas"], ["Tomas"], ["Tomas"]]
+    assert extract_characters("the The THE Then then Alice alice ALICE") == ["Alice"]
+
+
+def test_month_and_modal_names_are_kept_mid_sentence():
+    from nlp.character_extractor import find_name_candidates
+    from nlp.parser import parse_story
+
+    assert find_name_candidates("May I come in? March came early.") == []
+    assert find_name_candidates('Then May smiled at March. "Hi," May said.') == ["May", "March", "May"]
+    _, characters = parse_story("Then May ran.\n\nMay: Wait for me!\n\nTomas stopped, and May caught up.")
+    assert characters[0] == "May" and "Tomas" in characters
+
+
+def test_spacy_backend_falls_back_to_regex_without_model(monkeypatch):
+    import sys
+    from nlp import ner
+
+    monkeypatch.setenv("NLP_CHARACTER_BACKEND", "spacy")
+    monkeypatch.setitem(sys.modules, "spacy", None)  # not installed
+    assert ner.get_character_backend().name == "regex"
+
+
+def test_spacy_backend_batches_scenes_through_ner(monkeypatch):
+    import sys
+    from types import SimpleNamespace
+    from nlp.parser import parse_story
+
+    calls = {}
+
+    class _FakeNlp:
+        pipe_names = ["ner"]
+
+        def pipe(self, texts, batch_size, n_process):
+            calls.update(texts=list(texts), batch_size=batch_size, n_process=n_process)
+            for text in calls["texts"]:
+                ents = [SimpleNamespace(text=w.strip(".,"), label_="PERSON") for w in text.split() if w.startswith(("Mira", "Tomas"))]
+                yield SimpleNamespace(ents=ents + [SimpleNamespace(text="Paris", label_="GPE")])
+
+    def _load(model, disable):
+        calls.update(model=model, disable=disable)
+        return _FakeNlp()
+
+    monkeypatch.setitem(sys.modules, "spacy", SimpleNamespace(load=_load))
+    monkeypatch.setenv("NLP_CHARACTER_BACKEND", "spacy")
+    monkeypatch.setenv("SPACY_BATCH_SIZE", "16")
+
+    scenes, characters = parse_story("Mira met Tomas in Paris.\n\nThe Old Man watched Mira.")
+    assert characters == ["Mira", "Tomas"]
+    assert calls["model"] == "en_core_web_sm" and "parser" in calls["disable"] and "ner" not in calls["disable"]
+    assert calls["texts"] == [s.text for s in scenes] and calls["batch_size"] == 16 and calls["n_process"] == 1